@@ -1,16 +1,26 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
-def get_data(symbol="BSANTANDER.SN", period="2y", interval="1d"):
+# Los módulos compartidos con los servicios viven junto a main.py (ver servicios.py).
+import servicios
+from market_fetch import YahooProvider, fetch_histories
+from price_store import PriceStore
+from fundamentals import FundamentalsCache
+import indicators
+from graficos import escribir_html, figura_mercado
+
+def get_data(symbol="BSANTANDER.SN", period="2y", interval="1d", store=None):
     """
     Descarga datos históricos de un activo desde Yahoo Finance.
+    Las barras diarias quedan en el almacén local de precios (PriceStore),
+    así que en las siguientes llamadas solo se descargan los días nuevos.
     """
-    df = yf.download(symbol, period=period, interval=interval)
+    histories, errors = fetch_histories([symbol], YahooProvider(), period, interval,
+                                        store or PriceStore())
+    if symbol in errors:
+        raise errors[symbol]
+    df = histories.get(symbol, pd.DataFrame())
     df.dropna(inplace=True)
-    df.to_csv('MAYF.csv')
     return df
 
 
@@ -22,26 +32,9 @@ def add_indicators(df):
     if isinstance(df.columns, pd.MultiIndex):
         df.columns = [col[0] if isinstance(col, tuple) else col for col in df.columns]
 
-    df["SMA_20"] = df["Close"].rolling(20).mean()
-    df["SMA_50"] = df["Close"].rolling(50).mean()
-
-    # RSI
-    delta = df["Close"].diff()
-    gain = delta.where(delta > 0, 0).rolling(14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-    rs = gain / loss
-    df["RSI"] = 100 - (100 / (1 + rs))
-
-    # Bollinger Bands
-    rolling_std = df["Close"].rolling(20).std()
-    df["BB_upper"] = df["SMA_20"] + 2 * rolling_std
-    df["BB_lower"] = df["SMA_20"] - 2 * rolling_std
-
-    # MACD
-    ema_12 = df["Close"].ewm(span=12, adjust=False).mean()
-    ema_26 = df["Close"].ewm(span=26, adjust=False).mean()
-    df["MACD"] = ema_12 - ema_26
-    df["Signal"] = df["MACD"].ewm(span=9, adjust=False).mean()
+    # SMA, RSI (media móvil simple), Bollinger y MACD desde el motor compartido,
+    # esperando ventanas completas.
+    df = indicators.add_indicators(df, rsi=indicators.RSI_SMA, partial_windows=False)
 
     return df.dropna()
 
@@ -67,12 +60,17 @@ def performance_metrics(df):
     return metrics
 
 
-def fundamentals(symbol="BSANTANDER.SN"):
+def fundamentals(symbol="BSANTANDER.SN", cache=None):
     """
     Extrae información fundamental del activo.
+    Los campos salen del caché local de fundamentales (FundamentalsCache, un
+    JSON junto al almacén de precios); solo se llama a Ticker.info si alguno venció.
     """
-    ticker = yf.Ticker(symbol)
-    info = ticker.info
+    cache = cache or FundamentalsCache()
+    _, errors = cache.refresh([symbol], YahooProvider())
+    if symbol not in cache:
+        raise errors[symbol]
+    info = cache.get(symbol)
     fundamentals_data = {
         "Company": info.get("longName"),
         "Sector": info.get("sector"),
@@ -86,41 +84,15 @@ def fundamentals(symbol="BSANTANDER.SN"):
     return fundamentals_data
 
 
-def plot_market(df, symbol="BSANTANDER.SN"):
+def plot_market(df, symbol="BSANTANDER.SN", max_puntos=None, archivo="MAYD.html"):
     """
     Crea gráfico interactivo de precios con indicadores técnicos.
+    Para historias largas (décadas de barras diarias o intradía) conviene
+    `max_puntos`: velas agregadas y líneas reducidas a ese número de puntos,
+    en WebGL y con plotly.js compartido (ver graficos.py).
     """
-    fig = make_subplots(rows=2, cols=1, shared_xaxes=True,
-                        row_heights=[0.7, 0.3],
-                        vertical_spacing=0.05,
-                        subplot_titles=(f"{symbol} Market Overview", "RSI Indicator"))
-
-    # --- Candlestick ---
-    fig.add_trace(go.Candlestick(
-        x=df.index,
-        open=df["Open"], high=df["High"],
-        low=df["Low"], close=df["Close"],
-        name="Precio"
-    ), row=1, col=1)
-
-    # --- SMA y Bollinger Bands ---
-    fig.add_trace(go.Scatter(x=df.index, y=df["SMA_20"], name="SMA 20", line=dict(color="orange")), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df.index, y=df["SMA_50"], name="SMA 50", line=dict(color="blue")), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df.index, y=df["BB_upper"], name="Bollinger Upper", line=dict(color="gray", dash="dot")), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df.index, y=df["BB_lower"], name="Bollinger Lower", line=dict(color="gray", dash="dot")), row=1, col=1)
-
-    # --- RSI ---
-    fig.add_trace(go.Scatter(x=df.index, y=df["RSI"], name="RSI", line=dict(color="purple")), row=2, col=1)
-    fig.add_hline(y=70, line_dash="dot", line_color="red", row=2, col=1)
-    fig.add_hline(y=30, line_dash="dot", line_color="green", row=2, col=1)
-
-    fig.update_layout(
-        template="plotly_white",
-        height=800,
-        xaxis_rangeslider_visible=False,
-        title=f"{symbol} Market Analysis"
-    )
-    fig.write_html('MAYD.html')
+    fig = figura_mercado(df, symbol, max_puntos)
+    escribir_html(fig, archivo, max_puntos)
 
 
 if __name__ == "__main__":
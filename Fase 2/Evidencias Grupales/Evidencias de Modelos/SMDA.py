@@ -1,28 +1,25 @@
 import yfinance as yf
 import pandas as pd
 
+# El motor de indicadores compartido vive junto a main.py (ver servicios.py).
+import servicios
+from indicators import add_indicators, RSI_SMA
+from market_fetch import YahooProvider
+from fundamentals import FundamentalsCache
+
 # Descargar datos de una acción (ej. Apple)
 ticker = yf.Ticker("AAPL")
 df = ticker.history(period="2y")  # últimos 2 años
 
-# Calcular indicadores técnicos
-df["SMA_20"] = df["Close"].rolling(window=20).mean()
-df["SMA_50"] = df["Close"].rolling(window=50).mean()
-
-# RSI
-delta = df["Close"].diff()
-gain = delta.where(delta > 0, 0).rolling(14).mean()
-loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-rs = gain / loss
-df["RSI"] = 100 - (100 / (1 + rs))
-
-# Bollinger Bands
-df["BB_upper"] = df["SMA_20"] + 2 * df["Close"].rolling(20).std()
-df["BB_lower"] = df["SMA_20"] - 2 * df["Close"].rolling(20).std()
+# Calcular indicadores técnicos (SMA, RSI con media móvil simple, Bollinger, MACD)
+df = add_indicators(df, rsi=RSI_SMA, partial_windows=False)
 
 print(df.tail())
 
-info = ticker.info
+# Fundamentales desde el caché local: Ticker.info solo si algún campo venció.
+cache = FundamentalsCache()
+cache.refresh(["AAPL"], YahooProvider())
+info = cache.get("AAPL")
 
 print("Empresa:", info["longName"])
 print("Sector:", info["sector"])
@@ -0,0 +1,364 @@
+# almacen.py
+"""
+Almacén columnar del conjunto Kaggle de precios por símbolo (`HSM/stocks/*.us.txt`).
+
+Los notebooks leen un archivo a la vez con `pd.read_csv(os.path.join('HSM',
+'stocks','hpq.us.txt'))`: float64, fechas como texto y un nuevo parseo en
+cada carga. Para entrenar sobre todo el conjunto (miles de archivos):
+
+- `convertir` parsea los archivos en paralelo (un pool de procesos) con
+  tipos compactos (`TIPOS`: precios float32, fechas como días int32) y los
+  escribe una sola vez, símbolo tras símbolo, en un archivo binario por
+  columna, con un índice símbolo -> (inicio, fin) en `meta.json`;
+- `Almacen` abre esas columnas como `np.memmap` y entrega cualquier símbolo
+  o rango de fechas sin volver a parsear: `arreglos` son vistas sin copia,
+  `frame` un DataFrame como el de `read_csv` y `panel` una matriz fechas x
+  símbolos;
+- `abrir` convierte solo si los archivos de origen cambiaron desde la
+  última conversión.
+
+Los archivos vacíos del conjunto (hay varios de 0 bytes) quedan en
+`vacios`, y los que no se pueden leer en `errores`, sin detener al resto.
+"""
+import glob
+import json
+import os
+
+import numpy as np
+
+COLUMNAS = ["Date", "Open", "High", "Low", "Close", "Volume", "OpenInt"]
+TIPOS = {
+    "Date": np.int32,     # días desde 1970-01-01
+    "Open": np.float32,
+    "High": np.float32,
+    "Low": np.float32,
+    "Close": np.float32,
+    "Volume": np.int64,   # hay volúmenes diarios sobre 2**31
+    "OpenInt": np.int32,
+}
+META = "meta.json"
+PATRON = "*.txt"
+
+
+def simbolo_de(ruta):
+    """'HSM/stocks/hpq.us.txt' -> 'hpq.us'."""
+    return os.path.basename(ruta)[:-len(".txt")] if ruta.endswith(".txt") else os.path.basename(ruta)
+
+
+def leer_archivo(ruta):
+    """
+    Columnas de un archivo del conjunto con los tipos de `TIPOS`, ordenadas
+    por fecha, o None si el archivo está vacío.
+    """
+    import pandas as pd
+
+    try:
+        df = pd.read_csv(ruta, usecols=COLUMNAS, engine="c",
+                         dtype={c: (str if c == "Date" else t) for c, t in TIPOS.items()})
+    except pd.errors.EmptyDataError:
+        return None
+    if df.empty:
+        return None
+    arreglos = {c: df[c].to_numpy() for c in COLUMNAS[1:]}
+    arreglos["Date"] = np.asarray(df["Date"].to_numpy(), dtype="datetime64[D]").astype(np.int32)
+    if np.any(np.diff(arreglos["Date"]) < 0):
+        orden = np.argsort(arreglos["Date"], kind="stable")
+        arreglos = {c: a[orden] for c, a in arreglos.items()}
+    return arreglos
+
+
+def _leer(ruta):
+    # Corre en los procesos del pool: los errores vuelven como texto.
+    try:
+        return ruta, leer_archivo(ruta), None
+    except Exception as e:
+        return ruta, None, f"{type(e).__name__}: {e}"
+
+
+def _fuentes(archivos):
+    return {simbolo_de(r): [os.path.getsize(r), os.stat(r).st_mtime_ns] for r in archivos}
+
+
+def listar(origen, patron=PATRON):
+    return sorted(glob.glob(os.path.join(origen, patron)))
+
+
+def convertir(archivos, destino, procesos=None, bloque=16):
+    """
+    Parsea `archivos` en `procesos` procesos (todos los núcleos por omisión;
+    1 lo hace en este proceso) y escribe el almacén en `destino`. Las
+    columnas se escriben a medida que llegan los archivos, así que la
+    memoria no crece con el tamaño del conjunto. `meta.json` se escribe al
+    final: una conversión interrumpida no deja un almacén a medias que
+    parezca completo. Devuelve el `Almacen`.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    os.makedirs(destino, exist_ok=True)
+    meta_ruta = os.path.join(destino, META)
+    if os.path.exists(meta_ruta):
+        os.remove(meta_ruta)
+
+    indice, vacios, errores, filas = {}, [], {}, 0
+    salidas = {c: open(os.path.join(destino, f"{c}.bin"), "wb") for c in COLUMNAS}
+    pool = ProcessPoolExecutor(procesos) if procesos != 1 else None
+    try:
+        resultados = pool.map(_leer, archivos, chunksize=bloque) if pool else map(_leer, archivos)
+        for ruta, arreglos, error in resultados:
+            simbolo = simbolo_de(ruta)
+            if error is not None:
+                errores[simbolo] = error
+                continue
+            if arreglos is None:
+                vacios.append(simbolo)
+                continue
+            n = len(arreglos["Date"])
+            for c, f in salidas.items():
+                f.write(np.ascontiguousarray(arreglos[c], dtype=TIPOS[c]).tobytes())
+            indice[simbolo] = [filas, filas + n]
+            filas += n
+    finally:
+        for f in salidas.values():
+            f.close()
+        if pool:
+            pool.shutdown()
+
+    meta = {
+        "filas": filas,
+        "tipos": {c: np.dtype(t).str for c, t in TIPOS.items()},
+        "indice": indice,
+        "vacios": vacios,
+        "errores": errores,
+        "fuentes": _fuentes(archivos),
+    }
+    tmp = f"{meta_ruta}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_ruta)
+    return Almacen(destino)
+
+
+def abrir(origen, destino, procesos=None, patron=PATRON):
+    """
+    El almacén de `destino`, convirtiendo antes los archivos de `origen` si
+    no hay almacén o si algún archivo se agregó, borró o modificó.
+    """
+    archivos = listar(origen, patron)
+    try:
+        with open(os.path.join(destino, META)) as f:
+            vigente = json.load(f)["fuentes"] == _fuentes(archivos)
+    except FileNotFoundError:
+        vigente = False
+    return Almacen(destino) if vigente else convertir(archivos, destino, procesos)
+
+
+class Almacen:
+    """Lectura del almacén escrito por `convertir`; las columnas se mapean, no se cargan."""
+
+    def __init__(self, carpeta):
+        with open(os.path.join(carpeta, META)) as f:
+            meta = json.load(f)
+        self.carpeta = carpeta
+        self.indice = meta["indice"]
+        self.vacios = meta["vacios"]
+        self.errores = meta["errores"]
+        self.filas = meta["filas"]
+        self.columnas = {
+            c: (np.memmap(os.path.join(carpeta, f"{c}.bin"), dtype=np.dtype(t), mode="r", shape=(self.filas,))
+                if self.filas else np.empty(0, dtype=np.dtype(t)))
+            for c, t in meta["tipos"].items()
+        }
+
+    def __contains__(self, simbolo):
+        return simbolo in self.indice
+
+    def __len__(self):
+        return len(self.indice)
+
+    def simbolos(self):
+        return list(self.indice)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.columnas.values())
+
+    def _rango(self, simbolo, inicio, fin):
+        a, b = self.indice[simbolo]
+        if inicio is None and fin is None:
+            return a, b
+        fechas = self.columnas["Date"][a:b]
+        if inicio is not None:
+            a += int(np.searchsorted(fechas, _dia(inicio), side="left"))
+        if fin is not None:
+            b = self.indice[simbolo][0] + int(np.searchsorted(fechas, _dia(fin), side="left"))
+        return a, max(a, b)
+
+    def arreglos(self, simbolo, inicio=None, fin=None, columnas=None):
+        """
+        Vistas sin copia de las columnas de `simbolo` con fechas en [inicio,
+        fin) ('YYYY-MM-DD', datetime64 o Timestamp). 'Date' viene en días
+        desde 1970-01-01; `.astype("datetime64[D]")` la convierte.
+        """
+        a, b = self._rango(simbolo, inicio, fin)
+        return {c: self.columnas[c][a:b] for c in (columnas or COLUMNAS)}
+
+    def frame(self, simbolo, inicio=None, fin=None, columnas=None):
+        """
+        Las columnas de `simbolo` como el DataFrame de `pd.read_csv` de los
+        notebooks ('Date' como fecha, no como texto), con los tipos compactos.
+        """
+        import pandas as pd
+
+        columnas = columnas or COLUMNAS
+        arreglos = self.arreglos(simbolo, inicio, fin, columnas)
+        datos = {c: np.array(a) for c, a in arreglos.items()}
+        if "Date" in datos:
+            datos["Date"] = datos["Date"].astype("datetime64[D]").astype("datetime64[ns]")
+        return pd.DataFrame(datos, columns=columnas)
+
+    def panel(self, simbolos=None, columna="Close", inicio=None, fin=None):
+        """Una columna de varios símbolos como matriz fechas x símbolos (NaN donde un símbolo no cotiza)."""
+        import pandas as pd
+
+        series = {}
+        for s in (self.simbolos() if simbolos is None else simbolos):
+            a = self.arreglos(s, inicio, fin, ["Date", columna])
+            series[s] = pd.Series(np.asarray(a[columna]), index=a["Date"].astype("datetime64[D]").astype("datetime64[ns]"))
+        panel = pd.DataFrame(series)
+        panel.index.name = "Date"
+        return panel
+
+
+def _dia(fecha):
+    return np.datetime64(fecha, "D").astype(np.int64)
+
+
+def escribir_sintetico(carpeta, n_archivos, filas=2500, seed=0, vacios=0.01):
+    """
+    `n_archivos` archivos con el formato del conjunto Kaggle
+    (Date,Open,High,Low,Close,Volume,OpenInt), de hasta `filas` filas, con
+    una fracción `vacios` de archivos de 0 bytes. Devuelve las rutas.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(carpeta, exist_ok=True)
+    fin = np.datetime64("2017-11-10")
+    rutas = []
+    for i in range(n_archivos):
+        ruta = os.path.join(carpeta, f"s{i:05d}.us.txt")
+        rutas.append(ruta)
+        if rng.random() < vacios:
+            open(ruta, "w").close()
+            continue
+        n = int(rng.integers(filas // 10, filas + 1))
+        fechas = np.busday_offset(fin, -np.arange(n)[::-1], roll="backward")
+        cierre = rng.uniform(5, 200) * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+        apertura = cierre * (1 + rng.normal(0, 0.005, n))
+        rango = np.abs(rng.normal(0, 0.01, n)) * cierre
+        volumen = rng.integers(1_000, 50_000_000, n)
+        lineas = [
+            f"{d},{o:.4f},{h:.4f},{l:.4f},{c:.4f},{v},0"
+            for d, o, h, l, c, v in zip(fechas.astype(str), apertura, np.maximum(apertura, cierre) + rango,
+                                        np.minimum(apertura, cierre) - rango, cierre, volumen)
+        ]
+        with open(ruta, "w") as f:
+            f.write("Date,Open,High,Low,Close,Volume,OpenInt\n" + "\n".join(lineas) + "\n")
+    return rutas
+
+
+def _memoria_anonima():
+    # RssAnon (bytes): memoria propia del proceso; las páginas de un memmap
+    # son del archivo y el sistema puede descartarlas, así que no cuentan.
+    with open("/proc/self/status") as f:
+        for linea in f:
+            if linea.startswith("RssAnon:"):
+                return int(linea.split()[1]) * 1024
+    return 0
+
+
+if __name__ == "__main__":
+    # Carga de todo el conjunto: read_csv por archivo (como los notebooks)
+    # frente a convertir una vez y servir desde el almacén, con archivos
+    # sintéticos del mismo formato:
+    #   python almacen.py --archivos 2000 --filas 2500 --procesos 4
+    #   python almacen.py --origen HSM/stocks        # el conjunto real
+    import argparse
+    import gc
+    import tempfile
+    import time
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--origen", help="carpeta con los *.txt; sin ella se generan archivos sintéticos")
+    parser.add_argument("--archivos", type=int, default=2000)
+    parser.add_argument("--filas", type=int, default=2500)
+    parser.add_argument("--procesos", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archivos = listar(args.origen) if args.origen else escribir_sintetico(
+            os.path.join(tmp, "stocks"), args.archivos, args.filas)
+        tam = sum(os.path.getsize(r) for r in archivos)
+        print(f"{len(archivos)} archivos, {tam / 2**20:.0f} MiB de texto, {os.cpu_count()} núcleos")
+
+        # Como en los notebooks, un read_csv por archivo con los tipos por omisión;
+        # para entrenar sobre todo el conjunto hay que tenerlos todos en memoria.
+        gc.collect()
+        base = _memoria_anonima()
+        inicio = time.perf_counter()
+        frames = {}
+        for ruta in archivos:
+            try:
+                frames[simbolo_de(ruta)] = pd.read_csv(ruta, delimiter=",", usecols=COLUMNAS)
+            except pd.errors.EmptyDataError:
+                pass
+        t_csv = time.perf_counter() - inicio
+        m_csv = _memoria_anonima() - base
+        en_memoria = sum(df.memory_usage(deep=True).sum() for df in frames.values())
+        filas = sum(len(df) for df in frames.values())
+        print(f"  {'read_csv por archivo':<28} {t_csv:7.2f}s  memoria {m_csv / 2**20:7.0f} MiB "
+              f"(DataFrames {en_memoria / 2**20:.0f} MiB)  {filas:,} filas")
+        muestra = list(frames)[::max(1, len(frames) // 50)]
+        referencia = {s: frames[s] for s in muestra}
+        del frames
+        gc.collect()
+
+        destino = os.path.join(tmp, "almacen")
+        inicio = time.perf_counter()
+        almacen = convertir(archivos, destino, args.procesos)
+        t_conv = time.perf_counter() - inicio
+        print(f"  {'conversión (una vez)':<28} {t_conv:7.2f}s  almacén {almacen.nbytes / 2**20:7.0f} MiB  "
+              f"{len(almacen)} símbolos, {len(almacen.vacios)} vacíos, {len(almacen.errores)} con error")
+
+        del almacen
+        gc.collect()
+        base = _memoria_anonima()
+        inicio = time.perf_counter()
+        almacen = abrir(args.origen or os.path.dirname(archivos[0]), destino)
+        t_abrir = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        total = sum(float(almacen.arreglos(s, columnas=["Close"])["Close"].sum(dtype=np.float64))
+                    for s in almacen.simbolos())
+        t_todo = time.perf_counter() - inicio
+        m_alm = _memoria_anonima() - base
+        print(f"  {'abrir + leer todo':<28} {t_abrir + t_todo:7.2f}s  memoria {m_alm / 2**20:7.0f} MiB "
+              f"(abrir {t_abrir * 1000:.0f} ms, sin reconversión)")
+
+        rng = np.random.default_rng(1)
+        simbolos = almacen.simbolos()
+        consultas = [simbolos[i] for i in rng.integers(0, len(simbolos), 1000)]
+        inicio = time.perf_counter()
+        for s in consultas:
+            almacen.frame(s, "2012-01-01", "2014-01-01")
+        t_frame = (time.perf_counter() - inicio) / len(consultas)
+        print(f"  {'frame(símbolo, 2 años)':<28} {t_frame * 1e6:7.0f} µs por consulta")
+
+        diferencias = 0
+        for s, df in referencia.items():
+            nuevo = almacen.frame(s)
+            diferencias += int(not (
+                np.array_equal(pd.to_datetime(df["Date"]).to_numpy(), nuevo["Date"].to_numpy())
+                and np.allclose(df[COLUMNAS[1:]].to_numpy(np.float64), nuevo[COLUMNAS[1:]].to_numpy(np.float64),
+                                rtol=1e-6)
+            ))
+        print(f"  mismos datos que read_csv en {len(referencia) - diferencias}/{len(referencia)} símbolos revisados")
@@ -0,0 +1,396 @@
+# caracteristicas.py
+"""
+Rasgos y objetivo del XGBoost de XGB-LSTM-V1.ipynb para todo el universo, con entrenamiento fuera de memoria.
+
+El notebook arma el objetivo (retorno a 90 días sobre +8%: compra, bajo
+-8%: venta, si no: mantener) y los rasgos OHLCV + indicadores de un solo
+ticker en pandas, sobremuestrea y entrena `XGBClassifier` con todo en
+memoria. Aquí:
+
+- `rasgos` es el mismo cálculo del notebook para un ticker;
+- `construir` lo corre para muchos símbolos del `almacen.Almacen` en un pool
+  de procesos y escribe el resultado en partes `.npz` (X float32, y int8)
+  de a lo más `filas_por_parte` filas, y un manifiesto `partes.json` con
+  filas y clases por parte. El corte temporal del notebook (el primer 80%
+  para entrenar) es una sola fecha para todos los símbolos (`corte_temporal`),
+  así ninguna fila de entrenamiento cae en el período de prueba de otro
+  ticker; las filas cuyo objetivo a 90 días termina después del corte
+  quedan fuera de ambos conjuntos;
+- `entrenar` recorre las partes con un `xgboost.DataIter`: con
+  `modo="externa"` arma un `ExtMemQuantileDMatrix`, que deja las páginas
+  cuantizadas en disco, y con `modo="cuantil"` un `QuantileDMatrix`, que
+  las deja en memoria (1 byte por rasgo y fila) sin materializar nunca la
+  matriz completa en float. En ambos casos solo una parte está en memoria
+  como float a la vez.
+
+El sobremuestreo de `RandomOverSampler(sampling_strategy="not majority")`
+se reemplaza por pesos por clase (mayoritaria / clase), su equivalente en
+esperanza, que no necesita copiar filas.
+"""
+import json
+import os
+
+import numpy as np
+
+FEATURES = ["Open", "High", "Low", "Close", "Volume",
+            "return_1", "volatility", "sma_5", "sma_20",
+            "ema_10", "rsi", "macd"]
+HORIZONTE = 90
+UMBRAL = 0.08
+VENTA, MANTENER, COMPRA = 0, 1, 2
+CLASES = ["Sell", "Hold", "Buy"]
+FRACCION_ENTRENAMIENTO = 0.8
+FILAS_POR_PARTE = 250_000
+SIMBOLOS_POR_TAREA = 64
+MANIFIESTO = "partes.json"
+PARAMETROS = {
+    # Los del XGBClassifier del notebook, con el método de histograma que
+    # usan los DMatrix cuantizados.
+    "objective": "multi:softmax", "num_class": 3, "eval_metric": "mlogloss",
+    "max_depth": 6, "eta": 0.05, "tree_method": "hist",
+}
+NUM_RONDAS = 300
+
+
+def rasgos(df):
+    """
+    Objetivo y rasgos de un ticker, como la primera celda del notebook: un
+    DataFrame con 'Date', `FEATURES` y 'target', sin filas con NaN.
+    """
+    df = df.sort_values("Date").reset_index(drop=True)
+
+    # Retorno en 90 días y objetivo multiclase con umbral ±8%
+    df["return_90"] = df["Close"].shift(-HORIZONTE) / df["Close"] - 1
+    df["target"] = MANTENER
+    df.loc[df["return_90"] > UMBRAL, "target"] = COMPRA
+    df.loc[df["return_90"] < -UMBRAL, "target"] = VENTA
+    df = df.dropna().reset_index(drop=True)
+
+    df["return_1"] = df["Close"].pct_change()
+    df["volatility"] = df["High"] - df["Low"]
+    df["sma_5"] = df["Close"].rolling(5).mean()
+    df["sma_20"] = df["Close"].rolling(20).mean()
+    df["ema_10"] = df["Close"].ewm(span=10, adjust=False).mean()
+
+    delta = df["Close"].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+    df["rsi"] = 100 - (100 / (1 + gain / loss))
+
+    ema_12 = df["Close"].ewm(span=12, adjust=False).mean()
+    ema_26 = df["Close"].ewm(span=26, adjust=False).mean()
+    df["macd"] = ema_12 - ema_26
+
+    return df[["Date"] + FEATURES + ["target"]].dropna().reset_index(drop=True)
+
+
+class _Escritor:
+    """Acumula filas de un conjunto y las escribe en partes de hasta `limite` filas."""
+
+    def __init__(self, destino, prefijo, limite):
+        self.destino = destino
+        self.prefijo = prefijo
+        self.limite = limite
+        self.partes = []
+        self._X, self._y, self._n = [], [], 0
+
+    def agregar(self, X, y):
+        self._X.append(X)
+        self._y.append(y)
+        self._n += len(y)
+        if self._n >= self.limite:
+            self.cerrar()
+
+    def cerrar(self):
+        if not self._n:
+            return
+        archivo = f"{self.prefijo}_{len(self.partes):03d}.npz"
+        y = np.concatenate(self._y)
+        np.savez(os.path.join(self.destino, archivo), X=np.concatenate(self._X), y=y)
+        self.partes.append({"archivo": archivo, "filas": int(len(y)),
+                            "clases": np.bincount(y, minlength=len(CLASES)).tolist()})
+        self._X, self._y, self._n = [], [], 0
+
+
+def corte_temporal(almacen, simbolos, fraccion=FRACCION_ENTRENAMIENTO):
+    """
+    Primer día de prueba (datetime64[D]) común a `simbolos`: antes de él
+    queda la `fraccion` de todas sus filas. None si no tienen filas.
+    """
+    fechas = almacen.columnas["Date"]
+    if not len(fechas):
+        return None
+    base = int(fechas.min())
+    conteos = np.zeros(int(fechas.max()) - base + 1, dtype=np.int64)
+    for s in simbolos:
+        a, b = almacen.indice[s]
+        conteos += np.bincount(np.asarray(fechas[a:b], dtype=np.int64) - base, minlength=len(conteos))
+    acumulado = np.cumsum(conteos)
+    if not acumulado[-1]:
+        return None
+    dia = base + int(np.searchsorted(acumulado, fraccion * acumulado[-1], side="right"))
+    return np.datetime64(dia, "D")
+
+
+def _construir_tarea(carpeta_almacen, simbolos, destino, tarea, filas_por_parte, corte):
+    # Corre en los procesos del pool: cada tarea abre el almacén (solo
+    # memmaps) y escribe sus propias partes.
+    from almacen import Almacen
+
+    almacen = Almacen(carpeta_almacen)
+    escritores = {conjunto: _Escritor(destino, f"{conjunto}_{tarea:05d}", filas_por_parte)
+                  for conjunto in ("entrenamiento", "prueba")}
+    usados = []
+    for s in simbolos:
+        df = almacen.frame(s, columnas=["Date", "Open", "High", "Low", "Close", "Volume"])
+        fechas = np.sort(df["Date"].to_numpy())
+        df = rasgos(df.astype({c: np.float64 for c in df.columns if c != "Date"}))
+        if len(df) < 2:
+            continue
+        X = df[FEATURES].to_numpy(dtype=np.float32)
+        y = df["target"].to_numpy(dtype=np.int8)
+        # Fecha de cada fila y del cierre HORIZONTE filas después que fija su objetivo.
+        fecha = df["Date"].to_numpy()
+        objetivo = fechas[np.searchsorted(fechas, fecha) + HORIZONTE]
+        entrenamiento = objetivo < corte
+        prueba = fecha >= corte
+        escritores["entrenamiento"].agregar(X[entrenamiento], y[entrenamiento])
+        escritores["prueba"].agregar(X[prueba], y[prueba])
+        usados.append(s)
+    for e in escritores.values():
+        e.cerrar()
+    return {conjunto: e.partes for conjunto, e in escritores.items()}, usados
+
+
+def construir(almacen, destino, simbolos=None, procesos=None, filas_por_parte=FILAS_POR_PARTE,
+              fraccion=FRACCION_ENTRENAMIENTO, simbolos_por_tarea=SIMBOLOS_POR_TAREA):
+    """
+    Rasgos de `simbolos` (todos los del almacén por omisión) en `procesos`
+    procesos, escritos en `destino`, con el corte de `corte_temporal` en
+    `fraccion`. Devuelve el manifiesto, que también queda en
+    `destino/partes.json`.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    os.makedirs(destino, exist_ok=True)
+    simbolos = almacen.simbolos() if simbolos is None else list(simbolos)
+    tareas = [simbolos[i:i + simbolos_por_tarea] for i in range(0, len(simbolos), simbolos_por_tarea)]
+    corte = corte_temporal(almacen, simbolos, fraccion)
+    argumentos = [(almacen.carpeta, lote, destino, k, filas_por_parte, corte) for k, lote in enumerate(tareas)]
+
+    manifiesto = {"features": FEATURES, "clases": CLASES, "simbolos": [],
+                  "corte": None if corte is None else str(corte),
+                  "entrenamiento": [], "prueba": []}
+    if procesos == 1:
+        resultados = (_construir_tarea(*a) for a in argumentos)
+    else:
+        pool = ProcessPoolExecutor(procesos)
+        resultados = pool.map(_construir_tarea, *zip(*argumentos)) if argumentos else []
+    try:
+        for partes, usados in resultados:
+            manifiesto["simbolos"].extend(usados)
+            for conjunto, lista in partes.items():
+                manifiesto[conjunto].extend(lista)
+    finally:
+        if procesos != 1:
+            pool.shutdown()
+
+    with open(os.path.join(destino, MANIFIESTO), "w") as f:
+        json.dump(manifiesto, f)
+    return manifiesto
+
+
+def leer_manifiesto(destino):
+    with open(os.path.join(destino, MANIFIESTO)) as f:
+        return json.load(f)
+
+
+def pesos_por_clase(manifiesto, conjunto="entrenamiento"):
+    """Peso de cada clase: filas de la clase mayoritaria / filas de la clase."""
+    conteos = np.sum([p["clases"] for p in manifiesto[conjunto]], axis=0) if manifiesto[conjunto] else np.zeros(3)
+    return np.where(conteos > 0, conteos.max() / np.maximum(conteos, 1), 0.0)
+
+
+def partes(destino, conjunto="entrenamiento"):
+    """Genera (X, y) de cada parte de `conjunto`, una en memoria a la vez."""
+    for p in leer_manifiesto(destino)[conjunto]:
+        with np.load(os.path.join(destino, p["archivo"])) as datos:
+            yield datos["X"], datos["y"]
+
+
+def _iterador(destino, conjunto, pesos, cache):
+    import xgboost
+
+    class Iterador(xgboost.DataIter):
+        # Una parte por llamada a `next`; XGBoost vuelve a recorrerlas con
+        # `reset` cada vez que necesita los datos.
+        def __init__(self):
+            self._archivos = [p["archivo"] for p in leer_manifiesto(destino)[conjunto]]
+            self._i = 0
+            super().__init__(cache_prefix=cache)
+
+        def next(self, input_data):
+            if self._i == len(self._archivos):
+                return False
+            with np.load(os.path.join(destino, self._archivos[self._i])) as datos:
+                X, y = datos["X"], datos["y"]
+            input_data(data=X, label=y, weight=None if pesos is None else pesos[y])
+            self._i += 1
+            return True
+
+        def reset(self):
+            self._i = 0
+
+    return Iterador()
+
+
+def entrenar(destino, modo="externa", num_rondas=NUM_RONDAS, parametros=None, sobremuestreo=True,
+             max_bin=256):
+    """
+    Entrena sobre las partes de entrenamiento de `destino` sin cargarlas
+    juntas. `modo` es "externa" (ExtMemQuantileDMatrix, páginas en disco,
+    junto a las partes) o "cuantil" (QuantileDMatrix en memoria). Devuelve
+    (booster, informe) con filas, segundos de construcción y de
+    entrenamiento, y filas x rondas por segundo.
+    """
+    import time
+    import xgboost
+
+    manifiesto = leer_manifiesto(destino)
+    pesos = pesos_por_clase(manifiesto) if sobremuestreo else None
+    inicio = time.perf_counter()
+    if modo == "externa":
+        datos = xgboost.ExtMemQuantileDMatrix(
+            _iterador(destino, "entrenamiento", pesos, os.path.join(destino, "cache")), max_bin=max_bin)
+    elif modo == "cuantil":
+        datos = xgboost.QuantileDMatrix(_iterador(destino, "entrenamiento", pesos, None), max_bin=max_bin)
+    else:
+        raise ValueError(f"modo desconocido: {modo!r}")
+    construccion = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    booster = xgboost.train({**PARAMETROS, "max_bin": max_bin, **(parametros or {})}, datos, num_rondas)
+    segundos = time.perf_counter() - inicio
+    filas = datos.num_row()
+    return booster, {
+        "filas": filas,
+        "construccion_s": construccion,
+        "entrenamiento_s": segundos,
+        "filas_rondas_por_s": filas * num_rondas / segundos,
+    }
+
+
+def evaluar(booster, destino, conjunto="prueba"):
+    """Matriz de confusión (real x predicción) sobre `conjunto`, parte por parte."""
+    import xgboost
+
+    matriz = np.zeros((len(CLASES), len(CLASES)), dtype=np.int64)
+    for X, y in partes(destino, conjunto):
+        pred = booster.predict(xgboost.DMatrix(X)).astype(np.int64)
+        np.add.at(matriz, (y.astype(np.int64), pred), 1)
+    return matriz
+
+
+def _memoria_maxima():
+    # Pico de memoria residente del proceso (VmHWM), en bytes.
+    with open("/proc/self/status") as f:
+        for linea in f:
+            if linea.startswith("VmHWM:"):
+                return int(linea.split()[1]) * 1024
+    return 0
+
+
+def _medir_en_proceso(fn, *args):
+    # Cada modo en un proceso nuevo, para que su pico de memoria sea solo suyo.
+    import multiprocessing
+
+    def correr(cola):
+        resultado = fn(*args)
+        cola.put((resultado, _memoria_maxima()))
+
+    contexto = multiprocessing.get_context("fork")
+    cola = contexto.Queue()
+    proceso = contexto.Process(target=correr, args=(cola,))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    return resultado
+
+
+if __name__ == "__main__":
+    # Rasgos de un universo sintético con el formato del conjunto Kaggle y
+    # entrenamiento en memoria (como el notebook, todas las filas juntas y
+    # sobremuestreadas) frente a las partes por DataIter:
+    #   python caracteristicas.py --archivos 400 --filas 4000 --rondas 50
+    import argparse
+    import tempfile
+    import time
+
+    import almacen as alm
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--origen", help="carpeta con los *.txt; sin ella se generan archivos sintéticos")
+    parser.add_argument("--archivos", type=int, default=400)
+    parser.add_argument("--filas", type=int, default=4000)
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--filas-por-parte", type=int, default=FILAS_POR_PARTE)
+    parser.add_argument("--rondas", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        origen = args.origen or os.path.dirname(alm.escribir_sintetico(
+            os.path.join(tmp, "stocks"), args.archivos, args.filas)[0])
+        almacen = alm.abrir(origen, os.path.join(tmp, "almacen"), args.procesos)
+
+        # El cálculo es el del notebook, aplicado a un read_csv del mismo archivo.
+        import pandas as pd
+        s = almacen.simbolos()[0]
+        ref = rasgos(pd.read_csv(os.path.join(origen, f"{s}.txt"), usecols=alm.COLUMNAS))
+        nuevo = rasgos(almacen.frame(s).astype({c: np.float64 for c in alm.COLUMNAS[1:]}))
+        escala = np.abs(ref[FEATURES].to_numpy()).max(axis=0)
+        diff = np.abs(nuevo[FEATURES].to_numpy() - ref[FEATURES].to_numpy()).max(axis=0) / escala
+        print(f"{s}: mismo objetivo que el notebook {np.array_equal(ref['target'], nuevo['target'])}, "
+              f"max diff de rasgos {diff.max():.1e} de su escala (precios en float32)")
+
+        destino = os.path.join(tmp, "rasgos")
+        inicio = time.perf_counter()
+        manifiesto = construir(almacen, destino, procesos=args.procesos, filas_por_parte=args.filas_por_parte)
+        segundos = time.perf_counter() - inicio
+        filas = {c: sum(p["filas"] for p in manifiesto[c]) for c in ("entrenamiento", "prueba")}
+        print(f"  rasgos de {len(manifiesto['simbolos'])} símbolos en {segundos:.1f}s "
+              f"({os.cpu_count()} núcleos): {filas['entrenamiento']:,} filas de entrenamiento en "
+              f"{len(manifiesto['entrenamiento'])} partes, {filas['prueba']:,} de prueba")
+
+        def en_memoria():
+            # Como el notebook: todo junto, con las filas sobremuestreadas copiadas.
+            import xgboost
+            X = np.concatenate([X for X, _ in partes(destino)]).astype(np.float64)
+            y = np.concatenate([y for _, y in partes(destino)])
+            conteos = np.bincount(y, minlength=3)
+            rng = np.random.default_rng(42)
+            extra = np.concatenate([rng.choice(np.flatnonzero(y == c), conteos.max() - conteos[c])
+                                    for c in range(3) if 0 < conteos[c] < conteos.max()] or [np.empty(0, int)])
+            indices = np.concatenate([np.arange(len(y)), extra])
+            inicio = time.perf_counter()
+            datos = xgboost.DMatrix(X[indices], label=y[indices])
+            construccion = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            xgboost.train(PARAMETROS, datos, args.rondas)
+            s = time.perf_counter() - inicio
+            return {"filas": datos.num_row(), "construccion_s": construccion, "entrenamiento_s": s,
+                    "filas_rondas_por_s": datos.num_row() * args.rondas / s}
+
+        def por_partes(modo):
+            booster, informe = entrenar(destino, modo, args.rondas)
+            matriz = evaluar(booster, destino)
+            informe["exactitud"] = float(np.trace(matriz) / max(matriz.sum(), 1))
+            return informe
+
+        for nombre, fn, extra in (("en memoria (notebook)", en_memoria, ()),
+                                  ("QuantileDMatrix", por_partes, ("cuantil",)),
+                                  ("ExtMemQuantileDMatrix", por_partes, ("externa",))):
+            informe, pico = _medir_en_proceso(fn, *extra)
+            exactitud = f"  exactitud de prueba {informe['exactitud']:.3f}" if "exactitud" in informe else ""
+            print(f"  {nombre:<24} pico {pico / 2**20:6.0f} MiB  {informe['filas']:>10,} filas  "
+                  f"construcción {informe['construccion_s']:5.1f}s  entrenamiento {informe['entrenamiento_s']:6.1f}s  "
+                  f"{informe['filas_rondas_por_s']:12,.0f} filas x rondas/s{exactitud}")
@@ -0,0 +1,291 @@
+# entorno.py
+"""
+Entorno de trading sobre arreglos para los experimentos DQN.
+
+`Entorno` tiene la misma semántica que `Environment1` de
+deep-reinforcement-learning-on-stock-data.ipynb (acciones 0: mantener,
+1: comprar, 2: vender todo; recompensa recortada a -1/0/1; observación
+[valor de la posición] + últimas `history_t` diferencias de cierre), pero:
+
+- los cierres se precargan una vez en un arreglo float32, en vez de leer
+  `data.iloc[t, :]['Close']` en cada paso;
+- la posición es un contador y un costo acumulado, no una lista que se
+  recorre para valorizarla;
+- la historia no se reconstruye: las diferencias de cierre se calculan una
+  vez y la ventana del paso t es una vista sobre ese arreglo.
+
+`EntornoVectorizado` avanza K entornos independientes (distintos tickers o
+puntos de partida) en una sola llamada con operaciones de NumPy.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+MANTENER, COMPRAR, VENDER = 0, 1, 2
+
+
+def _cierres(data):
+    if hasattr(data, "columns"):
+        data = data["Close"]
+    return np.asarray(data, dtype=np.float32)
+
+
+def _diferencias(cierres, history_t):
+    # Diferencias de cierre precedidas por `history_t` ceros: la historia del
+    # paso t (con ceros antes del inicio, como en Environment1) es
+    # diferencias[t:t + history_t].
+    return np.concatenate([np.zeros(history_t, dtype=np.float32), np.diff(cierres)])
+
+
+def _recortar(recompensa):
+    return 1 if recompensa > 0 else -1 if recompensa < 0 else 0
+
+
+class Entorno:
+    """
+    Reemplazo de `Environment1`: mismas acciones, recompensas, `profits` y
+    observaciones (como arreglo float32 de largo history_t + 1). `data` se
+    conserva para los gráficos del notebook; `done` sigue siendo siempre
+    False y el entrenamiento se corta en `len(data) - 1` pasos.
+    """
+
+    def __init__(self, data, history_t=90):
+        self.data = data
+        self.history_t = history_t
+        self.cierres = _cierres(data)
+        self._historia = sliding_window_view(_diferencias(self.cierres, history_t), history_t)
+        self.reset()
+
+    def reset(self):
+        self.t = 0
+        self.done = False
+        self.profits = 0
+        self.n_posiciones = 0
+        self.costo = 0.0
+        self.position_value = 0
+        return self._obs()
+
+    def _obs(self):
+        obs = np.empty(self.history_t + 1, dtype=np.float32)
+        obs[0] = self.position_value
+        obs[1:] = self._historia[self.t]
+        return obs
+
+    def step(self, act):
+        reward = 0
+        cierre = float(self.cierres[self.t])
+
+        if act == COMPRAR:
+            self.n_posiciones += 1
+            self.costo += cierre
+        elif act == VENDER:
+            if self.n_posiciones == 0:
+                reward = -1
+            else:
+                profits = self.n_posiciones * cierre - self.costo
+                reward += profits
+                self.profits += profits
+                self.n_posiciones = 0
+                self.costo = 0.0
+
+        self.t += 1
+        self.position_value = self.n_posiciones * float(self.cierres[self.t]) - self.costo
+        return self._obs(), _recortar(reward), self.done
+
+
+class EntornoVectorizado:
+    """
+    K entornos `Entorno` avanzados juntos. `precios` es una serie de cierres
+    o una lista de ellas (un DataFrame con 'Close' también sirve); el entorno
+    k opera sobre `series[k]` desde el índice `inicios[k]`, como si fuera
+    `Entorno(precios[series[k]][inicios[k]:])`.
+
+    `step(acts)` recibe K acciones y devuelve (obs (K, history_t + 1),
+    recompensas (K,), fin (K,)), donde `fin` marca los entornos que llegaron
+    a su último cierre; esos deben reiniciarse con `reset(indices)` antes del
+    siguiente paso.
+    """
+
+    def __init__(self, precios, history_t=90, series=None, inicios=None):
+        # Una sola serie: DataFrame, Series o arreglo 1-D (sin indexar por
+        # posición, que en una Series con fechas es una etiqueta), o una lista de números.
+        if (hasattr(precios, "columns") or getattr(precios, "ndim", None) == 1
+                or (isinstance(precios, (list, tuple)) and np.ndim(precios[0]) == 0)):
+            precios = [precios]
+        cierres = [_cierres(p) for p in precios]
+        largos = np.array([len(c) for c in cierres])
+        self.history_t = history_t
+        self.cierres = np.concatenate(cierres)
+        self._base = np.concatenate([[0], np.cumsum(largos)[:-1]])
+        # Cada serie aporta history_t ceros + (largo - 1) diferencias.
+        self._base_historia = self._base + np.arange(len(cierres)) * (history_t - 1)
+        self._historia = sliding_window_view(
+            np.concatenate([_diferencias(c, history_t) for c in cierres]), history_t
+        )
+
+        # Por omisión, un entorno por serie desde el inicio (o todos sobre la primera serie si solo hay inicios).
+        if series is None:
+            series = np.arange(len(cierres)) if inicios is None else np.zeros(len(inicios))
+        self.series = np.asarray(series, dtype=np.int64)
+        self.inicios = np.zeros(len(self.series), dtype=np.int64) if inicios is None else np.asarray(inicios, dtype=np.int64)
+        self._ultimo = largos[self.series] - 1
+        if np.any(self.inicios >= self._ultimo) or np.any(self.inicios < 0):
+            raise ValueError("Cada inicio debe dejar al menos un paso antes del último cierre de su serie.")
+
+        self.k = len(self.series)
+        self.t = self.inicios.copy()
+        self.n_posiciones = np.zeros(self.k, dtype=np.int64)
+        self.costo = np.zeros(self.k)
+        self.position_value = np.zeros(self.k)
+        self.profits = np.zeros(self.k)
+        self._obs_buffer = np.empty((self.k, history_t + 1), dtype=np.float32)
+        self._columnas = np.arange(history_t)
+
+    def reset(self, indices=None):
+        """Reinicia todos los entornos o solo `indices`; devuelve las observaciones de los K."""
+        indices = slice(None) if indices is None else indices
+        self.t[indices] = self.inicios[indices]
+        self.n_posiciones[indices] = 0
+        self.costo[indices] = 0.0
+        self.position_value[indices] = 0.0
+        self.profits[indices] = 0.0
+        return self._obs()
+
+    def _obs(self):
+        obs = self._obs_buffer
+        obs[:, 0] = self.position_value
+        obs[:, 1:] = self._historia[self._base_historia[self.series] + self.t]
+        # Antes del inicio la historia es cero, como en un Entorno sobre la serie recortada.
+        antes = self._columnas + (self.t - self.inicios - self.history_t + 1)[:, None] <= 0
+        if antes.any():
+            obs[:, 1:][antes] = 0.0
+        return obs.copy()
+
+    def step(self, acts):
+        acts = np.asarray(acts)
+        if np.any(self.t >= self._ultimo):
+            raise ValueError("Hay entornos en su último cierre: reinícielos con reset(indices).")
+        base = self._base[self.series]
+        cierre = self.cierres[base + self.t].astype(np.float64)
+        reward = np.zeros(self.k)
+
+        compra = acts == COMPRAR
+        self.n_posiciones[compra] += 1
+        self.costo[compra] += cierre[compra]
+
+        venta = acts == VENDER
+        reward[venta & (self.n_posiciones == 0)] = -1.0
+        cierra = venta & (self.n_posiciones > 0)
+        profits = self.n_posiciones[cierra] * cierre[cierra] - self.costo[cierra]
+        reward[cierra] = profits
+        self.profits[cierra] += profits
+        self.n_posiciones[cierra] = 0
+        self.costo[cierra] = 0.0
+
+        self.t += 1
+        self.position_value = self.n_posiciones * self.cierres[base + self.t].astype(np.float64) - self.costo
+        return self._obs(), np.sign(reward).astype(np.float32), self.t >= self._ultimo
+
+
+class _Environment1:
+    """`Environment1` original del notebook, conservado como referencia del benchmark."""
+
+    def __init__(self, data, history_t=90):
+        self.data = data
+        self.history_t = history_t
+        self.reset()
+
+    def reset(self):
+        self.t = 0
+        self.done = False
+        self.profits = 0
+        self.positions = []
+        self.position_value = 0
+        self.history = [0 for _ in range(self.history_t)]
+        return [self.position_value] + self.history # obs
+
+    def step(self, act):
+        reward = 0
+
+        # act = 0: stay, 1: buy, 2: sell
+        if act == 1:
+            self.positions.append(self.data.iloc[self.t, :]['Close'])
+        elif act == 2: # sell
+            if len(self.positions) == 0:
+                reward = -1
+            else:
+                profits = 0
+                for p in self.positions:
+                    profits += (self.data.iloc[self.t, :]['Close'] - p)
+                reward += profits
+                self.profits += profits
+                self.positions = []
+
+        # set next time
+        self.t += 1
+        self.position_value = 0
+        for p in self.positions:
+            self.position_value += (self.data.iloc[self.t, :]['Close'] - p)
+        self.history.pop(0)
+        self.history.append(self.data.iloc[self.t, :]['Close'] - self.data.iloc[(self.t-1), :]['Close'])
+
+        # clipping reward
+        if reward > 0:
+            reward = 1
+        elif reward < 0:
+            reward = -1
+
+        return [self.position_value] + self.history, reward, self.done # obs, reward, done
+
+
+if __name__ == "__main__":
+    # Pasos por segundo frente a Environment1, con precios sintéticos:
+    #   python entorno.py --pasos 2000 --k 64
+    import argparse
+    import time
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dias", type=int, default=3000)
+    parser.add_argument("--pasos", type=int, default=2000)
+    parser.add_argument("--k", type=int, nargs="+", default=[16, 256])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    precios = (100 * np.exp(np.cumsum(rng.normal(0, 0.01, args.dias)))).astype(np.float32)
+    data = pd.DataFrame({"Open": precios, "High": precios, "Low": precios, "Close": precios},
+                        index=pd.bdate_range("2010-01-01", periods=args.dias))
+    pasos = min(args.pasos, args.dias - 1)
+    acts = rng.integers(0, 3, pasos)
+
+    def medir(env, fn):
+        env.reset()
+        inicio = time.perf_counter()
+        salida = [fn(env, a) for a in acts]
+        return pasos / (time.perf_counter() - inicio), salida
+
+    base, ref = medir(_Environment1(data), lambda env, a: env.step(a))
+    print(f"  {'Environment1':<28} {base:12,.0f} pasos/s")
+    rapido, nuevo = medir(Entorno(data), lambda env, a: env.step(a))
+    print(f"  {'Entorno':<28} {rapido:12,.0f} pasos/s  x{rapido / base:.0f}")
+    diff = max(float(np.abs(np.asarray(a[0], dtype=np.float32) - b[0]).max()) for a, b in zip(ref, nuevo))
+    iguales = sum(a[1] == b[1] for a, b in zip(ref, nuevo))
+    print(f"  {'':<28} recompensas iguales {iguales}/{pasos}  max diff obs {diff:.1e}")
+
+    for k in args.k:
+        # K entornos sobre la misma serie desde distintos inicios (el primero desde 0).
+        inicios = np.concatenate([[0], rng.integers(0, args.dias - pasos, k - 1)])
+        env = EntornoVectorizado(data, series=np.zeros(k, dtype=int), inicios=inicios)
+        acciones = np.tile(acts[:, None], (1, k))
+        env.reset()
+        inicio = time.perf_counter()
+        primeras = []
+        for a in acciones:
+            obs, r, fin = env.step(a)
+            primeras.append((obs[0], r[0]))
+        segundos = time.perf_counter() - inicio
+        diff = max(float(np.abs(np.asarray(a[0], dtype=np.float32) - b[0]).max()) for a, b in zip(ref, primeras))
+        iguales = sum(a[1] == b[1] for a, b in zip(ref, primeras))
+        print(f"  {f'EntornoVectorizado K={k}':<28} {pasos * k / segundos:12,.0f} pasos/s  "
+              f"x{pasos * k / segundos / base:.0f}  (entorno 0: recompensas iguales {iguales}/{pasos}, "
+              f"max diff obs {diff:.1e})")
@@ -0,0 +1,493 @@
+# evaluacion.py
+"""
+Evaluación walk-forward y búsqueda de hiperparámetros en paralelo para los modelos de los notebooks.
+
+Los notebooks (StockML, StockClassifier, XGB-LSTM-V1, LSTM) evalúan sobre un
+único corte (`int(len*0.8)` o 0.65), con el escalador y las ventanas
+rehechos en la misma celda. Aquí:
+
+- `pliegues_walk_forward` divide la serie en pliegues en el tiempo: cada
+  uno entrena con el pasado (ventana creciente o deslizante) y prueba con
+  el bloque siguiente, con una `separacion` opcional entre ambos para que
+  un objetivo a h días no filtre el futuro (90 para el de XGB-LSTM-V1);
+- la matriz escalada de cada pliegue (MinMax ajustado solo con su parte de
+  entrenamiento, como debe ser fuera de un notebook) se calcula una vez y
+  queda en `carpeta/cache` como `.npy`; todas las configuraciones la leen
+  con `mmap_mode="r"`, y las ventanas de `ventanas.crear_ventanas` son
+  vistas sobre ella, así que ningún tamaño de ventana copia filas;
+- `buscar` corre cada par (configuración, pliegue) en un pool de procesos,
+  con los hilos de TensorFlow, XGBoost y BLAS fijados por proceso para que
+  los procesos no compitan por los núcleos, y agrega cada resultado a
+  `carpeta/resultados.jsonl` apenas termina: una búsqueda interrumpida se
+  retoma con solo los pares que faltan.
+
+Los modelos están en `MODELOS` ("referencia", "xgb", "lstm"); cada uno
+recibe (config, X_ent, y_ent, X_pru, hilos) y devuelve las predicciones.
+"""
+import hashlib
+import itertools
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+CLASIFICACION = "clasificacion"
+REGRESION = "regresion"
+RESULTADOS = "resultados.jsonl"
+METRICA = {CLASIFICACION: "exactitud_balanceada", REGRESION: "rmse"}
+METRICA_ERROR = ("rmse", "mae", "mape")
+# Variables que fijan los hilos de cada biblioteca; deben estar antes de importarlas.
+VARIABLES_HILOS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                   "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS")
+
+
+@dataclass(frozen=True)
+class Pliegue:
+    k: int
+    inicio: int             # primera fila de entrenamiento
+    fin_entrenamiento: int  # exclusiva
+    inicio_prueba: int
+    fin: int                # exclusiva
+
+
+def pliegues_walk_forward(n, n_pliegues=5, min_entrenamiento=0.5, separacion=0, deslizante=False):
+    """
+    `n_pliegues` pliegues sobre `n` filas en orden temporal. Las filas desde
+    `min_entrenamiento` (fracción o número de filas) se reparten en bloques
+    de prueba iguales; el pliegue k entrena con todo lo anterior a su bloque
+    (o, con `deslizante`, con las `min_entrenamiento` filas anteriores),
+    menos las `separacion` filas justo antes de la prueba.
+    """
+    inicial = int(n * min_entrenamiento) if isinstance(min_entrenamiento, float) else int(min_entrenamiento)
+    bordes = np.linspace(inicial, n, n_pliegues + 1).astype(int)
+    pliegues = []
+    for k in range(n_pliegues):
+        fin_ent = bordes[k] - separacion
+        inicio = max(0, fin_ent - inicial) if deslizante else 0
+        if fin_ent <= inicio or bordes[k + 1] <= bordes[k]:
+            raise ValueError(f"El pliegue {k} queda sin filas de entrenamiento o de prueba.")
+        pliegues.append(Pliegue(k, int(inicio), int(fin_ent), int(bordes[k]), int(bordes[k + 1])))
+    return pliegues
+
+
+def grilla(modelo, base=None, **opciones):
+    """
+    Configuraciones de `modelo` para todas las combinaciones de `opciones`
+    (listas de valores), sobre la configuración `base`. Las claves con punto
+    van a `parametros`: grilla("xgb", **{"parametros.max_depth": [3, 6]}).
+    """
+    claves = list(opciones)
+    configuraciones = []
+    for valores in itertools.product(*(opciones[c] for c in claves)):
+        config = {"modelo": modelo, **json.loads(json.dumps(base or {}))}
+        for clave, valor in zip(claves, valores):
+            if clave.startswith("parametros."):
+                config.setdefault("parametros", {})[clave.split(".", 1)[1]] = valor
+            else:
+                config[clave] = valor
+        configuraciones.append(config)
+    return configuraciones
+
+
+def id_config(config):
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _huella(X, y):
+    h = hashlib.sha1()
+    for a in (X, y):
+        a = np.ascontiguousarray(a)
+        h.update(str((a.shape, a.dtype.str)).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()[:16]
+
+
+# --- Matrices por pliegue ---------------------------------------------------
+
+def _minmax(entrenamiento):
+    # MinMaxScaler de sklearn: (x - min) / (max - min), con rango 0 -> 1.
+    minimo = np.nanmin(entrenamiento, axis=0)
+    rango = np.nanmax(entrenamiento, axis=0) - minimo
+    return minimo, np.where(rango == 0, 1.0, rango)
+
+
+def _preparar(carpeta, huella, X, y, pliegue, escalar, tarea):
+    """
+    Escribe en `carpeta/cache` las filas [inicio, fin) del pliegue (X
+    escalado con MinMax ajustado en su entrenamiento si `escalar`; también y
+    si la tarea es regresión), salvo que ya estén. Devuelve el prefijo.
+    """
+    prefijo = os.path.join(carpeta, "cache", f"{huella}_{pliegue.inicio}_{pliegue.fin_entrenamiento}_"
+                                             f"{pliegue.fin}_{int(bool(escalar))}_{tarea}")
+    if os.path.exists(f"{prefijo}.json"):
+        return prefijo
+    os.makedirs(os.path.dirname(prefijo), exist_ok=True)
+    n_ent = pliegue.fin_entrenamiento - pliegue.inicio
+    Xp = np.asarray(X[pliegue.inicio:pliegue.fin], dtype=np.float32)
+    yp = np.asarray(y[pliegue.inicio:pliegue.fin])
+    meta = {"n_entrenamiento": n_ent, "y_minimo": None, "y_rango": None}
+    if escalar:
+        minimo, rango = _minmax(Xp[:n_ent])
+        Xp = ((Xp - minimo) / rango).astype(np.float32)
+        if tarea == REGRESION:
+            y_min, y_rango = _minmax(yp[:n_ent].reshape(len(yp[:n_ent]), -1).astype(np.float64))
+            yp = ((yp.reshape(len(yp), -1) - y_min) / y_rango).astype(np.float32).reshape(yp.shape)
+            meta.update(y_minimo=y_min.tolist(), y_rango=y_rango.tolist())
+    np.save(f"{prefijo}_X.npy", Xp)
+    np.save(f"{prefijo}_y.npy", yp)
+    with open(f"{prefijo}.json", "w") as f:  # al final: marca el pliegue como completo
+        json.dump(meta, f)
+    return prefijo
+
+
+def _datos_pliegue(prefijo, pliegue, ventana):
+    """(X_ent, y_ent, X_pru, y_pru, meta) del pliegue, como vistas sobre la caché."""
+    from ventanas import crear_ventanas
+
+    with open(f"{prefijo}.json") as f:
+        meta = json.load(f)
+    X = np.load(f"{prefijo}_X.npy", mmap_mode="r")
+    y = np.load(f"{prefijo}_y.npy", mmap_mode="r")
+    n_ent = meta["n_entrenamiento"]
+    desde = pliegue.inicio_prueba - pliegue.inicio
+    if not ventana:
+        return X[:n_ent], y[:n_ent], X[desde:], y[desde:], meta
+    # La ventana de la primera fila de prueba mira las `ventana` filas anteriores.
+    X_ent, y_ent = crear_ventanas(X[:n_ent], y[:n_ent], ventana)
+    X_pru, y_pru = crear_ventanas(X[desde - ventana:], y[desde - ventana:], ventana)
+    return X_ent, y_ent, X_pru, y_pru, meta
+
+
+# --- Modelos ---------------------------------------------------------------
+
+def _pesos_clase(y):
+    # Equivalente en esperanza de RandomOverSampler("not majority").
+    conteos = np.bincount(np.asarray(y, dtype=np.int64), minlength=3)
+    pesos = np.where(conteos > 0, conteos.max() / np.maximum(conteos, 1), 0.0)
+    return pesos[np.asarray(y, dtype=np.int64)]
+
+
+def _referencia(config, X_ent, y_ent, X_pru, hilos):
+    # La clase más frecuente del entrenamiento, o su media en regresión.
+    if config.get("tarea", CLASIFICACION) == CLASIFICACION:
+        return np.full(len(X_pru), np.bincount(np.asarray(y_ent, dtype=np.int64)).argmax())
+    return np.full((len(X_pru),) + np.shape(y_ent)[1:], float(np.mean(y_ent)))
+
+
+def _xgb(config, X_ent, y_ent, X_pru, hilos):
+    import xgboost
+    from caracteristicas import NUM_RONDAS, PARAMETROS
+
+    aplanar = lambda X: np.asarray(X).reshape(len(X), -1)
+    clasificacion = config.get("tarea", CLASIFICACION) == CLASIFICACION
+    parametros = dict(PARAMETROS) if clasificacion else {"objective": "reg:squarederror", "tree_method": "hist"}
+    parametros.update(config.get("parametros", {}), nthread=hilos)
+    pesos = _pesos_clase(y_ent) if clasificacion and config.get("sobremuestreo", True) else None
+    datos = xgboost.DMatrix(aplanar(X_ent), label=np.asarray(y_ent).ravel(), weight=pesos, nthread=hilos)
+    booster = xgboost.train(parametros, datos, config.get("rondas", NUM_RONDAS))
+    return booster.predict(xgboost.DMatrix(aplanar(X_pru), nthread=hilos))
+
+
+def _lstm(config, X_ent, y_ent, X_pru, hilos):
+    # La red de StockClassifier / StockML: LSTM(64) -> LSTM(32) con dropout.
+    import tensorflow as tf
+    from tensorflow.keras import layers, models
+    from ventanas import dataset_tf
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(hilos)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    except RuntimeError:
+        pass  # el runtime ya estaba iniciado en este proceso; quedan las variables de entorno
+    tf.random.set_seed(config.get("semilla", 42))
+    clasificacion = config.get("tarea", CLASIFICACION) == CLASIFICACION
+    unidades = config.get("unidades", [64, 32])
+    abandono = config.get("dropout", 0.2)
+    model = models.Sequential([
+        layers.Input(shape=X_ent.shape[1:]),
+        layers.LSTM(unidades[0], return_sequences=True),
+        layers.Dropout(abandono),
+        layers.LSTM(unidades[1]),
+        layers.Dropout(abandono),
+        layers.Dense(3, activation="softmax") if clasificacion else layers.Dense(1),
+    ])
+    model.compile(optimizer="adam", metrics=["accuracy"] if clasificacion else ["mae"],
+                  loss="sparse_categorical_crossentropy" if clasificacion else "mse")
+    # Validación con el final del entrenamiento, no con la prueba del pliegue.
+    n_val = max(1, int(len(X_ent) * config.get("validacion", 0.1)))
+    y_ent = np.asarray(y_ent, dtype=np.int64 if clasificacion else np.float32)
+    lote = config.get("batch_size", 32)
+    model.fit(
+        dataset_tf(X_ent[:-n_val], y_ent[:-n_val], batch_size=lote, seed=config.get("semilla", 42)),
+        validation_data=(np.asarray(X_ent[-n_val:]), y_ent[-n_val:]),
+        epochs=config.get("epocas", 50),
+        callbacks=[tf.keras.callbacks.EarlyStopping(patience=config.get("paciencia", 5), restore_best_weights=True)],
+        verbose=0,
+    )
+    salida = model.predict(np.asarray(X_pru), batch_size=1024, verbose=0)
+    return salida.argmax(axis=1) if clasificacion else salida
+
+
+MODELOS = {"referencia": _referencia, "xgb": _xgb, "lstm": _lstm}
+
+
+def metricas(tarea, y_real, y_pred):
+    """Exactitud, exactitud balanceada, F1 macro y matriz de confusión; o RMSE, MAE y MAPE."""
+    y_real = np.asarray(y_real)
+    if tarea == CLASIFICACION:
+        y_real = y_real.astype(np.int64).ravel()
+        y_pred = np.asarray(y_pred).astype(np.int64).ravel()
+        matriz = np.zeros((3, 3), dtype=np.int64)
+        np.add.at(matriz, (y_real, y_pred), 1)
+        reales, predichas, aciertos = matriz.sum(axis=1), matriz.sum(axis=0), np.diag(matriz)
+        presentes = reales > 0
+        recall = aciertos[presentes] / reales[presentes]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            f1 = np.nan_to_num(2 * aciertos / (reales + predichas))
+        return {
+            "exactitud": float(aciertos.sum() / max(matriz.sum(), 1)),
+            "exactitud_balanceada": float(recall.mean()) if presentes.any() else 0.0,
+            "f1_macro": float(f1[presentes].mean()) if presentes.any() else 0.0,
+            "matriz": matriz.tolist(),
+        }
+    y_real = y_real.astype(np.float64).ravel()
+    y_pred = np.asarray(y_pred, dtype=np.float64).ravel()
+    error = y_pred - y_real
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mape = np.nanmean(np.abs(error / y_real)) * 100
+    return {"rmse": float(np.sqrt(np.mean(error ** 2))), "mae": float(np.mean(np.abs(error))),
+            "mape": float(mape)}
+
+
+# --- Ejecución --------------------------------------------------------------
+
+def _fijar_hilos(hilos):
+    # En el entorno de este proceso, para que los procesos del pool lo hereden
+    # al crearse: con spawn importan NumPy (y su BLAS) al cargar este módulo,
+    # antes de cualquier inicializador. Devuelve los valores anteriores.
+    anteriores = {variable: os.environ.get(variable) for variable in VARIABLES_HILOS}
+    for variable in VARIABLES_HILOS:
+        os.environ[variable] = str(hilos)
+    return anteriores
+
+
+def _restaurar_hilos(anteriores):
+    for variable, valor in anteriores.items():
+        if valor is None:
+            os.environ.pop(variable, None)
+        else:
+            os.environ[variable] = valor
+
+
+def _correr(carpeta, config, pliegue, hilos):
+    tarea = config.get("tarea", CLASIFICACION)
+    inicio = time.perf_counter()
+    prefijo = os.path.join(carpeta, "cache", config["_cache"])
+    X_ent, y_ent, X_pru, y_pru, meta = _datos_pliegue(prefijo, pliegue, config.get("ventana"))
+    config = {k: v for k, v in config.items() if not k.startswith("_")}
+    pred = MODELOS[config["modelo"]](config, X_ent, y_ent, X_pru, hilos)
+    if meta["y_minimo"] is not None:
+        # Métricas de regresión en la escala original, como el inverse_transform de StockML.
+        y_min, y_rango = np.asarray(meta["y_minimo"]), np.asarray(meta["y_rango"])
+        pred = np.asarray(pred).reshape(len(pred), -1) * y_rango + y_min
+        y_pru = np.asarray(y_pru).reshape(len(y_pru), -1) * y_rango + y_min
+    return {**metricas(tarea, y_pru, pred), "filas_entrenamiento": int(len(X_ent)),
+            "filas_prueba": int(len(X_pru)), "segundos": time.perf_counter() - inicio}
+
+
+def _id_pliegue(pliegue):
+    # Los límites del pliegue (un dict de `asdict(Pliegue)`) como clave.
+    return tuple(pliegue[campo] for campo in ("k", "inicio", "fin_entrenamiento", "inicio_prueba", "fin"))
+
+
+def leer_resultados(carpeta):
+    """Las líneas completas de `resultados.jsonl` (una línea cortada por una interrupción se ignora)."""
+    filas = []
+    try:
+        with open(os.path.join(carpeta, RESULTADOS)) as f:
+            for linea in f:
+                try:
+                    filas.append(json.loads(linea))
+                except json.JSONDecodeError:
+                    pass
+    except FileNotFoundError:
+        pass
+    return filas
+
+
+def buscar(X, y, configuraciones, pliegues, carpeta, procesos=None, hilos=None, informar=None):
+    """
+    Evalúa cada configuración en cada pliegue y devuelve (filas, segundos).
+
+    Las filas (una por par, con config, pliegue, métricas y segundos) se
+    agregan a `carpeta/resultados.jsonl` a medida que terminan; los pares
+    que ya están ahí para los mismos datos y los mismos límites de pliegue
+    no se vuelven a correr. Un par que falla deja una fila con su `error`
+    (sin métricas) y la búsqueda sigue; al retomar se vuelve a intentar.
+    `procesos` (por omisión, los núcleos) corren a la vez, con `hilos`
+    hilos cada uno (por omisión, núcleos / procesos). `informar(fila)` se
+    llama con cada fila nueva.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    inicio = time.perf_counter()
+    os.makedirs(carpeta, exist_ok=True)
+    procesos = procesos or os.cpu_count() or 1
+    hilos = hilos or max(1, (os.cpu_count() or 1) // procesos)
+    huella = _huella(X, y)
+    # Un par se identifica por su configuración y los límites de su pliegue, no
+    # solo por k: otro `pliegues_walk_forward` en la misma carpeta es otro par.
+    pedidos = {(id_config(config), _id_pliegue(asdict(p))) for config in configuraciones for p in pliegues}
+    filas = [f for f in leer_resultados(carpeta)
+             if f["datos"] == huella and "error" not in f
+             and (f["config_id"], _id_pliegue(f["pliegue"])) in pedidos]
+    hechas = {(f["config_id"], _id_pliegue(f["pliegue"])) for f in filas}
+
+    tareas = []
+    for config in configuraciones:
+        tarea = config.get("tarea", CLASIFICACION)
+        for pliegue in pliegues:
+            if (id_config(config), _id_pliegue(asdict(pliegue))) in hechas:
+                continue
+            # Una matriz por (pliegue, escalado, tarea), compartida por las configuraciones.
+            prefijo = _preparar(carpeta, huella, X, y, pliegue, config.get("escalar", False), tarea)
+            tareas.append(({**config, "_cache": os.path.basename(prefijo)}, pliegue))
+
+    # Los procesos se crean a medida que llegan tareas, así que las variables
+    # quedan puestas mientras viva el pool.
+    anteriores = _fijar_hilos(hilos)
+    pool = ProcessPoolExecutor(procesos, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futuros = {pool.submit(_correr, carpeta, config, pliegue, hilos): (config, pliegue)
+                   for config, pliegue in tareas}
+        with open(os.path.join(carpeta, RESULTADOS), "a") as salida:
+            for futuro in as_completed(futuros):
+                config, pliegue = futuros[futuro]
+                config = {k: v for k, v in config.items() if not k.startswith("_")}
+                fila = {"datos": huella, "config_id": id_config(config), "config": config,
+                        "pliegue": asdict(pliegue)}
+                try:
+                    fila.update(futuro.result())
+                except Exception as e:
+                    fila["error"] = repr(e)
+                salida.write(json.dumps(fila) + "\n")
+                salida.flush()
+                filas.append(fila)
+                if informar:
+                    informar(fila)
+    finally:
+        pool.shutdown(cancel_futures=True)
+        _restaurar_hilos(anteriores)
+    return filas, time.perf_counter() - inicio
+
+
+def resumen(filas, metrica=None):
+    """
+    Por configuración: media y desviación de `metrica` en sus pliegues
+    (por omisión, exactitud balanceada o RMSE según la tarea), de la mejor a la peor.
+    Las filas con `error` no cuentan.
+    """
+    por_config = {}
+    for f in filas:
+        if "error" in f:
+            continue
+        por_config.setdefault(f["config_id"], []).append(f)
+    salida = []
+    for cid, grupo in por_config.items():
+        tarea = grupo[0]["config"].get("tarea", CLASIFICACION)
+        m = metrica or METRICA[tarea]
+        valores = np.array([f[m] for f in grupo])
+        salida.append({"config_id": cid, "config": grupo[0]["config"], "metrica": m,
+                       "media": float(valores.mean()), "desviacion": float(valores.std()),
+                       "pliegues": len(grupo)})
+    # Mayor es mejor salvo para los errores de regresión.
+    return sorted(salida, key=lambda r: -r["media"] if r["metrica"] not in METRICA_ERROR else r["media"])
+
+
+if __name__ == "__main__":
+    # Búsqueda sobre los rasgos de XGB-LSTM-V1 de un ticker sintético, frente
+    # a rehacer escalado y ventanas en cada configuración y pliegue en un
+    # solo proceso (lo que hacen los notebooks), y su reanudación:
+    #   python evaluacion.py --filas 6000 --pliegues 4 --rondas 40
+    import argparse
+    import tempfile
+
+    import pandas as pd
+
+    import almacen as alm
+    from caracteristicas import FEATURES, HORIZONTE, rasgos
+    from ventanas import crear_ventanas
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filas", type=int, default=6000)
+    parser.add_argument("--pliegues", type=int, default=4)
+    parser.add_argument("--rondas", type=int, default=40)
+    parser.add_argument("--procesos", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta, = alm.escribir_sintetico(os.path.join(tmp, "stocks"), 1, args.filas, vacios=0)
+        df = rasgos(pd.read_csv(ruta, usecols=alm.COLUMNAS))
+        X = df[FEATURES].to_numpy(np.float32)
+        y = df["target"].to_numpy(np.int8)
+        pliegues = pliegues_walk_forward(len(X), args.pliegues, separacion=HORIZONTE)
+        base = {"rondas": args.rondas, "escalar": True}
+        configuraciones = (
+            [{"modelo": "referencia"}]
+            + grilla("xgb", base, ventana=[None, 20],
+                     **{"parametros.max_depth": [3, 6], "parametros.eta": [0.05, 0.2]})
+        )
+        print(f"{len(X):,} filas, {len(configuraciones)} configuraciones x {len(pliegues)} pliegues "
+              f"({', '.join(f'{p.fin_entrenamiento - p.inicio}/{p.fin - p.inicio_prueba}' for p in pliegues)} "
+              f"filas de entrenamiento/prueba)")
+
+        def por_config():
+            # Como los notebooks: escalador y ventanas rehechos en cada corrida.
+            inicio = time.perf_counter()
+            for config in configuraciones:
+                for p in pliegues:
+                    Xp, yp = X[p.inicio:p.fin].astype(np.float32), y[p.inicio:p.fin]
+                    n_ent, desde = p.fin_entrenamiento - p.inicio, p.inicio_prueba - p.inicio
+                    if config.get("escalar"):
+                        minimo, rango = _minmax(Xp[:n_ent])
+                        Xp = (Xp - minimo) / rango
+                    v = config.get("ventana")
+                    if v:
+                        X_ent, y_ent = (np.array(a) for a in crear_ventanas(Xp[:n_ent], yp[:n_ent], v))
+                        X_pru, y_pru = (np.array(a) for a in crear_ventanas(Xp[desde - v:], yp[desde - v:], v))
+                    else:
+                        X_ent, y_ent, X_pru, y_pru = Xp[:n_ent], yp[:n_ent], Xp[desde:], yp[desde:]
+                    pred = MODELOS[config["modelo"]](config, X_ent, y_ent, X_pru, os.cpu_count() or 1)
+                    metricas(CLASIFICACION, y_pru, pred)
+            return time.perf_counter() - inicio
+
+        referencia = por_config()
+        print(f"  por configuración, en un proceso: {referencia:.2f}s")
+
+        carpeta = os.path.join(tmp, "estudio")
+        # Una búsqueda cortada a la mitad: solo la mitad de las configuraciones.
+        mitad = configuraciones[:len(configuraciones) // 2]
+        filas, primera = buscar(X, y, mitad, pliegues, carpeta, args.procesos)
+        filas, segundos = buscar(X, y, configuraciones, pliegues, carpeta, args.procesos)
+        nuevas = len(configuraciones) * len(pliegues) - len(mitad) * len(pliegues)
+        total = primera + segundos
+        suma = sum(f["segundos"] for f in filas)
+        print(f"  motor: {total:.2f}s de reloj ({suma:.2f}s sumando los pares, "
+              f"{len(os.listdir(os.path.join(carpeta, 'cache'))) // 3} matrices en caché para "
+              f"{len(filas)} pares); {primera:.2f}s la primera mitad y {segundos:.2f}s los {nuevas} "
+              f"pares que faltaban al retomar, {os.cpu_count()} núcleos")
+        inicio = time.perf_counter()
+        filas, _ = buscar(X, y, configuraciones, pliegues, carpeta, args.procesos)
+        print(f"  repetir la búsqueda completa: {time.perf_counter() - inicio:.2f}s, "
+              f"{len(leer_resultados(carpeta))} filas en {RESULTADOS}")
+
+        for r in resumen(filas)[:5]:
+            c = {k: v for k, v in r["config"].items() if k not in ("rondas", "escalar")}
+            print(f"  {r['media']:.3f} ± {r['desviacion']:.3f} {r['metrica']}  {json.dumps(c)}")
+        mejor = resumen(filas)[0]["config_id"]
+        for f in sorted((f for f in filas if f["config_id"] == mejor), key=lambda f: f["pliegue"]["k"]):
+            print(f"    pliegue {f['pliegue']['k']}: exactitud {f['exactitud']:.3f}, "
+                  f"f1 macro {f['f1_macro']:.3f}, {f['segundos']:.2f}s")
@@ -1,15 +1,40 @@
 # requirements:
 # pip install selenium pandas
 # necesitas Chrome o Chromium instalado; chromedriver se puede manejar automáticamente en Selenium 4.10+
+#
+# fetch_with_selenium abre y cierra un Chrome por ticker. Para listas de
+# tickers, fetch_many reparte los tickers entre un pool acotado de drivers que
+# viven toda la corrida (DriverPool), espera a que la página esté lista en vez
+# de dormir un tiempo fijo y lee todos los campos de un solo page_source con
+# parse_quote_html, sin un find_element por campo. Con navegador=False no usa
+# Chrome: descarga el HTML por HTTP y lo parsea igual, que es como se prueba
+# contra fixtures locales (Google Finance en vivo responde otro HTML, o la
+# página de consentimiento, a un cliente sin navegador):
+#   python google-finance-scraper.py --tickers AAPL:NASDAQ MSFT:NASDAQ
+#   python google-finance-scraper.py --sinteticos 40 --workers 8 --http
+#   python google-finance-scraper.py --fixtures paginas/ --comparar
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 import pandas as pd
+import queue
+import re
+import threading
 import time
 import random
+from contextlib import contextmanager
+from html import unescape
+
+BASE_URL = "https://www.google.com/finance/quote/"
+
+# Clases de los elementos que se leen (ajusta según la página actual).
+PRICE_CLASSES = ("YMlKec", "IsqQVc")
+CHANGE_CLASSES = ("Jl2", "WlRRw")
+STATS_ROW, STATS_LABEL, STATS_VALUE = "P6K39c", "eKzLze", "TdYk6b"
+
 
 def make_driver(headless=True):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
     opts = Options()
     if headless:
         opts.add_argument("--headless=new")
@@ -27,9 +52,14 @@ def make_driver(headless=True):
     })
     return driver
 
-def fetch_with_selenium(ticker: str, exchange: str = None, headless=True):
-    ref = f"{ticker}:{exchange}" if exchange else ticker
-    url = f"https://www.google.com/finance/quote/{ref}"
+def quote_ref(ticker, exchange=None):
+    return f"{ticker}:{exchange}" if exchange else ticker
+
+def fetch_with_selenium(ticker: str, exchange: str = None, headless=True, base_url=BASE_URL):
+    from selenium.webdriver.common.by import By
+
+    ref = quote_ref(ticker, exchange)
+    url = f"{base_url}{ref}"
 
     driver = make_driver(headless=headless)
     try:
@@ -49,22 +79,16 @@ def fetch_with_selenium(ticker: str, exchange: str = None, headless=True):
                     continue
             return None
 
-        price = safe_find([
-            "//div[contains(@class,'YMlKec')]",         # posible
-            "//div[contains(@class,'IsqQVc')]"          # posible
-        ])
-        change = safe_find([
-            "//div[contains(@class,'Jl2')]",            # ejemplo
-            "//div[contains(@class,'WlRRw')]"           # ejemplo
-        ])
+        price = safe_find([f"//div[contains(@class,'{c}')]" for c in PRICE_CLASSES])
+        change = safe_find([f"//div[contains(@class,'{c}')]" for c in CHANGE_CLASSES])
 
         # ejemplo de captura de filas de estadisticas
         stats = {}
-        rows = driver.find_elements(By.XPATH, "//div[contains(@class,'P6K39c')]")
+        rows = driver.find_elements(By.XPATH, f"//div[contains(@class,'{STATS_ROW}')]")
         for r in rows:
             try:
-                label = r.find_element(By.XPATH, ".//div[contains(@class,'eKzLze')]").text.strip()
-                value = r.find_element(By.XPATH, ".//div[contains(@class,'TdYk6b')]").text.strip()
+                label = r.find_element(By.XPATH, f".//div[contains(@class,'{STATS_LABEL}')]").text.strip()
+                value = r.find_element(By.XPATH, f".//div[contains(@class,'{STATS_VALUE}')]").text.strip()
                 stats[label] = value
             except Exception:
                 continue
@@ -73,7 +97,319 @@ def fetch_with_selenium(ticker: str, exchange: str = None, headless=True):
     finally:
         driver.quit()
 
+
+_SIN_TEXTO = re.compile(r"<!--.*?-->|<(script|style)\b.*?</\1\s*>", re.S | re.I)
+_DIV = re.compile(r"<(/?)div\b([^>]*)>", re.I)
+_CLASE = re.compile(r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.I)
+_ETIQUETA = re.compile(r"<[^>]*>")
+
+
+class _Divs:
+    # Todos los <div> del documento en orden, con su clase y su rango en el
+    # HTML: el texto de un div (con el de sus descendientes) sale de
+    # html[inicio:fin], y sus descendientes son divs[i + 1:ultimo]. Solo se
+    # buscan etiquetas div con una expresión regular, sin armar el DOM.
+    def __init__(self, html):
+        self.html = _SIN_TEXTO.sub("", html)
+        self.divs = []
+        abiertos = []
+        for m in _DIV.finditer(self.html):
+            if m.group(1):
+                if abiertos:
+                    div = self.divs[abiertos.pop()]
+                    div[2], div[3] = m.start(), len(self.divs)
+                continue
+            c = _CLASE.search(m.group(2))
+            abiertos.append(len(self.divs))
+            self.divs.append([next((g for g in c.groups() if g is not None), "") if c else "", m.end(), None, None])
+        for i in abiertos:
+            self.divs[i][2], self.divs[i][3] = len(self.html), len(self.divs)
+
+    def texto(self, i):
+        _, inicio, fin, _ = self.divs[i]
+        return " ".join(unescape(_ETIQUETA.sub("", self.html[inicio:fin])).split())
+
+    def primero(self, clase, desde=0, hasta=None):
+        # Como find_element(By.XPATH, "//div[contains(@class,...)]"): el primero en orden del documento.
+        for i in range(desde, len(self.divs) if hasta is None else hasta):
+            if clase in self.divs[i][0]:
+                return i
+        return None
+
+
+def parse_quote_html(html, ref, url=None):
+    """
+    Los mismos campos que fetch_with_selenium, leídos de un HTML ya
+    descargado (page_source o una respuesta HTTP) en una sola pasada.
+    """
+    p = _Divs(html)
+
+    def safe_find(clases):
+        for c in clases:
+            i = p.primero(c)
+            if i is not None and p.texto(i):
+                return p.texto(i)
+        return None
+
+    stats = {}
+    for i, (clase, _, _, ultimo) in enumerate(p.divs):
+        if STATS_ROW not in clase:
+            continue
+        label = p.primero(STATS_LABEL, i + 1, ultimo)
+        value = p.primero(STATS_VALUE, i + 1, ultimo)
+        if label is not None and value is not None:
+            stats[p.texto(label)] = p.texto(value)
+
+    return {"ticker": ref, "price": safe_find(PRICE_CLASSES), "change": safe_find(CHANGE_CLASSES),
+            "stats": stats, "url": url}
+
+
+class DriverPool:
+    """
+    Hasta `size` drivers de Chrome compartidos por los hilos de fetch_many.
+    Se crean a medida que se necesitan y se cierran con close(); un driver
+    que falla se descarta y su cupo queda para crear otro.
+    """
+
+    def __init__(self, size, headless=True, factory=None):
+        self.size = size
+        self._factory = factory or (lambda: make_driver(headless=headless))
+        # Drivers libres; None es un cupo libre para crear uno nuevo.
+        self._libres = queue.Queue()
+        self._cupos = 0
+        self._todos = []
+        self._lock = threading.Lock()
+
+    def _tomar(self):
+        try:
+            d = self._libres.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                crear = self._cupos < self.size
+                if crear:
+                    self._cupos += 1
+            d = None if crear else self._libres.get()
+        if d is None:
+            try:
+                d = self._factory()
+            except Exception:
+                self._libres.put(None)
+                raise
+            with self._lock:
+                self._todos.append(d)
+        return d
+
+    @contextmanager
+    def driver(self):
+        d = self._tomar()
+        try:
+            yield d
+        except Exception:
+            self._descartar(d)
+            raise
+        self._libres.put(d)
+
+    def _descartar(self, d):
+        with self._lock:
+            self._todos.remove(d)
+        try:
+            d.quit()
+        except Exception:
+            pass
+        self._libres.put(None)
+
+    def close(self):
+        with self._lock:
+            todos, self._todos = self._todos, []
+        for d in todos:
+            try:
+                d.quit()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _fetch_driver(pool, ref, base_url, timeout):
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    url = f"{base_url}{ref}"
+    listo = " | ".join(f"//div[contains(@class,'{c}')]" for c in PRICE_CLASSES)
+    with pool.driver() as driver:
+        driver.get(url)
+        # Espera hasta que aparezca el precio (no un tiempo fijo); si no
+        # aparece, se parsea lo que haya (p. ej. una página de "no encontrado").
+        try:
+            WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.XPATH, listo)))
+        except TimeoutException:
+            pass
+        html = driver.page_source
+    return parse_quote_html(html, ref, url)
+
+
+def _fetch_http(ref, base_url, timeout):
+    import urllib.request
+
+    url = f"{base_url}{ref}"
+    pedido = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    with urllib.request.urlopen(pedido, timeout=timeout) as r:
+        html = r.read().decode(r.headers.get_content_charset() or "utf-8", "replace")
+    return parse_quote_html(html, ref, url)
+
+
+def fetch_many(refs, workers=4, navegador=True, headless=True, base_url=BASE_URL, timeout=10, pool=None):
+    """
+    Cotizaciones de todos los `refs` ("AAPL:NASDAQ", ...) con `workers` hilos.
+    Con navegador=True comparten un DriverPool de `workers` Chrome (o `pool`);
+    con navegador=False el HTML se pide por HTTP, sin Chrome.
+    Devuelve (resultados, errores), ambos diccionarios por ref.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    resultados, errores = {}, {}
+    propio = navegador and pool is None
+    if propio:
+        pool = DriverPool(workers, headless=headless)
+    try:
+        def uno(ref):
+            if navegador:
+                return _fetch_driver(pool, ref, base_url, timeout)
+            return _fetch_http(ref, base_url, timeout)
+
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futuros = {ref: ex.submit(uno, ref) for ref in refs}
+        for ref, f in futuros.items():
+            try:
+                resultados[ref] = f.result()
+            except Exception as e:
+                errores[ref] = e
+    finally:
+        if propio:
+            pool.close()
+    return resultados, errores
+
+
+def fixture_name(ref):
+    # ':' no es válido en nombres de archivo de Windows.
+    return ref.replace(":", "_") + ".html"
+
+def serve_fixtures(carpeta, latencia=0.0):
+    """
+    Sirve páginas guardadas (carpeta/AAPL_NASDAQ.html, ...) en
+    http://127.0.0.1:<puerto>/finance/quote/<ref>, con `latencia` segundos
+    por respuesta. Devuelve (servidor, base_url); servidor.shutdown() lo detiene.
+    """
+    import os
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            ruta = os.path.join(carpeta, fixture_name(self.path.rsplit("/", 1)[-1]))
+            time.sleep(latencia)
+            if not os.path.isfile(ruta):
+                self.send_error(404)
+                return
+            with open(ruta, "rb") as f:
+                cuerpo = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/finance/quote/"
+
+def synthetic_fixture(ref, rng, relleno=2000):
+    """Página con la estructura de clases que se lee, más `relleno` divs sin interés."""
+    precio = rng.uniform(10, 500)
+    cambio = rng.normal(0, 2)
+    stats = {"Previous close": f"${precio - cambio:,.2f}", "Day range": f"${precio * 0.98:,.2f} - ${precio * 1.02:,.2f}",
+             "Market cap": f"{rng.uniform(1, 3000):,.2f}B USD", "P/E ratio": f"{rng.uniform(5, 40):.2f}"}
+    filas = "".join(f'<div class="gyFHrc"><div class="{STATS_ROW}"><div class="mfs7Fc {STATS_LABEL}">{k}</div>'
+                    f'<div class="{STATS_VALUE}">{v}</div></div></div>' for k, v in stats.items())
+    ruido = "".join(f'<div class="x{i % 97}"><span>item {i}</span></div>' for i in range(relleno))
+    return (f'<!DOCTYPE html><html><head><title>{ref}</title></head><body><div class="main">{ruido[:len(ruido) // 2]}'
+            f'<div class="rPF6Lc"><div class="AHmHk"><span><div class="{PRICE_CLASSES[0]} fxKbKc">${precio:,.2f}</div></span></div>'
+            f'<div class="{CHANGE_CLASSES[1]}"><span>{cambio:+.2f}</span> <span>({cambio / precio:+.2%})</span></div></div>'
+            f'{filas}{ruido[len(ruido) // 2:]}</div></body></html>'), stats
+
+
 if __name__ == "__main__":
-    res = fetch_with_selenium("AAPL", "NASDAQ", headless=True)
-    print(res)
-    pd.DataFrame([{"ticker": res["ticker"], "price": res["price"], "change": res["change"]}]).to_csv("gf_selenium.csv", index=False)
+    import argparse
+    import os
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Cotizaciones de Google Finance con un pool de navegadores.")
+    parser.add_argument("--tickers", nargs="+", default=["AAPL:NASDAQ"])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--http", action="store_true",
+                        help="leer por HTTP + parser en vez de Chrome; solo con --fixtures o --sinteticos")
+    parser.add_argument("--fixtures", help="carpeta con páginas guardadas, servidas localmente")
+    parser.add_argument("--sinteticos", type=int, default=0, help="generar N páginas sintéticas y servirlas localmente")
+    parser.add_argument("--latencia", type=float, default=0.2, help="segundos por respuesta del servidor local")
+    parser.add_argument("--comparar", action="store_true", help="medir también fetch_with_selenium ticker a ticker")
+    args = parser.parse_args()
+    if args.http and not (args.fixtures or args.sinteticos):
+        parser.error("--http es para páginas locales (--fixtures o --sinteticos); "
+                     "Google Finance en vivo se lee con Chrome")
+
+    base_url, servidor, esperados = BASE_URL, None, {}
+    refs = args.tickers
+    temporal = tempfile.TemporaryDirectory() if args.sinteticos else None
+    carpeta = temporal.name if temporal else args.fixtures
+    if args.sinteticos:
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        refs = [f"SYN{i:03d}:SN" for i in range(args.sinteticos)]
+        for ref in refs:
+            html, esperados[ref] = synthetic_fixture(ref, rng)
+            with open(os.path.join(carpeta, fixture_name(ref)), "w", encoding="utf-8") as f:
+                f.write(html)
+    elif args.fixtures:
+        refs = [n[:-len(".html")].replace("_", ":", 1) for n in sorted(os.listdir(carpeta)) if n.endswith(".html")]
+    if carpeta:
+        servidor, base_url = serve_fixtures(carpeta, args.latencia)
+
+    try:
+        if args.comparar:
+            inicio = time.perf_counter()
+            for ref in refs:
+                fetch_with_selenium(*ref.split(":", 1), base_url=base_url)
+            segundos = time.perf_counter() - inicio
+            print(f"  {'fetch_with_selenium':<28} {len(refs) / segundos * 60:8.1f} tickers/min")
+
+        inicio = time.perf_counter()
+        resultados, errores = fetch_many(refs, args.workers, navegador=not args.http, base_url=base_url)
+        segundos = time.perf_counter() - inicio
+        modo = f"fetch_many {'HTTP' if args.http else 'Chrome'} x{args.workers}"
+        print(f"  {modo:<28} {len(refs) / segundos * 60:8.1f} tickers/min  "
+              f"({len(resultados)} ok, {len(errores)} errores)")
+        for ref, e in errores.items():
+            print(f"Error en {ref}: {e}")
+        if esperados:
+            correctos = sum(resultados[r]["stats"] == esperados[r] and resultados[r]["price"] is not None
+                            for r in refs if r in resultados)
+            print(f"  {'':<28} fixtures leídos correctamente: {correctos}/{len(refs)}")
+    finally:
+        if servidor:
+            servidor.shutdown()
+        if temporal:
+            temporal.cleanup()
+
+    if not args.sinteticos:
+        print(list(resultados.values())[:3])
+        pd.DataFrame([{"ticker": r["ticker"], "price": r["price"], "change": r["change"]}
+                      for r in resultados.values()]).to_csv("gf_selenium.csv", index=False)
@@ -0,0 +1,177 @@
+# graficos.py
+"""
+Gráfico de mercado de MAYF.plot_market, con un modo liviano para historias largas.
+
+El modo original agrega todas las velas y puntos de los indicadores como
+trazas SVG y escribe un HTML autocontenido (plotly.js va incrustado en cada
+archivo). Con `max_puntos`:
+
+- las velas se agregan en bloques consecutivos (apertura del primero, máximo,
+  mínimo, cierre del último), así que ningún máximo o mínimo se pierde;
+- las líneas (SMA, Bollinger, RSI) se reducen con LTTB (Largest-Triangle-
+  Three-Buckets), que conserva la forma visual de la serie;
+- las líneas se dibujan con `Scattergl` (WebGL) y plotly.js se escribe una
+  sola vez como `plotly.min.js` junto al HTML, compartido por todos los
+  gráficos del directorio.
+"""
+import numpy as np
+
+LINEAS = (
+    # (columna, nombre, estilo de línea, fila)
+    ("SMA_20", "SMA 20", dict(color="orange"), 1),
+    ("SMA_50", "SMA 50", dict(color="blue"), 1),
+    ("BB_upper", "Bollinger Upper", dict(color="gray", dash="dot"), 1),
+    ("BB_lower", "Bollinger Lower", dict(color="gray", dash="dot"), 1),
+    ("RSI", "RSI", dict(color="purple"), 2),
+)
+
+
+def lttb(y, n):
+    """
+    Índices de los `n` puntos de `y` (sin NaN, equiespaciados) que elige
+    Largest-Triangle-Three-Buckets. Siempre incluye el primero y el último.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    m = len(y)
+    if n >= m or n < 3:
+        return np.arange(m)
+
+    # n - 2 bloques entre el primer y el último punto.
+    bordes = np.linspace(1, m - 1, n - 1).astype(np.int64)
+    indices = np.empty(n, dtype=np.int64)
+    indices[0], indices[-1] = 0, m - 1
+    a = 0
+    for i in range(n - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        # Vértice promedio del bloque siguiente (el último punto para el último bloque).
+        fin_siguiente = bordes[i + 2] if i + 2 < n - 1 else m
+        cx = (fin + fin_siguiente - 1) / 2
+        cy = y[fin:fin_siguiente].mean()
+        x = np.arange(inicio, fin)
+        area = np.abs((a - cx) * (y[inicio:fin] - y[a]) - (a - x) * (cy - y[a]))
+        a = inicio + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+
+def velas_por_bloque(df, n):
+    """
+    Velas OHLC agregadas en a lo más `n` bloques de barras consecutivas,
+    fechadas con la primera barra de cada bloque.
+    """
+    m = len(df)
+    if m <= n:
+        return df[["Open", "High", "Low", "Close"]]
+    k = -(-m // n)
+    inicios = np.arange(0, m, k)
+    finales = np.minimum(inicios + k, m) - 1
+    import pandas as pd
+
+    return pd.DataFrame({
+        "Open": df["Open"].to_numpy()[inicios],
+        # fmax/fmin ignoran los NaN: una barra sin High o Low no borra su bloque.
+        "High": np.fmax.reduceat(df["High"].to_numpy(), inicios),
+        "Low": np.fmin.reduceat(df["Low"].to_numpy(), inicios),
+        "Close": df["Close"].to_numpy()[finales],
+    }, index=df.index[inicios])
+
+
+def figura_mercado(df, symbol="BSANTANDER.SN", max_puntos=None):
+    """
+    Figura de precios con SMA, Bollinger y RSI. Sin `max_puntos`, la de
+    siempre (todas las barras, trazas SVG); con `max_puntos`, velas y
+    líneas reducidas a ese número de puntos y líneas en WebGL.
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True,
+                        row_heights=[0.7, 0.3],
+                        vertical_spacing=0.05,
+                        subplot_titles=(f"{symbol} Market Overview", "RSI Indicator"))
+
+    # --- Candlestick ---
+    velas = df if max_puntos is None else velas_por_bloque(df, max_puntos)
+    fig.add_trace(go.Candlestick(
+        x=velas.index,
+        open=velas["Open"], high=velas["High"],
+        low=velas["Low"], close=velas["Close"],
+        name="Precio"
+    ), row=1, col=1)
+
+    # --- SMA, Bollinger Bands y RSI ---
+    traza = go.Scatter if max_puntos is None else go.Scattergl
+    for columna, nombre, linea, fila in LINEAS:
+        serie = df[columna]
+        if max_puntos is not None:
+            # LTTB supone una serie sin NaN; los indicadores empiezan con NaN
+            # hasta llenar su ventana (y el gráfico de todos modos no los dibuja).
+            serie = serie.dropna()
+            serie = serie.iloc[lttb(serie.to_numpy(), max_puntos)]
+        fig.add_trace(traza(x=serie.index, y=serie, name=nombre, line=linea), row=fila, col=1)
+    fig.add_hline(y=70, line_dash="dot", line_color="red", row=2, col=1)
+    fig.add_hline(y=30, line_dash="dot", line_color="green", row=2, col=1)
+
+    fig.update_layout(
+        template="plotly_white",
+        height=800,
+        xaxis_rangeslider_visible=False,
+        title=f"{symbol} Market Analysis"
+    )
+    return fig
+
+
+def escribir_html(fig, archivo, max_puntos=None):
+    """
+    Escribe la figura; en el modo liviano plotly.js queda en `plotly.min.js`,
+    junto al HTML, en vez de incrustarse en el archivo.
+    """
+    fig.write_html(archivo, include_plotlyjs=True if max_puntos is None else "directory")
+
+
+if __name__ == "__main__":
+    # Tamaño del HTML y tiempo de generación, modo original frente al liviano,
+    # para 20 años de barras diarias sintéticas:
+    #   python graficos.py --anios 20 --max-puntos 2000
+    import argparse
+    import os
+    import tempfile
+    import time
+
+    import pandas as pd
+
+    import servicios
+    import indicators
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--anios", type=int, default=20)
+    parser.add_argument("--max-puntos", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    dias = args.anios * 252
+    cierre = 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.015, dias)))
+    apertura = cierre * np.exp(rng.normal(0, 0.005, dias))
+    df = pd.DataFrame({
+        "Open": apertura,
+        "High": np.maximum(apertura, cierre) * np.exp(np.abs(rng.normal(0, 0.008, dias))),
+        "Low": np.minimum(apertura, cierre) * np.exp(-np.abs(rng.normal(0, 0.008, dias))),
+        "Close": cierre,
+        "Volume": rng.integers(1_000, 1_000_000, dias),
+    }, index=pd.bdate_range("2005-01-03", periods=dias))
+    df = indicators.add_indicators(df, rsi=indicators.RSI_SMA, partial_windows=False).dropna()
+    print(f"{len(df):,} barras diarias ({args.anios} años)")
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        for modo, max_puntos in (("original", None), (f"liviano ({args.max_puntos} puntos)", args.max_puntos)):
+            archivo = os.path.join(carpeta, f"{modo.split()[0]}.html")
+            inicio = time.perf_counter()
+            fig = figura_mercado(df, "SYN.SN", max_puntos)
+            escribir_html(fig, archivo, max_puntos)
+            segundos = time.perf_counter() - inicio
+            puntos = sum(len(t.x) for t in fig.data)
+            print(f"  {modo:<24} {segundos * 1000:8.0f} ms  HTML {os.path.getsize(archivo) / 2**20:7.2f} MiB  "
+                  f"({puntos:,} puntos en {len(fig.data)} trazas)")
+        compartido = os.path.join(carpeta, "plotly.min.js")
+        if os.path.exists(compartido):
+            print(f"  {'':<24} plotly.min.js compartido: {os.path.getsize(compartido) / 2**20:.2f} MiB, una vez por directorio")
@@ -0,0 +1,163 @@
+# memoria.py
+"""
+Memoria de repetición (replay memory) preasignada para los entrenamientos DQN.
+
+Reemplaza la lista de tuplas (pobs, pact, reward, obs, done) de
+deep-reinforcement-learning-on-stock-data.ipynb por un búfer circular de
+arreglos contiguos: observaciones float32, acciones int8, recompensas
+float32 y `done` bool. Agregar una transición escribe una fila (sin
+`pop(0)`), y cada minilote se arma con una sola indexación por arreglo, sin
+recorrer muestras en Python.
+"""
+import numpy as np
+
+
+class MemoriaRepeticion:
+    """
+    Búfer circular de `capacidad` transiciones con observaciones de largo
+    `dim_obs`. `len(memoria)` crece hasta `capacidad`; desde ahí cada
+    transición nueva reemplaza a la más antigua, como el `memory.pop(0)` del
+    notebook.
+    """
+
+    def __init__(self, capacidad, dim_obs, seed=None):
+        self.capacidad = capacidad
+        self.pobs = np.zeros((capacidad, dim_obs), dtype=np.float32)
+        self.obs = np.zeros((capacidad, dim_obs), dtype=np.float32)
+        self.acts = np.zeros(capacidad, dtype=np.int8)
+        self.rewards = np.zeros(capacidad, dtype=np.float32)
+        self.done = np.zeros(capacidad, dtype=bool)
+        self._pos = 0
+        self._n = 0
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.pobs, self.obs, self.acts, self.rewards, self.done))
+
+    def agregar(self, pobs, act, reward, obs, done):
+        i = self._pos
+        self.pobs[i] = pobs
+        self.acts[i] = act
+        self.rewards[i] = reward
+        self.obs[i] = obs
+        self.done[i] = done
+        self._pos = (i + 1) % self.capacidad
+        self._n = min(self._n + 1, self.capacidad)
+
+    def agregar_lote(self, pobs, acts, rewards, obs, done):
+        """Agrega K transiciones de una vez, p. ej. un paso de `entorno.EntornoVectorizado`."""
+        k = len(acts)
+        filas = (self._pos + np.arange(k)) % self.capacidad
+        self.pobs[filas] = pobs
+        self.acts[filas] = acts
+        self.rewards[filas] = rewards
+        self.obs[filas] = obs
+        self.done[filas] = done
+        self._pos = (self._pos + k) % self.capacidad
+        self._n = min(self._n + k, self.capacidad)
+
+    def _tomar(self, indices):
+        return (self.pobs[indices], self.acts[indices], self.rewards[indices],
+                self.obs[indices], self.done[indices])
+
+    def muestrear(self, batch_size):
+        """Un minilote al azar (con reemplazo): (pobs, acts, rewards, obs, done)."""
+        return self._tomar(self._rng.integers(0, self._n, batch_size))
+
+    def minilotes(self, batch_size):
+        """
+        Toda la memoria permutada en minilotes de `batch_size`, como el
+        `np.random.permutation(memory)` + `memory_idx[::batch_size]` del notebook.
+        """
+        orden = self._rng.permutation(self._n)
+        for inicio in range(0, self._n, batch_size):
+            yield self._tomar(orden[inicio:inicio + batch_size])
+
+
+def objetivos(q, q_siguiente, acts, rewards, done, gamma, indices=None):
+    """
+    Objetivos de Q-learning para un minilote, sin bucle por muestra: copia
+    de `q` con `rewards + gamma * Q'(obs) * (1 - done)` en la acción tomada.
+    Con `indices` (Double DQN) se usa Q'(obs)[indices] en vez del máximo.
+    """
+    filas = np.arange(len(acts))
+    siguiente = q_siguiente.max(axis=1) if indices is None else q_siguiente[filas, indices]
+    target = np.array(q, dtype=np.float32, copy=True)
+    target[filas, acts] = rewards + gamma * siguiente * ~done
+    return target
+
+
+def _memoria_lista(memory, batch_size):
+    """Armado de minilotes original del notebook (lista de tuplas), como referencia del benchmark."""
+    orden = np.random.permutation(len(memory))
+    for i in range(0, len(memory), batch_size):
+        batch = [memory[j] for j in orden[i:i + batch_size]]
+        yield (np.array([b[0] for b in batch], dtype=np.float32),
+               np.array([b[1] for b in batch], dtype=np.int32),
+               np.array([b[2] for b in batch], dtype=np.int32),
+               np.array([b[3] for b in batch], dtype=np.float32),
+               np.array([b[4] for b in batch], dtype=bool))
+
+
+if __name__ == "__main__":
+    # Memoria y transiciones muestreadas por segundo frente a la lista de tuplas:
+    #   python memoria.py --capacidad 200 200000 --batch-size 50
+    import argparse
+    import time
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capacidad", type=int, nargs="+", default=[200, 200_000])
+    parser.add_argument("--dim-obs", type=int, default=91)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for capacidad in args.capacidad:
+        # Transiciones como las que devuelve entorno.Entorno.
+        n = capacidad + capacidad // 10
+        observaciones = rng.normal(size=(n + 1, args.dim_obs)).astype(np.float32)
+        acts = rng.integers(0, 3, n)
+        rewards = rng.integers(-1, 2, n)
+        print(f"capacidad {capacidad:,}, observaciones de {args.dim_obs}")
+
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        lista = []
+        for i in range(n):
+            lista.append((observaciones[i].copy(), int(acts[i]), int(rewards[i]), observaciones[i + 1].copy(), False))
+            if len(lista) > capacidad:
+                lista.pop(0)
+        llenado = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        inicio = time.perf_counter()
+        for lote in _memoria_lista(lista, args.batch_size):
+            pass
+        muestreo = time.perf_counter() - inicio
+        print(f"  {'lista de tuplas':<20} llenado {n / llenado:12,.0f} trans/s  "
+              f"muestreo {capacidad / muestreo:12,.0f} trans/s  memoria {pico / 2**20:9.1f} MiB")
+        del lista
+
+        memoria = MemoriaRepeticion(capacidad, args.dim_obs, seed=0)
+        inicio = time.perf_counter()
+        for i in range(n):
+            memoria.agregar(observaciones[i], acts[i], rewards[i], observaciones[i + 1], False)
+        llenado = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        for lote in memoria.minilotes(args.batch_size):
+            pass
+        muestreo = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        repeticiones = max(1, 100_000 // args.batch_size)
+        for _ in range(repeticiones):
+            memoria.muestrear(args.batch_size)
+        aleatorio = time.perf_counter() - inicio
+        print(f"  {'MemoriaRepeticion':<20} llenado {n / llenado:12,.0f} trans/s  "
+              f"muestreo {capacidad / muestreo:12,.0f} trans/s  memoria {memoria.nbytes / 2**20:9.1f} MiB  "
+              f"(muestrear: {repeticiones * args.batch_size / aleatorio:,.0f} trans/s)")
+        assert np.array_equal(memoria.obs[:capacidad], np.roll(observaciones[n - capacidad + 1:], n % capacidad, axis=0))
@@ -0,0 +1,23 @@
+# servicios.py
+"""
+Hace importables los módulos compartidos de "Evidencias de Servicios"
+(`indicators`, `market_fetch`, `price_store`, `prediction`, ...) desde los
+scripts y notebooks de esta carpeta:
+
+    import servicios  # antes de importar los módulos de los servicios
+    from indicators import add_indicators
+
+Agrega la carpeta a `sys.path` una sola vez, sin importar cuántos módulos
+importen `servicios`. Donde esos módulos ya están junto al script (un
+despliegue que los copia al lado de `main.py`), la carpeta no existe y no
+se agrega.
+"""
+import os
+import sys
+
+SERVICIOS_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Evidencias de Servicios")
+)
+
+if os.path.isdir(SERVICIOS_DIR) and SERVICIOS_DIR not in sys.path:
+    sys.path.insert(0, SERVICIOS_DIR)
@@ -0,0 +1,175 @@
+# ventanas.py
+"""
+Ventanas deslizantes sin copia para los pipelines LSTM/XGB.
+
+`crear_ventanas` devuelve las mismas ventanas que los `create_sequences` de
+los notebooks (X[i:i+window] -> y[i+window]), pero como una vista con strides
+sobre el arreglo original: no se copia ninguna fila, sin importar el tamaño
+de la ventana. `create_dataset` hace lo mismo para el LSTM univariado.
+
+Para entrenar, `generar_lotes` y `dataset_tf` materializan solo las ventanas
+de cada lote, así que la memoria queda acotada por `batch_size * window`
+aunque la serie tenga miles de tickers x décadas. `indices_sobremuestreo`
+reemplaza a `RandomOverSampler` sobre las ventanas aplanadas: devuelve
+índices de ventanas en vez de copiarlas.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def crear_ventanas(X, y, window=50):
+    """
+    Ventanas de `window` filas de X y el objetivo siguiente de y.
+
+    Devuelve (X_seq, y_seq) con X_seq de forma (len(X) - window, window,
+    n_features) como vista de solo lectura sobre X, igual a
+    `create_sequences(X, y, window)`.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    n = len(X) - window
+    if n <= 0:
+        return X[:0].reshape((0, window) + X.shape[1:]), y[:0]
+    # sliding_window_view pone la ventana al final: (n+1, n_features, window).
+    vista = sliding_window_view(X, window, axis=0)
+    if X.ndim > 1:
+        vista = np.moveaxis(vista, -1, 1)
+    return vista[:n], y[window:window + n]
+
+
+def create_dataset(dataset, time_step=1):
+    """
+    Versión sin copia del `create_dataset` de LSTM.ipynb: ventanas de la
+    primera columna y el valor siguiente, con el mismo número de muestras
+    (len - time_step - 1).
+    """
+    serie = np.asarray(dataset)[:, 0]
+    X, y = crear_ventanas(serie, serie, time_step)
+    n = len(serie) - time_step - 1
+    return X[:n], y[:n]
+
+
+def indices_sobremuestreo(y, random_state=42):
+    """
+    Índices que reproducen `RandomOverSampler(sampling_strategy="not majority",
+    random_state=random_state)`: todas las muestras originales y luego, clase
+    por clase en orden, réplicas al azar hasta igualar a la clase mayoritaria.
+    Con `X_seq[indices]` por lote no hace falta aplanar ni copiar las ventanas.
+    """
+    y = np.asarray(y)
+    clases, conteos = np.unique(y, return_counts=True)
+    # La mayoritaria es la primera en aparecer entre las de mayor conteo (como Counter).
+    primera = {c: np.flatnonzero(y == c)[0] for c in clases}
+    mayoritaria = min((c for c, k in zip(clases, conteos) if k == conteos.max()), key=primera.get)
+    rng = np.random.RandomState(random_state)
+    partes = [np.arange(len(y))]
+    for c, k in zip(clases, conteos):
+        if c == mayoritaria:
+            continue
+        objetivo = np.flatnonzero(y == c)
+        partes.append(objetivo[rng.randint(low=0, high=len(objetivo), size=conteos.max() - k)])
+    return np.concatenate(partes)
+
+
+def generar_lotes(X_seq, y_seq, batch_size=32, indices=None, shuffle=True, seed=None, dtype=np.float32):
+    """
+    Generador infinito de lotes (X, y) para `model.fit(..., steps_per_epoch=...)`.
+    Solo se copian las ventanas del lote; `indices` (p. ej. de
+    `indices_sobremuestreo`) elige y repite ventanas sin materializarlas.
+    `seed` es una semilla o un `np.random.Generator` ya creado.
+    """
+    indices = np.arange(len(X_seq)) if indices is None else np.asarray(indices)
+    rng = np.random.default_rng(seed)
+    while True:
+        orden = rng.permutation(indices) if shuffle else indices
+        for inicio in range(0, len(orden), batch_size):
+            lote = orden[inicio:inicio + batch_size]
+            yield X_seq[lote].astype(dtype, copy=False), y_seq[lote]
+
+
+def pasos_por_epoca(n, batch_size=32):
+    return -(-n // batch_size)
+
+
+def dataset_tf(X_seq, y_seq, batch_size=32, indices=None, shuffle=True, seed=None,
+               dtype=np.float32, prefetch=2):
+    """
+    `tf.data.Dataset` que arma cada lote bajo demanda desde la vista de
+    ventanas. Una época son `pasos_por_epoca(len(indices), batch_size)` lotes.
+    """
+    import tensorflow as tf
+
+    indices = np.arange(len(X_seq)) if indices is None else np.asarray(indices)
+    # tf.data vuelve a llamar al generador en cada época: con un solo
+    # Generator, cada época saca una permutación nueva, como model.fit(shuffle=True).
+    rng = np.random.default_rng(seed)
+    y_ejemplo = np.asarray(y_seq[:1])
+    firma = (
+        tf.TensorSpec(shape=(None,) + X_seq.shape[1:], dtype=tf.as_dtype(dtype)),
+        tf.TensorSpec(shape=(None,) + y_ejemplo.shape[1:], dtype=tf.as_dtype(y_ejemplo.dtype)),
+    )
+    ds = tf.data.Dataset.from_generator(
+        lambda: generar_lotes(X_seq, y_seq, batch_size, indices, shuffle, rng, dtype),
+        output_signature=firma,
+    )
+    return ds.take(pasos_por_epoca(len(indices), batch_size)).prefetch(prefetch)
+
+
+def _create_sequences(X, y, window=50):
+    """El bucle original de los notebooks, conservado como referencia del benchmark."""
+    xs, ys = [], []
+    for i in range(len(X)-window):
+        xs.append(X[i:i+window])
+        ys.append(y[i+window])
+    return np.array(xs), np.array(ys)
+
+
+if __name__ == "__main__":
+    # Memoria y tiempo frente al bucle original:
+    #   python ventanas.py --filas 5040 --features 14 --window 60
+    import argparse
+    import time
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[2520, 50400])
+    parser.add_argument("--features", type=int, default=14)
+    parser.add_argument("--window", type=int, default=60)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for filas in args.filas:
+        X = rng.random((filas, args.features))
+        y = rng.integers(0, 3, filas)
+        print(f"{filas} filas x {args.features} features, ventana {args.window} "
+              f"(datos {X.nbytes / 2**20:.1f} MiB)")
+
+        resultados = {}
+        for nombre, fn in (("bucle original", _create_sequences), ("vista con strides", crear_ventanas)):
+            tracemalloc.start()
+            inicio = time.perf_counter()
+            X_seq, y_seq = fn(X, y, args.window)
+            segundos = time.perf_counter() - inicio
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            resultados[nombre] = (X_seq, y_seq)
+            print(f"  {nombre:<18} {segundos * 1000:9.1f} ms  pico {pico / 2**20:9.1f} MiB")
+
+        (a, ya), (b, yb) = resultados.values()
+        assert np.array_equal(a, b) and np.array_equal(ya, yb)
+        del resultados, a
+
+        # Una época por lotes, con sobremuestreo por índices.
+        indices = indices_sobremuestreo(y_seq)
+        pasos = pasos_por_epoca(len(indices), args.batch_size)
+        lotes = generar_lotes(b, yb, args.batch_size, indices, seed=0)
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        for _ in range(pasos):
+            next(lotes)
+        segundos = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {'lotes (1 época)':<18} {segundos * 1000:9.1f} ms  pico {pico / 2**20:9.1f} MiB  "
+              f"{len(indices) / segundos:,.0f} ventanas/s")
@@ -0,0 +1,147 @@
+# batch_history.py
+"""
+Historical data with indicators for several tickers in one request.
+
+All tickers share one date range. Those the per-instance
+`range_cache.RangeCache` already covers are answered from it; the rest come
+from a single bulk download, and their indicators are computed in one
+vectorized pass per group of tickers that share the same trading dates
+(`indicators.indicators_by_index`, usually the whole request).
+
+The bulk range starts the cache's `warmup_days` early, as every cache fetch
+does, and asks for the corporate actions, so each frame has the columns of
+`Ticker.history` (Dividends and Stock Splits included) and the indicator
+values a single-ticker request returns. The fetched ranges are stored in
+the cache, so later requests for those tickers are hits. Failures are
+reported per ticker and never fail the whole batch.
+"""
+from dataclasses import dataclass, field
+
+from indicators import RSI_EWM
+
+MAX_BATCH_TICKERS = 100
+HISTORY_COLUMNS = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+PRICE_COLUMNS = ["Open", "High", "Low", "Close"]
+
+
+@dataclass
+class BatchResult:
+    frames: dict = field(default_factory=dict)    # ticker -> OHLCV + indicators DataFrame
+    errors: dict = field(default_factory=dict)    # ticker -> (code, message)
+    statuses: dict = field(default_factory=dict)  # ticker -> "hit" (from the cache) or "miss" (bulk download)
+
+    def cache_status(self):
+        """One X-Cache value for the batch: the shared status, or "mixed"."""
+        statuses = set(self.statuses.values())
+        return statuses.pop() if len(statuses) == 1 else ("mixed" if statuses else "miss")
+
+
+def _history_frame(df):
+    """One ticker of a bulk download shaped like `Ticker.history`: its own trading days, its columns."""
+    from range_cache import _normalize
+
+    df = _normalize(df).dropna(how="all", subset=PRICE_COLUMNS)
+    df = df.reindex(columns=HISTORY_COLUMNS)
+    df[["Dividends", "Stock Splits"]] = df[["Dividends", "Stock Splits"]].fillna(0.0)
+    if df["Volume"].notna().all():
+        df["Volume"] = df["Volume"].astype("int64")
+    return df
+
+
+def fetch_batch(tickers, start, end, cache, provider, rsi=RSI_EWM, partial_windows=True):
+    """
+    Bars in [start, end) plus the indicator columns for every ticker, as in
+    `get_historical_data_with_indicators`. `cache` is the handler's
+    `RangeCache`; tickers it does not cover are fetched with one
+    `provider.download` and stored in it. Error codes follow the handler's:
+    "not-found" for no rows in range, "internal" for anything else.
+    """
+    import pandas as pd
+    from indicators import indicators_by_index
+    from market_fetch import split_bulk_download
+
+    tickers = list(dict.fromkeys(tickers))
+    result = BatchResult()
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    frames = {}
+
+    missing = []
+    for t in tickers:
+        if not cache.covers(t, start, end):
+            missing.append(t)
+            continue
+        frames[t], result.statuses[t] = cache.get(t, start, end)
+
+    if missing:
+        fetch_start = start - pd.Timedelta(days=cache.warmup_days)
+        try:
+            bulk = provider.download(missing, start=fetch_start.strftime("%Y-%m-%d"),
+                                     end=end.strftime("%Y-%m-%d"), actions=True)
+            raws = {t: _history_frame(df) for t, df in split_bulk_download(bulk, missing).items()}
+            raws = {t: df for t, df in raws.items() if not df.empty}
+            indicators = indicators_by_index({t: df["Close"] for t, df in raws.items()}, rsi, partial_windows)
+        except Exception as e:
+            result.errors.update((t, ("internal", f"Failed to fetch historical data: {e}")) for t in missing)
+            raws = {}
+        for t, raw in raws.items():
+            data = pd.concat([raw, indicators[t]], axis=1)
+            cache.put(t, fetch_start, end, raw, data)
+            frames[t] = data[(data.index >= start) & (data.index < end)].copy()
+        for t in missing:
+            if t not in result.errors:
+                result.statuses[t] = "miss"
+                frames.setdefault(t, pd.DataFrame())
+
+    for t in tickers:
+        if t in result.errors:
+            continue
+        if frames[t].empty:
+            result.errors[t] = ("not-found", f"No historical data found for {t} within the specified range.")
+            continue
+        result.frames[t] = frames[t]
+    return result
+
+
+if __name__ == "__main__":
+    # One batch request against one request per ticker, offline:
+    #   python batch_history.py --tickers 43 --latency 0.3
+    import argparse
+    import time
+
+    import pandas as pd
+    from fakes import FakeProvider, synthetic_tickers
+    from indicators import add_indicators
+    from range_cache import RangeCache
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, nargs="+", default=[10, 43])
+    parser.add_argument("--latency", type=float, default=0.3,
+                        help="simulated seconds per provider round-trip")
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    end = pd.Timestamp.today().normalize()
+    start = end - pd.Timedelta(days=args.days)
+    for n in args.tickers:
+        tickers = synthetic_tickers(n)
+        provider = FakeProvider(latency=args.latency)
+        provider.download(tickers)  # build the synthetic frames outside the timings
+
+        cache = RangeCache(provider.history, add_indicators)
+        t0 = time.perf_counter()
+        batch = fetch_batch(tickers, start, end, cache, provider)
+        batch_s = time.perf_counter() - t0
+        calls = dict(provider.calls)
+
+        single = RangeCache(provider.history, add_indicators)
+        t0 = time.perf_counter()
+        frames = {t: single.get(t, start, end)[0] for t in tickers}
+        single_s = time.perf_counter() - t0
+
+        # The same frame (columns, bars and indicators) as a single-ticker request.
+        diff = max(float((batch.frames[t] - frames[t]).abs().max().max()) for t in tickers)
+        same_columns = all(list(batch.frames[t].columns) == list(frames[t].columns) for t in tickers)
+        again = fetch_batch(tickers, start, end, cache, provider).cache_status()
+        print(f"{n:>5} tickers  batch {batch_s:7.2f}s ({calls['download']} download, {calls['history']} history)  "
+              f"per-ticker {single_s:7.2f}s  speedup x{single_s / batch_s:.1f}  max diff {diff:.1e}  "
+              f"same columns {same_columns}  repeated batch: {again}")
@@ -0,0 +1,393 @@
+# benchmarks.py
+"""
+Offline benchmarks of the hot paths, checked against stored baselines.
+
+Every benchmark runs on synthetic data from `fakes` (`synthetic_market`,
+`synthetic_closes`, `FakeProvider`), with `yfinance`, `firebase_admin` and
+`firebase_functions` replaced by the stand-ins of
+`fakes.install_offline_modules`, so nothing touches the network:
+
+- fetch.split: splitting a multi-symbol yfinance download per ticker;
+- indicators.panel: `indicators.panel_indicators` over the close matrix;
+- metrics.table: `metrics.metrics_table` and its Firestore documents;
+- json.records / json.columnar: the body of the historical data response;
+- windows.epoch: one training epoch of `ventanas` windows;
+- rl.step: `entorno.EntornoVectorizado` steps, one environment per ticker;
+- scheduler.batch: `pipeline._refresh_tickers` end to end (fetch, indicators,
+  metrics, documents, batched writes).
+
+Each runs at 1, 43 and 5,000 tickers and 2 and 20 years of daily bars,
+except where a case does not apply (the batch endpoint takes at most
+`batch_history.MAX_BATCH_TICKERS` tickers, the scheduler always fetches
+2 years) or would not fit in memory. A case is timed as the median of
+several runs (with the garbage collector off, like `timeit`) and compared
+with `benchmarks_baseline.json`. The runs are spread over `PROCESSES` new
+interpreters, so a case's time does not depend on the cases run before it
+(their imports, heap and caches), a subset of cases times as the full run
+does, and one process with an unlucky memory layout does not move the
+median. A case slower than its baseline by more than
+`--threshold` of it plus `MIN_REGRESSION_S` is a regression and makes the
+run exit with status 1. The absolute allowance only matters for cases of a
+few milliseconds, whose run-to-run spread is relatively the largest.
+Baselines depend on the machine: store them with `--save` on the machine
+that checks them.
+
+    python benchmarks.py                                # all cases, against the baselines
+    python benchmarks.py --only indicators metrics --tickers 43
+    python benchmarks.py --save                         # record new baselines
+"""
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(HERE, os.pardir, "Evidencias de Modelos")
+BASELINE_FILE = os.path.join(HERE, "benchmarks_baseline.json")
+
+TICKERS = (1, 43, 5000)
+YEARS = (2, 20)
+TRADING_DAYS = 252
+END = "2025-06-30"
+GAP_RATE = 0.01
+DEFAULT_THRESHOLD = 0.25
+MIN_REGRESSION_S = 0.005  # allowed on top of the relative threshold: scheduler noise on short cases
+MAX_FRAME_CELLS = 40_000_000  # OHLCV values above which full-frame cases are skipped
+REPEAT = 31
+PROCESSES = 3  # interpreters each case's runs are spread over
+MIN_REPEAT = 3  # runs timed per process even past the budget, so the median is not a single run
+REPEAT_BUDGET_S = 10.0  # no further repeats once a case has run this long, over all processes
+
+BENCHMARKS = {}  # name -> (setup, applies)
+
+
+def benchmark(name, applies=None):
+    """
+    Register `setup(n_tickers, n_days)` under `name`. The setup builds the
+    inputs and returns the callable that is timed; `applies(n_tickers,
+    n_days)` leaves a case out when it returns False.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, applies or (lambda n_tickers, n_days: True))
+        return setup
+    return register
+
+
+def _fits(n_tickers, n_days):
+    return n_tickers * n_days * 5 <= MAX_FRAME_CELLS
+
+
+def _histories(n_tickers, n_days):
+    """Flat per-ticker OHLCV frames with indicators, as the handlers hold them."""
+    from fakes import synthetic_market
+    from indicators import add_indicators
+    from market_fetch import split_bulk_download
+
+    df = synthetic_market(n_tickers, n_days, END, GAP_RATE)
+    frames = split_bulk_download(df, list(df.columns.get_level_values(0).unique()))
+    return {t: add_indicators(f.copy()) for t, f in frames.items()}
+
+
+@benchmark("fetch.split", _fits)
+def _fetch_split(n_tickers, n_days):
+    from fakes import synthetic_market
+    from market_fetch import split_bulk_download
+
+    df = synthetic_market(n_tickers, n_days, END, GAP_RATE)
+    tickers = list(df.columns.get_level_values(0).unique())
+    return lambda: split_bulk_download(df, tickers)
+
+
+@benchmark("indicators.panel")
+def _indicators_panel(n_tickers, n_days):
+    from fakes import synthetic_closes
+    from indicators import panel_indicators
+
+    closes = synthetic_closes(n_tickers, n_days, END, GAP_RATE)
+    return lambda: panel_indicators(closes)
+
+
+@benchmark("metrics.table")
+def _metrics_table(n_tickers, n_days):
+    from fakes import synthetic_closes
+    from metrics import metrics_table, table_documents
+
+    closes = synthetic_closes(n_tickers, n_days, END, GAP_RATE)
+    return lambda: table_documents(metrics_table(closes))
+
+
+def _batch_sized(n_tickers, n_days):
+    from batch_history import MAX_BATCH_TICKERS
+    return n_tickers <= MAX_BATCH_TICKERS and _fits(n_tickers, n_days)
+
+
+@benchmark("json.records", _batch_sized)
+def _json_records(n_tickers, n_days):
+    import main
+
+    frames = _histories(n_tickers, n_days)
+
+    def run():
+        if len(frames) == 1:
+            (t, df), = frames.items()
+            return json.dumps({"ticker": t, "historicalData": main._to_records(df)})
+        return json.dumps({
+            "results": {t: {"historicalData": main._to_records(df)} for t, df in frames.items()},
+            "errors": {},
+        })
+    return run
+
+
+@benchmark("json.columnar", _batch_sized)
+def _json_columnar(n_tickers, n_days):
+    from columnar_json import encode_columnar, maybe_gzip
+
+    frames = _histories(n_tickers, n_days)
+
+    def run():
+        results = ", ".join(f"{json.dumps(t)}: {encode_columnar(df, t)}" for t, df in frames.items())
+        return maybe_gzip(f'{{"results": {{{results}}}, "errors": {{}}}}', "gzip")
+    return run
+
+
+@benchmark("windows.epoch", lambda n_tickers, n_days: n_tickers <= 43)
+def _windows_epoch(n_tickers, n_days):
+    # The training notebooks window one ticker or the CL universe.
+    import numpy as np
+    from ventanas import crear_ventanas, generar_lotes, pasos_por_epoca
+
+    features = [f.dropna().to_numpy(dtype=np.float32) for f in _histories(n_tickers, n_days).values()]
+
+    def run():
+        for X in features:
+            X_seq, y_seq = crear_ventanas(X, X[:, 3], 50)
+            lotes = generar_lotes(X_seq, y_seq, batch_size=256, shuffle=True, seed=0)
+            for _ in range(pasos_por_epoca(len(X_seq), 256)):
+                next(lotes)
+    return run
+
+
+@benchmark("rl.step")
+def _rl_step(n_tickers, n_days, steps=250):
+    import numpy as np
+    from entorno import EntornoVectorizado
+    from fakes import synthetic_closes
+
+    closes = synthetic_closes(n_tickers, n_days, END, GAP_RATE)
+    series = [closes[t].dropna().to_numpy() for t in closes.columns]
+    acts = np.random.default_rng(0).integers(0, 3, (steps, n_tickers))
+
+    def run():
+        env = EntornoVectorizado(series, history_t=90)
+        env.reset()
+        for a in acts:
+            _, _, fin = env.step(a)
+            if fin.any():
+                env.reset(np.flatnonzero(fin))
+    return run
+
+
+@benchmark("scheduler.batch", lambda n_tickers, n_days: n_days == 2 * TRADING_DAYS)
+def _scheduler_batch(n_tickers, n_days):
+    import contextlib
+    import shutil
+    import tempfile
+
+    import pipeline
+    from fakes import FakeProvider, InMemoryFirestore, install_offline_modules, synthetic_tickers
+    from fundamentals import CACHE_FILE, FundamentalsCache
+    from instrumentation import NULL
+    from market_fetch import YahooProvider
+    from price_store import PriceStore
+
+    # YahooProvider goes through the yfinance stand-in; the price store is
+    # new on every run, so each one downloads the whole history as the first
+    # night does. Fundamentals are cached, as they are on a normal night.
+    tickers = synthetic_tickers(n_tickers)
+    provider, _ = install_offline_modules(FakeProvider(n_days=n_days, end=END, gap_rate=GAP_RATE))
+    root = tempfile.mkdtemp()
+    fundamentals = FundamentalsCache(os.path.join(root, CACHE_FILE))
+    fundamentals.refresh(tickers, provider)
+
+    def run():
+        store = PriceStore(tempfile.mkdtemp(dir=root))
+        try:
+            # The per-ticker progress lines go to the function logs, not here.
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                pipeline._refresh_tickers(tickers, InMemoryFirestore(), YahooProvider(), store, fundamentals, NULL)
+        finally:
+            shutil.rmtree(store.root)
+    return run
+
+
+def time_runs(fn, repeat=REPEAT, budget=REPEAT_BUDGET_S):
+    """
+    Times of up to `repeat` runs of `fn`, fewer (but at least `MIN_REPEAT`)
+    once they add up to `budget` seconds. A first warm-up run
+    is left out, unless it alone takes a tenth of the budget. The garbage
+    collector is off while timing, so a collection triggered by earlier
+    cases does not land on one run.
+    """
+    import gc
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        fn()
+        first = time.perf_counter() - start
+        times = [first] if first >= budget / 10 else []
+        while len(times) < repeat and (len(times) < MIN_REPEAT or sum(times) < budget):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    finally:
+        if enabled:
+            gc.enable()
+    return times
+
+
+def case_key(name, n_tickers, years):
+    return f"{name}/{n_tickers}x{years}y"
+
+
+def time_case(name, n_tickers, n_years, repeat=REPEAT, processes=PROCESSES):
+    """
+    Median of the `time_runs` of one case, split over `processes` new
+    interpreters running this file with `--case`, one after the other.
+    """
+    import statistics
+    import subprocess
+
+    per_process = -(-repeat // processes)
+    budget = REPEAT_BUDGET_S / processes
+    times = []
+    for _ in range(processes):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--case", case_key(name, n_tickers, n_years),
+             "--repeat", str(per_process), "--budget", str(budget)],
+            check=True, capture_output=True, text=True, cwd=HERE,
+        ).stdout
+        times += json.loads(out.strip().splitlines()[-1])
+    return statistics.median(times)
+
+
+def run(names=None, tickers=TICKERS, years=YEARS, repeat=REPEAT, report=print):
+    """
+    Time every applicable case, each with `time_case`; returns
+    {case_key: seconds}. `report` gets (key, seconds) per case as soon as it
+    finishes, or (key, None) when skipped.
+    """
+    results = {}
+    for name, (setup, applies) in BENCHMARKS.items():
+        if names and not any(name == n or name.startswith(n + ".") for n in names):
+            continue
+        for n_tickers in tickers:
+            for n_years in years:
+                key = case_key(name, n_tickers, n_years)
+                n_days = n_years * TRADING_DAYS
+                if not applies(n_tickers, n_days):
+                    report(key, None)
+                    continue
+                results[key] = time_case(name, n_tickers, n_years, repeat)
+                report(key, results[key])
+    return results
+
+
+def machine():
+    import platform
+
+    import numpy as np
+    import pandas as pd
+
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def load_baseline(path=BASELINE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(results, path=BASELINE_FILE):
+    """Store `results` over the cases already in the file, with this machine's description."""
+    stored = (load_baseline(path) or {}).get("results", {})
+    baseline = {"machine": machine(), "results": dict(sorted({**stored, **results}.items()))}
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+
+def regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    {case_key: (seconds, baseline seconds)} for the cases slower than their
+    baseline by more than `threshold` of it plus `MIN_REGRESSION_S`.
+    """
+    stored = (baseline or {}).get("results", {})
+    return {
+        key: (seconds, stored[key]) for key, seconds in results.items()
+        if key in stored and seconds > stored[key] * (1 + threshold) + MIN_REGRESSION_S
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", help="benchmark names or prefixes, e.g. json metrics.table")
+    parser.add_argument("--tickers", type=int, nargs="+", default=list(TICKERS))
+    parser.add_argument("--years", type=int, nargs="+", default=list(YEARS))
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="runs per case, over all its processes")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown over the baseline, on top of MIN_REGRESSION_S, that counts as a regression")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baselines")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    # One process of time_case: the runs of one case_key, printed as a JSON list.
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--budget", type=float, default=REPEAT_BUDGET_S, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    from fakes import install_offline_modules
+
+    sys.path.insert(0, MODELS_DIR)
+    install_offline_modules()
+    if args.case:
+        name, size = args.case.split("/")
+        n_tickers, n_years = map(int, size.rstrip("y").split("x"))
+        print(json.dumps(time_runs(BENCHMARKS[name][0](n_tickers, n_years * TRADING_DAYS), args.repeat, args.budget)))
+        sys.exit(0)
+    baseline = load_baseline(args.baseline)
+    stored = (baseline or {}).get("results", {})
+    if baseline and baseline.get("machine", {}).get("platform") != machine()["platform"]:
+        print(f"Note: baselines recorded on {baseline['machine']['platform']}; timings may not compare.")
+
+    def report(key, seconds):
+        if seconds is None:
+            print(f"  {key:<34} {'skipped':>10}")
+            return
+        line = f"  {key:<34} {seconds * 1000:9.1f}ms"
+        if key in stored:
+            ratio = seconds / stored[key]
+            flag = "  REGRESSION" if key in regressions({key: seconds}, baseline, args.threshold) else ""
+            line += f"  baseline {stored[key] * 1000:9.1f}ms  x{ratio:5.2f}{flag}"
+        print(line, flush=True)
+
+    results = run(args.only, args.tickers, args.years, args.repeat, report)
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"Stored {len(results)} baselines in {args.baseline}")
+    else:
+        slower = regressions(results, baseline, args.threshold)
+        if slower:
+            print(f"{len(slower)} of {len(results)} cases more than {args.threshold:.0%} "
+                  f"(+{MIN_REGRESSION_S * 1000:.0f} ms) slower than their baseline")
+            sys.exit(1)
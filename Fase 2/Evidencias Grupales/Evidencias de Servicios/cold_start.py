@@ -0,0 +1,222 @@
+# cold_start.py
+"""
+Cold-start profiling and warm-up for the Cloud Functions entry points.
+
+Every new instance pays for importing the entry point module and, on the
+first request, for each heavy dependency a handler touches (NumPy, pandas,
+yfinance, the Firestore client). This module:
+
+- measures that cost in fresh interpreters, per entry point and per
+  dependency, with the `-X importtime` breakdown of the module import. The
+  module is loaded by `functions_framework.create_app`, as the runtime
+  does when an instance starts;
+- provides `warm_up`, used by the optional module-level hook in main.py
+  (`MINERVA_WARMUP=numpy,pandas,yfinance,firestore`);
+- fails (exit status 1) when a cold start goes over a budget, so it can run
+  as a regression check:
+
+    python cold_start.py --budget-ms 2500
+
+A dependency that cannot be initialized (or a missing functions framework)
+would make a cold start look faster than it is, so it fails the check too;
+with `--allow-missing` those handlers are reported as SKIPPED instead, and
+without the framework the module is imported directly.
+
+No network is needed: nothing is fetched, and Firebase only builds its
+(lazy) default credentials. Run it where firebase_functions and the
+functions framework are installed, as in the deployed image.
+"""
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODELOS = os.path.normpath(os.path.join(HERE, os.pardir, "Evidencias de Modelos"))
+
+# Import name of each heavy dependency a handler may touch on its first request.
+HEAVY_MODULES = {
+    "numpy": "numpy",
+    "pandas": "pandas",
+    "yfinance": "yfinance",
+    "firestore": "firebase_admin.firestore",
+    "tensorflow": "tensorflow",
+}
+
+# Entry point file -> handler -> dependencies it needs on the first request.
+ENTRY_POINTS = {
+    os.path.join(HERE, "main.py"): {
+        "update_market_metrics_scheduled": (),  # only queues the shard tasks
+        "refresh_market_shard": ("numpy", "pandas", "yfinance", "firestore"),
+        "refresh_fundamentals_scheduled": ("yfinance",),
+        "get_historical_data_with_indicators": ("numpy", "pandas", "yfinance"),
+        "predict_next_close": ("numpy", "pandas", "tensorflow"),
+    },
+    os.path.join(MODELOS, "BackEndYf.py"): {
+        "update_market_metrics_scheduled": (),  # only queues the shard tasks
+        "refresh_market_shard": ("numpy", "pandas", "yfinance", "firestore"),
+        "refresh_fundamentals_scheduled": ("yfinance",),
+        "get_historical_data_with_indicators": ("numpy", "pandas", "yfinance"),
+    },
+}
+
+DEFAULT_BUDGET_MS = float(os.environ.get("MINERVA_COLD_START_BUDGET_MS", "3000"))
+
+
+def warm_up(names, initializers=None):
+    """
+    Import (or initialize) the named heavy dependencies now instead of on the
+    first request. `initializers` maps a name to a callable that replaces the
+    plain import, e.g. {"firestore": get_firestore_client}.
+    Returns name -> seconds; unknown names raise KeyError.
+    """
+    initializers = initializers or {}
+    timings = {}
+    for name in (n.strip() for n in names):
+        if not name:
+            continue
+        start = time.perf_counter()
+        if name in initializers:
+            initializers[name]()
+        else:
+            importlib.import_module(HEAVY_MODULES[name])
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+_MARKER = "-- entry point import --"
+
+
+def parse_importtime(stderr, top=10):
+    """
+    Direct imports of the entry point from `-X importtime` output, as
+    (module, cumulative seconds), slowest first.
+    """
+    rows = []
+    lines = stderr.splitlines()
+    if _MARKER in lines:
+        lines = lines[lines.index(_MARKER) + 1:]
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Direct imports of the entry point have no nesting indent.
+        if name.startswith(" ") and not name.startswith("  ") and cumulative.strip().isdigit():
+            rows.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+
+
+# Runs in a fresh interpreter: load the entry point through the functions
+# framework (imported first, as the runtime is already running), then time
+# each dependency its handler needs, in order, as the first request would.
+_CHILD = """
+import importlib.util, json, os, sys, time
+path, deps, target = sys.argv[1], sys.argv[2].split(",") if sys.argv[2] else [], sys.argv[4]
+sys.path.insert(0, sys.argv[3])
+from cold_start import warm_up, _MARKER
+try:
+    import functions_framework
+except ImportError:
+    functions_framework = None
+sys.stderr.write(_MARKER + "\\n")
+sys.stderr.flush()
+start = time.perf_counter()
+if functions_framework is not None and target:
+    functions_framework.create_app(target=target, source=path, signature_type="http")
+    module = sys.modules[os.path.splitext(os.path.basename(path))[0]]
+else:
+    spec = importlib.util.spec_from_file_location("entry_point", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+result = {"import": time.perf_counter() - start, "deps": {}, "errors": {},
+          "framework": functions_framework is not None and bool(target)}
+inits = {"firestore": module.get_firestore_client} if hasattr(module, "get_firestore_client") else {}
+for dep in deps:
+    try:
+        result["deps"].update(warm_up([dep], inits))
+    except Exception as e:
+        result["errors"][dep] = repr(e)
+print(json.dumps(result))
+"""
+
+
+def profile(path, deps=(), importtime=False, target=None):
+    """
+    Cold-start timings of one entry point and the dependencies of one handler,
+    in a new process. The module is loaded by the functions framework for
+    `target` (a handler name) when both are available.
+    """
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", _CHILD, path, ",".join(deps), HERE, target or ""]
+    env = dict(os.environ, MINERVA_WARMUP="")
+    env.setdefault("GOOGLE_CLOUD_PROJECT", "minerva-cold-start")  # offline Firestore client
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(path), env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{os.path.basename(path)} failed to import:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if importtime:
+        result["breakdown"] = parse_importtime(proc.stderr)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    import statistics
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="fail when import + first-request dependencies exceed this")
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per handler (median is used)")
+    parser.add_argument("--entry", nargs="*", help="entry point files (default: main.py and BackEndYf.py)")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="skip handlers whose dependencies (or the functions framework) are unavailable")
+    args = parser.parse_args()
+
+    over, failed = [], []
+    for path in args.entry or ENTRY_POINTS:
+        path = os.path.abspath(path)
+        handlers = ENTRY_POINTS.get(path, {"(import only)": ()})
+        if not os.path.exists(path):
+            continue
+        targets = [h for h in handlers if not h.startswith("(")]
+        first = profile(path, importtime=True, target=targets[0] if targets else None)
+        how = "functions framework" if first["framework"] else "direct import, no functions framework"
+        print(f"{os.path.relpath(path, HERE)}: module import {first['import'] * 1000:.0f} ms ({how})")
+        if targets and not first["framework"] and not args.allow_missing:
+            failed.append((path, "(functions framework)"))
+        for module, seconds in first["breakdown"]:
+            print(f"    {module:<32} {seconds * 1000:8.1f} ms")
+
+        for handler, deps in handlers.items():
+            target = None if handler.startswith("(") else handler
+            runs = [profile(path, deps, target=target) for _ in range(args.runs)]
+            errors = {dep: error for r in runs for dep, error in r["errors"].items()}
+            total_ms = statistics.median(r["import"] + sum(r["deps"].values()) for r in runs) * 1000
+            deps_line = "  ".join(
+                f"{d} {statistics.median(r['deps'][d] for r in runs) * 1000:.0f} ms" if d not in errors
+                else f"{d} unavailable" for d in deps
+            )
+            # A dependency that failed took no time, so the total says nothing about the budget.
+            if errors:
+                status = "SKIPPED" if args.allow_missing else "FAILED"
+            else:
+                status = "OK" if total_ms <= args.budget_ms else "OVER BUDGET"
+            print(f"  {handler:<38} cold start {total_ms:8.0f} ms  [{deps_line}]  {status}")
+            for dep, error in errors.items():
+                print(f"    {dep} could not be initialized offline: {error}")
+            if errors and not args.allow_missing:
+                failed.append((path, handler))
+            elif not errors and total_ms > args.budget_ms:
+                over.append((path, handler, total_ms))
+
+    if over:
+        print(f"{len(over)} entry point(s) over the {args.budget_ms:.0f} ms cold-start budget")
+    if failed:
+        print(f"{len(failed)} handler(s) not measured: dependencies unavailable "
+              f"(install them, or pass --allow-missing to skip)")
+    if over or failed:
+        sys.exit(1)
@@ -0,0 +1,473 @@
+# fakes.py
+"""
+Offline stand-ins for the external services used by the Cloud Functions,
+so the pipeline can be exercised and benchmarked without network access.
+"""
+import time
+import zlib
+from functools import lru_cache
+
+PRICE_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def synthetic_tickers(n):
+    """`n` fake `.SN` symbols, stable across runs."""
+    return [f"SYN{i:05d}.SN" for i in range(n)]
+
+
+@lru_cache(maxsize=4096)
+def synthetic_ohlcv(ticker, n_days=504, end=None, gap_rate=0.0):
+    """
+    Deterministic random-walk OHLCV frame for one ticker, shaped like yfinance,
+    ending on `end` (default: today), with a `gap_rate` share of the business
+    days missing. Cached, so callers must copy before mutating.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+    end = pd.Timestamp.today().normalize() if end is None else pd.Timestamp(end)
+    index = pd.bdate_range(end=end, periods=n_days, name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n_days)))
+    spread = np.abs(rng.normal(0, 0.01, n_days)) * close
+    open_ = close * (1 + rng.normal(0, 0.005, n_days))
+    df = pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) + spread,
+        "Low": np.minimum(open_, close) - spread,
+        "Close": close,
+        "Volume": rng.integers(10_000, 1_000_000, n_days).astype("int64"),
+    }, index=index)
+    return df[rng.random(n_days) >= gap_rate] if gap_rate else df
+
+
+def synthetic_market(tickers, n_days=504, end="2025-06-30", gap_rate=0.01, late_listings=0.2,
+                     seed=0, group_by="ticker", fields=PRICE_FIELDS):
+    """
+    Deterministic multi-ticker download shaped like `yf.download(...)`:
+    MultiIndex columns (ticker, field) with `group_by="ticker"`, or
+    (field, ticker) with `group_by="column"`, on a shared business-day index.
+    As in a real multi-symbol download, rows are missing per ticker: a
+    `gap_rate` share of days at random (holidays, suspensions), and for a
+    `late_listings` share of tickers, the first part of the history.
+    `tickers` is a list of symbols or a count of `synthetic_tickers`.
+    """
+    import pandas as pd
+
+    tickers = synthetic_tickers(tickers) if isinstance(tickers, int) else list(tickers)
+    values = _synthetic_fields(len(tickers), n_days, gap_rate, late_listings, seed, fields)
+    index = pd.bdate_range(end=pd.Timestamp(end), periods=n_days, name="Date")
+    if group_by == "ticker":
+        data = {(t, f): values[f][:, i] for i, t in enumerate(tickers) for f in fields}
+        names = ["Ticker", "Price"]
+    else:
+        data = {(f, t): values[f][:, i] for f in fields for i, t in enumerate(tickers)}
+        names = ["Price", "Ticker"]
+    df = pd.DataFrame(data, index=index)
+    df.columns = pd.MultiIndex.from_tuples(df.columns, names=names)
+    return df
+
+
+def synthetic_closes(tickers, n_days=504, end="2025-06-30", gap_rate=0.01, late_listings=0.2, seed=0):
+    """The dates x tickers Close matrix of `synthetic_market`, without building the other fields."""
+    import pandas as pd
+
+    tickers = synthetic_tickers(tickers) if isinstance(tickers, int) else list(tickers)
+    close = _synthetic_fields(len(tickers), n_days, gap_rate, late_listings, seed, ("Close",))["Close"]
+    index = pd.bdate_range(end=pd.Timestamp(end), periods=n_days, name="Date")
+    return pd.DataFrame(close, index=index, columns=tickers)
+
+
+def _synthetic_fields(n_tickers, n_days, gap_rate, late_listings, seed, fields):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    close = rng.normal(0.0003, 0.02, (n_days, n_tickers))
+    np.cumsum(close, axis=0, out=close)
+    np.exp(close, out=close)
+    close *= rng.uniform(5, 500, n_tickers)
+    missing = rng.random((n_days, n_tickers)) < gap_rate
+    listed = np.where(rng.random(n_tickers) < late_listings, rng.integers(0, n_days // 2 + 1, n_tickers), 0)
+    missing |= np.arange(n_days)[:, None] < listed
+    close[missing] = np.nan
+
+    out = {"Close": close}
+    if set(fields) - {"Close"}:
+        # Drawn whether or not they are returned, so Close does not depend on `fields`.
+        open_ = close * (1 + rng.normal(0, 0.005, close.shape))
+        spread = np.abs(rng.normal(0, 0.01, close.shape)) * close
+        volume = rng.integers(10_000, 1_000_000, close.shape).astype(np.float64)
+        volume[missing] = np.nan
+        out.update({
+            "Open": open_,
+            "High": np.fmax(open_, close) + spread,
+            "Low": np.fmin(open_, close) - spread,
+            "Volume": volume,
+        })
+    return {f: out[f] for f in fields}
+
+
+def _with_actions(df):
+    # The Dividends and Stock Splits columns of Ticker.history (and download(actions=True)).
+    return df.assign(Dividends=0.0, **{"Stock Splits": 0.0})
+
+
+class FakeProvider:
+    """
+    Stand-in for `market_fetch.YahooProvider`.
+
+    Every call sleeps `latency` seconds to mimic a network round-trip, and
+    `end` sets the date of the newest bar, to replay a later night;
+    `download` keeps only the bars inside `period` (or from `start`), and
+    `gap_rate` leaves that share of days out of each ticker's bars, so a
+    multi-symbol download has NaN rows as yfinance's does.
+    Tickers in `missing` return no rows; tickers in `failing` raise on `info`.
+    With `max_rate`, a call beyond `max_rate` calls in the trailing second
+    raises a simulated "429 Too Many Requests", as Yahoo does when throttling.
+    """
+
+    def __init__(self, latency=0.0, n_days=504, missing=(), failing=(), end=None, max_rate=None,
+                 gap_rate=0.0):
+        import collections
+        import threading
+
+        self.latency = latency
+        self.n_days = n_days
+        self.end = end
+        self.gap_rate = gap_rate
+        self.missing = set(missing)
+        self.failing = set(failing)
+        self.max_rate = max_rate
+        self.calls = {"download": 0, "history": 0, "info": 0, "rows": 0, "throttled": 0}
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+
+    def _request(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+            if self.max_rate is not None:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] >= 1.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.max_rate:
+                    self.calls["throttled"] += 1
+                    raise RuntimeError("simulated 429 Too Many Requests")
+                self._recent.append(now)
+        time.sleep(self.latency)
+
+    def download(self, tickers, period="2y", interval="1d", start=None, end=None, actions=False):
+        import pandas as pd
+
+        from price_store import period_start
+
+        self._request("download")
+        if start is None:
+            # As yfinance: `period` counts back from today (here, from `end`).
+            start = period_start(period, today=self.end)
+        frames = {}
+        for t in tickers:
+            if t in self.missing:
+                continue
+            df = synthetic_ohlcv(t, self.n_days, self.end, self.gap_rate)
+            df = df[df.index >= pd.Timestamp(start)]
+            if end is not None:
+                df = df[df.index < pd.Timestamp(end)]
+            self.calls["rows"] += len(df)
+            frames[t] = _with_actions(df) if actions else df
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+    def history(self, ticker, start, end):
+        import pandas as pd
+
+        self._request("history")
+        if ticker in self.missing:
+            return pd.DataFrame()
+        df = synthetic_ohlcv(ticker, self.n_days, self.end, self.gap_rate)
+        df = df[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+        self.calls["rows"] += len(df)
+        return _with_actions(df)
+
+    def info(self, ticker):
+        self._request("info")
+        if ticker in self.failing:
+            raise RuntimeError(f"simulated info failure for {ticker}")
+        return {
+            "longName": f"{ticker} S.A.",
+            "sector": "Synthetic",
+            "marketCap": 1_000_000_000 + zlib.crc32(ticker.encode()) % 10**9,
+            "trailingPE": 12.5,
+            "priceToBook": 1.4,
+            "returnOnEquity": 0.11,
+            "debtToEquity": 85.0,
+            "dividendYield": 0.035,
+        }
+
+
+class _FakeDocument:
+    def __init__(self, db, collection, doc_id):
+        self._db = db
+        self.collection_name = collection
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        self._db._rpc()
+        self._db._store(self.collection_name, self.id, data, merge)
+
+    def get(self, transaction=None):
+        self._db._rpc()
+        with self._db._lock:
+            data = self._db.data.get(self.collection_name, {}).get(self.id)
+        return _FakeSnapshot(self.id, None if data is None else dict(data))
+
+
+class _FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return self._data
+
+
+class _FakeCollection:
+    def __init__(self, db, name):
+        self._db = db
+        self.name = name
+
+    def document(self, doc_id):
+        return _FakeDocument(self._db, self.name, doc_id)
+
+
+class _FakeWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append((ref, data, merge))
+
+    def commit(self):
+        self._db._rpc(commit=True, writes=len(self._writes))
+        for ref, data, merge in self._writes:
+            self._db._store(ref.collection_name, ref.id, data, merge)
+        self._writes = []
+
+
+class _FakeTransaction(_FakeWriteBatch):
+    """Writes buffered until the commit, like a batch; see `transactional`."""
+
+
+def transactional(fn):
+    """
+    Stand-in for `firestore.transactional`: runs `fn(transaction, ...)` and
+    commits its writes while holding the database's transaction lock, so
+    transactions on one `InMemoryFirestore` never interleave.
+    """
+    def run(transaction, *args, **kwargs):
+        with transaction._db._transaction_lock:
+            result = fn(transaction, *args, **kwargs)
+            transaction.commit()
+        return result
+    return run
+
+
+class InMemoryFirestore:
+    """
+    Minimal stand-in for a `firestore.client()`: `collection().document()`
+    `set()` (with `merge`) and `get()`, `get_all()`, `batch()` and
+    `transaction()` (for `transactional`). Each RPC (a single `set` or a batch `commit`) sleeps
+    `latency` seconds plus `per_write` seconds for every document it carries;
+    the first `fail_commits` batch commits raise.
+    """
+
+    def __init__(self, latency=0.0, per_write=0.0, fail_commits=0):
+        import threading
+
+        self.latency = latency
+        self.per_write = per_write
+        self.fail_commits = fail_commits
+        self.data = {}
+        self.rpcs = 0
+        self.commits = 0
+        self._lock = threading.Lock()
+        self._transaction_lock = threading.Lock()
+
+    def collection(self, name):
+        return _FakeCollection(self, name)
+
+    def batch(self):
+        return _FakeWriteBatch(self)
+
+    def transaction(self):
+        return _FakeTransaction(self)
+
+    def get_all(self, refs):
+        """Snapshots of `refs`, in one RPC as the real client streams them."""
+        self._rpc()
+        snapshots = []
+        with self._lock:
+            for ref in refs:
+                data = self.data.get(ref.collection_name, {}).get(ref.id)
+                snapshots.append(_FakeSnapshot(ref.id, None if data is None else dict(data)))
+        return snapshots
+
+    def _rpc(self, commit=False, writes=1):
+        with self._lock:
+            self.rpcs += 1
+            if commit:
+                self.commits += 1
+                if self.fail_commits > 0:
+                    self.fail_commits -= 1
+                    raise RuntimeError("simulated commit failure")
+        time.sleep(self.latency + self.per_write * writes)
+
+    def _store(self, collection, doc_id, data, merge=False):
+        with self._lock:
+            docs = self.data.setdefault(collection, {})
+            # merge=True only merges top-level fields, which is all the services use.
+            docs[doc_id] = {**docs.get(doc_id, {}), **data} if merge else dict(data)
+
+
+class InMemoryCheckpoints:
+    """Stand-in for `shards.FirestoreCheckpoints`, kept in a dict."""
+
+    def __init__(self):
+        import threading
+
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def done(self, run_id, shard):
+        with self._lock:
+            return set(self._runs.get((run_id, shard), {}).get("Done", ()))
+
+    def mark(self, run_id, shard, tickers, complete=False):
+        with self._lock:
+            entry = self._runs.setdefault((run_id, shard), {"Done": set(), "Complete": False})
+            entry["Done"].update(tickers)
+            entry["Complete"] = entry["Complete"] or complete
+
+    def completed(self, run_id, n_shards):
+        with self._lock:
+            return {s for s in range(n_shards) if self._runs.get((run_id, s), {}).get("Complete")}
+
+    def claim(self, run_id, step):
+        with self._lock:
+            if (run_id, step) in self._runs:
+                return False
+            self._runs[(run_id, step)] = {}
+            return True
+
+
+class FakeInterpreter:
+    """
+    Stand-in for `tf.lite.Interpreter` running LSTM-S.tflite (input
+    [batch, 100, 1] float32, output [batch, 1]). Each `invoke` costs `overhead`
+    seconds plus `per_sample` per row, roughly the shape of the real
+    interpreter's cost; the output is a fixed linear read-out of the window.
+    """
+
+    def __init__(self, model_path=None, num_threads=None, overhead=0.002, per_sample=0.00005, window=100):
+        import numpy as np
+
+        self.overhead = overhead
+        self.per_sample = per_sample
+        self._shape = [1, window, 1]
+        self._weights = np.linspace(0.0, 2.0 / window, window, dtype=np.float32)
+        self._input = None
+        self._output = None
+        self.invokes = 0
+        self.resizes = 0
+
+    def get_input_details(self):
+        import numpy as np
+        return [{"index": 0, "shape": np.array(self._shape), "dtype": np.float32}]
+
+    def get_output_details(self):
+        import numpy as np
+        return [{"index": 1, "shape": np.array([self._shape[0], 1]), "dtype": np.float32}]
+
+    def resize_tensor_input(self, index, shape, strict=False):
+        self._shape = list(shape)
+        self.resizes += 1
+
+    def allocate_tensors(self):
+        pass
+
+    def set_tensor(self, index, value):
+        if list(value.shape) != self._shape:
+            raise ValueError(f"Cannot set tensor: got shape {list(value.shape)}, expected {self._shape}")
+        self._input = value
+
+    def invoke(self):
+        self.invokes += 1
+        time.sleep(self.overhead + self.per_sample * self._shape[0])
+        self._output = (self._input[:, :, 0] @ self._weights)[:, None]
+
+    def get_tensor(self, index):
+        return self._output
+
+
+def install_offline_modules(provider=None, db=None):
+    """
+    Register stand-ins for `yfinance`, `firebase_admin` (with `firestore`)
+    and `firebase_functions` in `sys.modules`, so `main.py`, `BackEndYf.py`
+    and everything they import run without network access or credentials.
+    `yf.download`, `yf.Ticker(...).history` and `.info` are answered by
+    `provider` (a `FakeProvider` by default); `firestore.client()` returns
+    `db` (an `InMemoryFirestore` by default). Returns (provider, db).
+    """
+    import sys
+    import types
+
+    provider = FakeProvider() if provider is None else provider
+    db = InMemoryFirestore() if db is None else db
+
+    def download(tickers, period="2y", interval="1d", start=None, end=None, actions=False, **kwargs):
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        return provider.download(tickers, period, interval, start=start, end=end, actions=actions)
+
+    class Ticker:
+        def __init__(self, ticker):
+            self.ticker = ticker
+
+        @property
+        def info(self):
+            return provider.info(self.ticker)
+
+        def history(self, start=None, end=None, **kwargs):
+            return provider.history(self.ticker, start, end)
+
+    def decorator(*args, **kwargs):
+        if args and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda f: f
+
+    yf = types.ModuleType("yfinance")
+    yf.download, yf.Ticker = download, Ticker
+    admin = types.ModuleType("firebase_admin")
+    admin.initialize_app = lambda *args, **kwargs: None
+    firestore = types.ModuleType("firebase_admin.firestore")
+    firestore.SERVER_TIMESTAMP = "SERVER_TIMESTAMP"
+    firestore.client = lambda *args, **kwargs: db
+    firestore.transactional = transactional
+    admin.firestore = firestore
+    functions = types.ModuleType("firebase_functions")
+    functions.scheduler_fn = types.SimpleNamespace(on_schedule=decorator, ScheduledEvent=object)
+    functions.https_fn = types.SimpleNamespace(on_request=decorator, Request=object, Response=object)
+    functions.tasks_fn = types.SimpleNamespace(on_task_dispatched=decorator, CallableRequest=object)
+    options = types.ModuleType("firebase_functions.options")
+    options.set_global_options = lambda **kwargs: None
+    options.RateLimits = options.RetryConfig = lambda **kwargs: None
+    functions.options = options
+    sys.modules.update({
+        "yfinance": yf,
+        "firebase_admin": admin,
+        "firebase_admin.firestore": firestore,
+        "firebase_functions": functions,
+        "firebase_functions.options": options,
+    })
+    return provider, db
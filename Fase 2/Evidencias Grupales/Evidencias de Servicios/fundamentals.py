@@ -0,0 +1,242 @@
+# fundamentals.py
+"""
+Persistent cache of the `Ticker.info` fields the services keep.
+
+`Ticker.info` is the slowest call per ticker and the fields we use change on
+a scale of weeks (ratios move with quarterly reports, names and sectors
+almost never), so each field has its own time to live in `FIELD_TTL`. Each
+ticker's entry holds the values and the time each field was last
+refreshed; `refresh` (the weekly job) and `infos` (the daily job) only call
+the provider for tickers with a stale or missing field.
+
+The Cloud Functions keep the entries in Firestore (`FirestoreStore`, one
+document per ticker in `FUNDAMENTALS`, next to the run checkpoints), so
+every instance and every shard reads what the weekly job wrote. Local runs
+and benchmarks use a JSON file (`JsonFileStore`).
+"""
+import json
+import os
+import time
+
+from market_fetch import DEFAULT_MAX_WORKERS, fetch_infos
+from price_store import DEFAULT_ROOT
+
+DAY = 86400
+FIELD_TTL = {
+    "marketCap": 7 * DAY,
+    "trailingPE": 7 * DAY,
+    "priceToBook": 30 * DAY,
+    "dividendYield": 30 * DAY,
+    "returnOnEquity": 90 * DAY,
+    "debtToEquity": 90 * DAY,
+    "sector": 180 * DAY,
+    "longName": 180 * DAY,
+}
+# A field this close to its TTL already counts as stale, so a weekly refresh
+# does not skip week-old fields because it started a few seconds early.
+SCHEDULE_SLACK = 3600
+CACHE_FILE = "fundamentals.json"
+DEFAULT_PATH = os.path.join(DEFAULT_ROOT, CACHE_FILE)
+FUNDAMENTALS_COLLECTION = "FUNDAMENTALS"
+
+
+class JsonFileStore:
+    """All entries in one JSON file, rewritten atomically; for local runs and benchmarks."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def load(self, tickers):
+        entries = self._read()
+        return {t: entries[t] for t in tickers if t in entries}
+
+    def save(self, updates):
+        # Over the file as it is now, so parallel writers do not drop each other's updates.
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        entries = self._read()
+        entries.update(updates)
+        tmp = f"{self.path}.{os.getpid()}.{id(self)}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.path)
+
+
+class FirestoreStore:
+    """
+    One document per ticker in `collection`, {"Ticker", "Values",
+    "Refreshed"}, read with one `get_all` and written with batched writes.
+    """
+
+    def __init__(self, db_client, collection=FUNDAMENTALS_COLLECTION):
+        self.db_client = db_client
+        self.collection = collection
+
+    def load(self, tickers):
+        refs = [self.db_client.collection(self.collection).document(t) for t in tickers]
+        entries = {}
+        for snapshot in self.db_client.get_all(refs):
+            if snapshot.exists:
+                data = snapshot.to_dict()
+                entries[snapshot.id] = {"values": data.get("Values", {}), "refreshed": data.get("Refreshed", {})}
+        return entries
+
+    def save(self, updates):
+        from firestore_batch import commit_documents
+
+        _, errors = commit_documents(self.db_client, self.collection, {
+            t: {"Ticker": t, "Values": e["values"], "Refreshed": e["refreshed"]} for t, e in updates.items()
+        })
+        for t, e in errors.items():
+            # The fetched values are still used this run; the next one fetches them again.
+            print(f"Error saving fundamentals of {t}: {e}")
+
+
+class FundamentalsCache:
+    """
+    {ticker: {"values": {field: value}, "refreshed": {field: epoch seconds}}}
+    read from `store` on first use of each ticker and written back by `save`.
+    `store` is a `JsonFileStore`, a `FirestoreStore`, or a JSON file path.
+    """
+
+    def __init__(self, store=DEFAULT_PATH, ttl=FIELD_TTL):
+        self.store = JsonFileStore(store) if isinstance(store, str) else store
+        self.ttl = dict(ttl)
+        self._entries = {}
+        self._loaded = set()
+        self._dirty = set()
+
+    def load(self, tickers):
+        """Read the entries of `tickers` not read yet, in one round-trip."""
+        todo = [t for t in dict.fromkeys(tickers) if t not in self._loaded]
+        if todo:
+            self._entries.update(self.store.load(todo))
+            self._loaded.update(todo)
+
+    def __contains__(self, ticker):
+        self.load([ticker])
+        return ticker in self._entries
+
+    def get(self, ticker):
+        """Cached fields of `ticker` (None for fields the provider did not have), or None."""
+        self.load([ticker])
+        entry = self._entries.get(ticker)
+        return dict(entry["values"]) if entry else None
+
+    def refreshed(self, ticker):
+        """Epoch seconds of the oldest field refresh of `ticker`, or None."""
+        self.load([ticker])
+        entry = self._entries.get(ticker)
+        return min(entry["refreshed"].get(f, 0) for f in self.ttl) if entry else None
+
+    def stale(self, tickers, now=None):
+        """The tickers with at least one field older than its TTL, or never fetched."""
+        now = time.time() if now is None else now
+        self.load(tickers)
+        out = []
+        for t in tickers:
+            entry = self._entries.get(t)
+            if entry is None or any(
+                now - entry["refreshed"].get(f, 0) >= ttl - SCHEDULE_SLACK for f, ttl in self.ttl.items()
+            ):
+                out.append(t)
+        return out
+
+    def update(self, ticker, info, now=None):
+        """Store the kept fields of a fresh `Ticker.info`."""
+        now = time.time() if now is None else now
+        self._loaded.add(ticker)
+        entry = self._entries.setdefault(ticker, {"values": {}, "refreshed": {}})
+        for field in self.ttl:
+            entry["values"][field] = info.get(field)
+            entry["refreshed"][field] = now
+        self._dirty.add(ticker)
+
+    def save(self):
+        """Write the tickers updated since the last save; other tickers' entries are left alone."""
+        if self._dirty:
+            self.store.save({t: self._entries[t] for t in self._dirty})
+        self._dirty.clear()
+
+    def _fetch(self, tickers, provider, max_workers, now):
+        # Stamped with the start of the run, so consecutive scheduled runs are one period apart.
+        now = time.time() if now is None else now
+        infos, errors = fetch_infos(tickers, provider, max_workers)
+        for t, info in infos.items():
+            self.update(t, info, now)
+        if infos:
+            self.save()
+        return list(infos), errors
+
+    def refresh(self, tickers, provider, max_workers=DEFAULT_MAX_WORKERS, now=None):
+        """
+        Fetch `Ticker.info` for the stale tickers only and save.
+        Returns (refreshed tickers, errors); a failed ticker keeps its old values.
+        """
+        return self._fetch(self.stale(tickers, now), provider, max_workers, now)
+
+    def infos(self, tickers, provider, max_workers=DEFAULT_MAX_WORKERS, now=None):
+        """
+        Cached fields for every ticker. Tickers never fetched, or with a
+        field past its TTL (the weekly refresh missed them), go to the
+        provider; one that fails there keeps its old values. Returns (infos, errors).
+        """
+        _, errors = self._fetch(self.stale(tickers, now), provider, max_workers, now)
+        infos = {t: self.get(t) for t in tickers if t in self}
+        # A stale ticker with cached values is still answered; only a miss is an error.
+        return infos, {t: e for t, e in errors.items() if t not in infos}
+
+
+if __name__ == "__main__":
+    # A week of daily jobs with the cache against calling Ticker.info every night;
+    # the weekly refresh and every daily job run on a fresh instance, sharing
+    # only the Firestore documents (the in-memory fake):
+    #   python fundamentals.py --tickers 43 1000 --latency 0.2
+    import argparse
+
+    from fakes import FakeProvider, InMemoryFirestore, synthetic_tickers
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, nargs="+", default=[43, 1000])
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated seconds per Ticker.info")
+    parser.add_argument("--firestore-latency", type=float, default=0.02, help="simulated seconds per Firestore RPC")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    args = parser.parse_args()
+
+    for n in args.tickers:
+        tickers = synthetic_tickers(n)
+        provider = FakeProvider(latency=args.latency)
+        start = time.perf_counter()
+        for _ in range(args.days):
+            fetch_infos(tickers, provider, args.workers)
+        nightly_s = time.perf_counter() - start
+
+        db = InMemoryFirestore(latency=args.firestore_latency)
+        t0 = time.time()
+        start = time.perf_counter()
+        refreshed, _ = FundamentalsCache(FirestoreStore(db)).refresh(tickers, provider, args.workers, now=t0)
+        refresh_s = time.perf_counter() - start
+        provider.calls["info"] = 0
+        start = time.perf_counter()
+        for day in range(args.days):
+            FundamentalsCache(FirestoreStore(db)).infos(tickers, provider, args.workers, now=t0 + day * DAY)
+        daily_s = time.perf_counter() - start
+        daily_calls = provider.calls["info"]
+        # A daily job after the weekly refresh was missed: the fields past their TTL are fetched by it.
+        provider.calls["info"] = 0
+        FundamentalsCache(FirestoreStore(db)).infos(tickers, provider, args.workers, now=t0 + args.days * DAY)
+        missed = provider.calls["info"]
+
+        print(f"{n:>6} tickers x {args.days} days  info every night {nightly_s:7.2f}s  "
+              f"weekly refresh {refresh_s:6.2f}s ({len(refreshed)} tickers) + "
+              f"cached daily jobs {daily_s:7.3f}s ({daily_calls} info calls)  "
+              f"daily job past the TTL: {missed} info calls")
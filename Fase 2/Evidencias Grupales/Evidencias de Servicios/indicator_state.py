@@ -0,0 +1,287 @@
+# indicator_state.py
+"""
+Streaming technical indicators: constant work per new bar.
+
+`IndicatorState` keeps the running state behind the columns of
+`indicators.INDICATOR_COLUMNS` for one ticker: a 50-bar ring buffer of closes
+with running sums for SMA_20/SMA_50 and the Bollinger variance, running EWMs
+for MACD/Signal and the RSI gains/losses (or a 14-bar ring for the rolling-mean
+RSI). `update(close)` folds in one bar and returns the indicator values for it,
+the same numbers `indicators.compute_indicators` gives for that row of the full
+history, NaN gaps included.
+
+The state is a couple of small arrays and round-trips through `to_dict`/`from_dict`
+(plain floats and lists, JSON and Firestore friendly), so it can be persisted
+between invocations instead of recomputing the history on every intraday bar.
+"""
+import math
+from array import array
+
+from indicators import INDICATOR_COLUMNS, RSI_EWM, RSI_PERIOD, RSI_SMA
+
+STATE_VERSION = 1
+
+_LONG = 50   # longest rolling window (SMA_50); the close ring buffer size
+_SHORT = 20  # SMA_20 and Bollinger window
+
+_NAN = float("nan")
+
+
+def _alpha(span):
+    return 2.0 / (span + 1.0)
+
+
+def _ewm_step(weighted, old_wt, x, alpha):
+    """
+    One row of pandas `ewm(adjust=False)` with gaps: the old weight keeps
+    decaying through missing rows and is renormalized on the next observation.
+    """
+    beta = 1.0 - alpha
+    if weighted != weighted:  # not started yet
+        return (x, old_wt) if x == x else (weighted, old_wt)
+    old_wt *= beta
+    if x != x:
+        return weighted, old_wt
+    return (old_wt * weighted + alpha * x) / (old_wt + alpha), 1.0
+
+
+def _ratio_rsi(avg_gain, avg_loss):
+    # Same as 100 - 100 / (1 + gain / loss) under NumPy's float semantics.
+    if avg_gain != avg_gain or avg_loss != avg_loss:
+        return _NAN
+    if avg_loss == 0.0:
+        return _NAN if avg_gain == 0.0 else 100.0
+    return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+class IndicatorState:
+    __slots__ = (
+        "rsi", "partial_windows", "bars", "prev_close", "offset",
+        "closes", "sum_20", "sq_20", "n_20", "sum_50", "n_50",
+        "gains", "losses", "sum_gain", "sum_loss",
+        "ema_12", "wt_12", "ema_26", "wt_26", "signal", "wt_signal",
+        "avg_gain", "wt_gain", "avg_loss", "wt_loss",
+    )
+
+    def __init__(self, rsi=RSI_EWM, partial_windows=True):
+        if rsi not in (RSI_SMA, RSI_EWM):
+            raise ValueError(f"Unknown RSI variant: {rsi!r}")
+        self.rsi = rsi
+        self.partial_windows = partial_windows
+        self.bars = 0
+        self.prev_close = _NAN
+        # Sums are kept relative to the first observed close, which keeps the
+        # squared sums well conditioned (the batch engine centers the same way).
+        self.offset = _NAN
+        self.closes = array("d", [_NAN] * _LONG)
+        self.sum_20 = self.sq_20 = self.sum_50 = 0.0
+        self.n_20 = self.n_50 = 0
+        self.gains = array("d", [0.0] * RSI_PERIOD)
+        self.losses = array("d", [0.0] * RSI_PERIOD)
+        self.sum_gain = self.sum_loss = 0.0
+        self.ema_12 = self.ema_26 = self.signal = _NAN
+        self.wt_12 = self.wt_26 = self.wt_signal = 1.0
+        self.avg_gain = self.avg_loss = _NAN
+        self.wt_gain = self.wt_loss = 1.0
+
+    @classmethod
+    def from_history(cls, closes, rsi=RSI_EWM, partial_windows=True):
+        """State after feeding `closes` (oldest first), e.g. the stored daily history."""
+        state = cls(rsi, partial_windows)
+        for close in closes:
+            state.update(close)
+        return state
+
+    def _resync(self):
+        # Rebuild the running sums from the ring once per lap, so the
+        # add/subtract rounding error cannot build up over long sessions.
+        self.sum_20 = self.sq_20 = self.sum_50 = 0.0
+        self.n_20 = self.n_50 = 0
+        pos = self.bars % _LONG
+        for k in range(_LONG):
+            v = self.closes[(pos - 1 - k) % _LONG]
+            if v != v:
+                continue
+            v -= self.offset
+            self.sum_50 += v
+            self.n_50 += 1
+            if k < _SHORT:
+                self.sum_20 += v
+                self.sq_20 += v * v
+                self.n_20 += 1
+        if self.rsi == RSI_SMA:
+            self.sum_gain = math.fsum(self.gains)
+            self.sum_loss = math.fsum(self.losses)
+
+    def update(self, close):
+        """Fold in the next bar's close (NaN for a missing bar) and return its indicator values."""
+        close = float(close)
+        if self.offset != self.offset and close == close:
+            self.offset = close
+        pos = self.bars % _LONG
+
+        # Rolling windows: drop what leaves each window, add the new close.
+        leaving_50 = self.closes[pos]
+        leaving_20 = self.closes[(pos - _SHORT) % _LONG]
+        if leaving_50 == leaving_50:
+            self.sum_50 -= leaving_50 - self.offset
+            self.n_50 -= 1
+        if leaving_20 == leaving_20:
+            v = leaving_20 - self.offset
+            self.sum_20 -= v
+            self.sq_20 -= v * v
+            self.n_20 -= 1
+        self.closes[pos] = close
+        if close == close:
+            v = close - self.offset
+            self.sum_50 += v
+            self.n_50 += 1
+            self.sum_20 += v
+            self.sq_20 += v * v
+            self.n_20 += 1
+
+        # RSI: a missing delta counts as neither gain nor loss.
+        delta = close - self.prev_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        self.prev_close = close
+        if self.rsi == RSI_SMA:
+            slot = self.bars % RSI_PERIOD
+            self.sum_gain += gain - self.gains[slot]
+            self.sum_loss += loss - self.losses[slot]
+            self.gains[slot] = gain
+            self.losses[slot] = loss
+        else:
+            alpha = _alpha(RSI_PERIOD)
+            self.avg_gain, self.wt_gain = _ewm_step(self.avg_gain, self.wt_gain, gain, alpha)
+            self.avg_loss, self.wt_loss = _ewm_step(self.avg_loss, self.wt_loss, loss, alpha)
+
+        # MACD and its signal line.
+        self.ema_12, self.wt_12 = _ewm_step(self.ema_12, self.wt_12, close, _alpha(12))
+        self.ema_26, self.wt_26 = _ewm_step(self.ema_26, self.wt_26, close, _alpha(26))
+        self.signal, self.wt_signal = _ewm_step(self.signal, self.wt_signal,
+                                                self.ema_12 - self.ema_26, _alpha(9))
+
+        self.bars += 1
+        if self.bars % _LONG == 0:
+            self._resync()
+        return self.values()
+
+    def values(self):
+        """Indicator values as of the last bar, keyed like `INDICATOR_COLUMNS`."""
+        min_20 = 1 if self.partial_windows else _SHORT
+        min_50 = 1 if self.partial_windows else _LONG
+
+        sma_20 = std_20 = sma_50 = _NAN
+        if self.n_20 >= min_20 and self.n_20 > 0:
+            sma_20 = self.sum_20 / self.n_20 + self.offset
+            if self.n_20 >= 2:
+                var = (self.sq_20 - self.sum_20 * self.sum_20 / self.n_20) / (self.n_20 - 1)
+                std_20 = math.sqrt(max(var, 0.0))
+        if self.n_50 >= min_50 and self.n_50 > 0:
+            sma_50 = self.sum_50 / self.n_50 + self.offset
+
+        if self.bars < RSI_PERIOD:
+            rsi = _NAN
+        elif self.rsi == RSI_SMA:
+            rsi = _ratio_rsi(self.sum_gain / RSI_PERIOD, self.sum_loss / RSI_PERIOD)
+        else:
+            rsi = _ratio_rsi(self.avg_gain, self.avg_loss)
+
+        macd = self.ema_12 - self.ema_26
+        return {
+            "SMA_20": sma_20,
+            "SMA_50": sma_50,
+            "RSI": rsi,
+            "BB_upper": sma_20 + 2 * std_20,
+            "BB_lower": sma_20 - 2 * std_20,
+            "MACD": macd,
+            "Signal": self.signal,
+            "MACD_Hist": macd - self.signal,
+        }
+
+    def to_dict(self):
+        """Plain-data snapshot; NaN is stored as None so it survives strict JSON."""
+        def clean(v):
+            return None if isinstance(v, float) and v != v else v
+
+        out = {"version": STATE_VERSION}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            out[name] = [clean(v) for v in value] if isinstance(value, array) else clean(value)
+        return out
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported indicator state version: {data.get('version')!r}")
+        state = cls(data["rsi"], data["partial_windows"])
+        for name in cls.__slots__:
+            value = data[name]
+            current = getattr(state, name)
+            if isinstance(current, array):
+                value = array("d", (_NAN if v is None else v for v in value))
+            elif isinstance(current, float):
+                value = _NAN if value is None else float(value)
+            setattr(state, name, value)
+        return state
+
+
+if __name__ == "__main__":
+    # Parity with the batch engine and per-bar cost against recomputing the history:
+    #   python indicator_state.py --days 5040
+    import argparse
+    import json
+    import time
+
+    import numpy as np
+    import pandas as pd
+    from indicators import compute_indicators, _pandas_indicators
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[504, 5040])
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for n_days in args.days:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_days)))
+        gappy = close.copy()
+        gappy[rng.random(n_days) < 0.03] = np.nan
+        gappy[:7] = np.nan
+
+        # Parity: every row of the stream against the batch engine and the old pandas code,
+        # with a save/restore through JSON halfway.
+        worst = 0.0
+        for series in (close, gappy):
+            for rsi in (RSI_SMA, RSI_EWM):
+                for partial in (True, False):
+                    batch = compute_indicators(series, rsi, partial)
+                    ref = _pandas_indicators(pd.DataFrame({"Close": series}), rsi, partial)
+                    state = IndicatorState(rsi, partial)
+                    for i, c in enumerate(series):
+                        if i == n_days // 2:
+                            state = IndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+                        row = state.update(c)
+                        for name in INDICATOR_COLUMNS:
+                            for expected in (batch[name][i], ref[name].iat[i]):
+                                got = row[name]
+                                if math.isnan(got) or math.isnan(expected):
+                                    assert math.isnan(got) and math.isnan(expected), (rsi, partial, name, i, got, expected)
+                                    continue
+                                worst = max(worst, abs(got - expected) / max(1.0, abs(expected)))
+        assert worst < args.tolerance, worst
+
+        # Cost of one new bar: streaming update vs recomputing the full history.
+        state = IndicatorState.from_history(close)
+        start = time.perf_counter()
+        for _ in range(1000):
+            state.update(close[-1])
+        stream_us = (time.perf_counter() - start) * 1e3
+        start = time.perf_counter()
+        for _ in range(20):
+            compute_indicators(close)
+        batch_us = (time.perf_counter() - start) / 20 * 1e6
+        size = len(json.dumps(state.to_dict()))
+        print(f"{n_days:>6} bars  max rel diff {worst:.1e}  update {stream_us:7.1f} us/bar  "
+              f"batch recompute {batch_us:9.1f} us  state {size} bytes JSON")
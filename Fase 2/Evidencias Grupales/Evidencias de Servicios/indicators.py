@@ -0,0 +1,264 @@
+# indicators.py
+"""
+Vectorized technical indicators over a dates x tickers close matrix.
+
+This is the single implementation of SMA_20/SMA_50, RSI, Bollinger Bands and
+MACD used by the scheduler, the HTTP handler and MAYF. Everything is computed
+in one pass over a 2-D NumPy array (one column per ticker): each rolling
+sum/count is built once and shared by the SMA and the Bollinger std, and the
+EWMs go through pandas' compiled `ewm(adjust=False)`, one call per indicator
+for all tickers. Results match the pandas `rolling`/`ewm` formulas the
+notebooks and handlers used, including NaN gaps.
+
+The RSI variant is explicit: `RSI_SMA` averages gains/losses with a 14-day
+rolling mean (MAYF, SMDA), `RSI_EWM` with a 14-span EWM (BackEndYf).
+"""
+import warnings
+
+import numpy as np
+
+RSI_SMA = "sma"
+RSI_EWM = "ewm"
+
+RSI_PERIOD = 14
+INDICATOR_COLUMNS = ["SMA_20", "SMA_50", "RSI", "BB_upper", "BB_lower", "MACD", "Signal", "MACD_Hist"]
+
+DEFAULT_BLOCK = 1024  # tickers per block, bounds the size of the temporaries
+
+
+class _RollingSums:
+    """
+    Cumulative sums of one input, from which any window's rolling mean and
+    sample std are read in O(1) per cell. NaNs are skipped like pandas does.
+    With `center`, values are shifted by each column's mean first so the
+    squared sums stay well conditioned over long price histories.
+    """
+
+    def __init__(self, x, center=False):
+        valid = ~np.isnan(x)
+        self.offset = np.zeros(x.shape[1])
+        if center and valid.any():
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns
+                self.offset = np.nan_to_num(np.nanmean(x, axis=0))
+        self.v = np.where(valid, x - self.offset, 0.0)
+        self.count = np.cumsum(valid, axis=0, dtype=np.float64)
+        self.sum = np.cumsum(self.v, axis=0)
+        self._sum2 = None
+
+    @staticmethod
+    def _window(c, window):
+        out = c.copy()
+        out[window:] -= c[:-window]
+        return out
+
+    def mean(self, window, min_periods):
+        count = self._window(self.count, window)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count >= max(min_periods, 1),
+                            self._window(self.sum, window) / count + self.offset, np.nan)
+
+    def std(self, window, min_periods):
+        if self._sum2 is None:
+            self._sum2 = np.cumsum(self.v * self.v, axis=0)
+        count = self._window(self.count, window)
+        s = self._window(self.sum, window)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (self._window(self._sum2, window) - s * s / count) / (count - 1)
+            return np.where((count >= max(min_periods, 1)) & (count >= 2),
+                            np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+
+def _ewm(x, span, min_periods=0):
+    """pandas `ewm(span=span, adjust=False).mean()` down axis 0, for every column at once."""
+    import pandas as pd
+
+    # pandas runs the recursion in Cython, column by column, and treats NaN
+    # gaps the same way the handlers saw them (decay through, renormalize).
+    return pd.DataFrame(x, copy=False).ewm(span=span, adjust=False, min_periods=min_periods).mean().to_numpy()
+
+
+def _compute_block(close, rsi, partial_windows):
+    min_20 = 1 if partial_windows else 20
+    min_50 = 1 if partial_windows else 50
+
+    # One set of cumulative sums serves SMA_20, SMA_50 and the Bollinger std.
+    sums = _RollingSums(close, center=True)
+    sma_20 = sums.mean(20, min_20)
+    std_20 = sums.std(20, min_20)
+    sma_50 = sums.mean(50, min_50)
+
+    delta = np.empty_like(close)
+    delta[0] = np.nan
+    delta[1:] = close[1:] - close[:-1]
+    # Same as pandas `delta.where(delta > 0, 0)`: NaN deltas count as 0.
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    if rsi == RSI_SMA:
+        avg_gain = _RollingSums(gain).mean(RSI_PERIOD, RSI_PERIOD)
+        avg_loss = _RollingSums(loss).mean(RSI_PERIOD, RSI_PERIOD)
+    else:
+        avg_gain = _ewm(gain, RSI_PERIOD, RSI_PERIOD)
+        avg_loss = _ewm(loss, RSI_PERIOD, RSI_PERIOD)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsi_values = 100 - (100 / (1 + avg_gain / avg_loss))
+
+    macd = _ewm(close, 12) - _ewm(close, 26)
+    signal = _ewm(macd, 9)
+
+    return {
+        "SMA_20": sma_20,
+        "SMA_50": sma_50,
+        "RSI": rsi_values,
+        "BB_upper": sma_20 + 2 * std_20,
+        "BB_lower": sma_20 - 2 * std_20,
+        "MACD": macd,
+        "Signal": signal,
+        "MACD_Hist": macd - signal,
+    }
+
+
+def compute_indicators(close, rsi=RSI_EWM, partial_windows=True,
+                       dtype=np.float64, block=DEFAULT_BLOCK):
+    """
+    Compute `INDICATOR_COLUMNS` for a close array of shape (dates,) or
+    (dates, tickers). Returns a dict of arrays with the same shape.
+
+    `partial_windows=True` lets SMA/Bollinger start from the first row
+    (`min_periods=1`, as the HTTP handler did); False waits for full windows
+    (as MAYF did). `dtype` sets the output precision; the maths runs in
+    float64 on blocks of `block` tickers.
+    """
+    if rsi not in (RSI_SMA, RSI_EWM):
+        raise ValueError(f"Unknown RSI variant: {rsi!r}")
+
+    close = np.asarray(close, dtype=np.float64)
+    one_d = close.ndim == 1
+    if one_d:
+        close = close[:, None]
+
+    out = {name: np.empty(close.shape, dtype=dtype) for name in INDICATOR_COLUMNS}
+    if close.shape[0] > 0:
+        for lo in range(0, close.shape[1], block):
+            values = _compute_block(close[:, lo:lo + block], rsi, partial_windows)
+            for name in INDICATOR_COLUMNS:
+                out[name][:, lo:lo + block] = values[name]
+
+    if one_d:
+        out = {name: arr[:, 0] for name, arr in out.items()}
+    return out
+
+
+def add_indicators(df, rsi=RSI_EWM, partial_windows=True):
+    """Add the indicator columns to a single-ticker OHLCV DataFrame and return it."""
+    values = compute_indicators(df["Close"].to_numpy(dtype=np.float64), rsi, partial_windows)
+    for name in INDICATOR_COLUMNS:
+        df[name] = values[name]
+    return df
+
+
+def panel_indicators(closes, rsi=RSI_EWM, partial_windows=True, dtype=np.float64):
+    """
+    Indicators for a dates x tickers close DataFrame, computed in one pass.
+    Returns a dict of indicator name -> DataFrame with the same labels.
+    """
+    import pandas as pd
+
+    values = compute_indicators(closes.to_numpy(dtype=np.float64), rsi, partial_windows, dtype)
+    return {
+        name: pd.DataFrame(arr, index=closes.index, columns=closes.columns)
+        for name, arr in values.items()
+    }
+
+
+def indicators_by_index(closes, rsi=RSI_EWM, partial_windows=True, dtype=np.float64):
+    """
+    Indicators for several tickers, each over its own trading dates.
+    `closes` maps ticker -> Close Series; tickers with identical indexes
+    (usually most of them) share one vectorized pass, so no ticker's windows
+    count rows that only other tickers traded. Returns ticker -> DataFrame
+    of `INDICATOR_COLUMNS` on that ticker's index.
+    """
+    import pandas as pd
+
+    groups = {}
+    for t, close in closes.items():
+        groups.setdefault((len(close.index), close.index.values.tobytes()), []).append(t)
+    out = {}
+    for group in groups.values():
+        index = closes[group[0]].index
+        close = np.column_stack([closes[t].to_numpy(dtype=np.float64) for t in group])
+        values = compute_indicators(close, rsi, partial_windows, dtype)
+        for j, t in enumerate(group):
+            out[t] = pd.DataFrame({name: values[name][:, j] for name in INDICATOR_COLUMNS}, index=index)
+    return out
+
+
+def _pandas_indicators(df, rsi=RSI_EWM, partial_windows=True):
+    """The former per-ticker pandas implementation, kept as the benchmark and parity reference."""
+    min_20 = 1 if partial_windows else None
+    min_50 = 1 if partial_windows else None
+    df["SMA_20"] = df["Close"].rolling(window=20, min_periods=min_20).mean()
+    df["SMA_50"] = df["Close"].rolling(window=50, min_periods=min_50).mean()
+
+    delta = df["Close"].diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    if rsi == RSI_SMA:
+        avg_gain = gain.rolling(RSI_PERIOD).mean()
+        avg_loss = loss.rolling(RSI_PERIOD).mean()
+    else:
+        avg_gain = gain.ewm(span=RSI_PERIOD, adjust=False, min_periods=RSI_PERIOD).mean()
+        avg_loss = loss.ewm(span=RSI_PERIOD, adjust=False, min_periods=RSI_PERIOD).mean()
+    df["RSI"] = 100 - (100 / (1 + avg_gain / avg_loss))
+
+    rolling_mean_20 = df["Close"].rolling(window=20, min_periods=min_20).mean()
+    rolling_std_20 = df["Close"].rolling(window=20, min_periods=min_20).std()
+    df["BB_upper"] = rolling_mean_20 + (2 * rolling_std_20)
+    df["BB_lower"] = rolling_mean_20 - (2 * rolling_std_20)
+
+    ema_12 = df["Close"].ewm(span=12, adjust=False, min_periods=1).mean()
+    ema_26 = df["Close"].ewm(span=26, adjust=False, min_periods=1).mean()
+    df["MACD"] = ema_12 - ema_26
+    df["Signal"] = df["MACD"].ewm(span=9, adjust=False, min_periods=1).mean()
+    df["MACD_Hist"] = df["MACD"] - df["Signal"]
+    return df
+
+
+if __name__ == "__main__":
+    # Universe-scale timing against the per-ticker pandas loop:
+    #   python indicators.py --shapes 43x504 5000x5040
+    import argparse
+    import time
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shapes", nargs="+", default=["43x504", "5000x5040"],
+                        help="TICKERSxDAYS")
+    parser.add_argument("--rsi", choices=[RSI_SMA, RSI_EWM], default=RSI_EWM)
+    parser.add_argument("--pandas-limit", type=int, default=500,
+                        help="time the pandas loop on at most this many tickers and extrapolate")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for shape in args.shapes:
+        n_tickers, n_days = (int(v) for v in shape.split("x"))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, n_tickers)), axis=0))
+        close[rng.random(close.shape) < 0.01] = np.nan  # illiquid gaps
+
+        start = time.perf_counter()
+        out = compute_indicators(close, rsi=args.rsi, dtype=np.float32)
+        engine_s = time.perf_counter() - start
+
+        sample = min(n_tickers, args.pandas_limit)
+        index = pd.bdate_range(end="2025-01-01", periods=n_days)
+        start = time.perf_counter()
+        for j in range(sample):
+            _pandas_indicators(pd.DataFrame({"Close": close[:, j]}, index=index), rsi=args.rsi)
+        pandas_s = (time.perf_counter() - start) * n_tickers / sample
+
+        mb = sum(a.nbytes for a in out.values()) / 2**20
+        note = "" if sample == n_tickers else f" (extrapolated from {sample})"
+        print(f"{shape:>10}  engine {engine_s:8.3f}s  pandas loop {pandas_s:8.3f}s{note}  "
+              f"speedup x{pandas_s / engine_s:.1f}  output {mb:.0f} MiB float32")
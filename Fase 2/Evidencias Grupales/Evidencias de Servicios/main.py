@@ -1,101 +1,101 @@
 # main.py
 import os
-import firebase_admin
-from firebase_admin import firestore
-from firebase_functions import scheduler_fn, https_fn
+from firebase_functions import https_fn
 from firebase_functions.options import set_global_options
 
-# Initialize Firebase Admin SDK once globally.
-firebase_admin.initialize_app()
-
-# Lazily initialize Firestore client
-_firestore_client = None
-def get_firestore_client():
-    global _firestore_client
-    if _firestore_client is None:
-        _firestore_client = firestore.client()
-    return _firestore_client
-
-TICKERS_CL = [
-    "ENELCHILE.SN", "ENELAM.SN", "CHILE.SN", "BSANTANDER.SN", "COPEC.SN",
-    "CENCOSUD.SN", "FALABELLA.SN", "PARAUCO.SN", "CMPC.SN", "AGUAS-A.SN",
-    "AGUAS-C.SN", "CAP.SN", "CCU.SN", "VAPORES.SN", "BCI.SN", "ANDINA-B.SN",
-    "ANDINA-A.SN", "IAM.SN", "SQM-A.SN", "SQM-B.SN", "ITAUCORP.SN",
-    "ENTEL.SN", "SECURITY.SN", "COLBUN.SN", "ECL.SN", "AESGENER.SN",
-    "FORUS.SN", "SALFACORP.SN", "VINA.SN", "HF.SN", "LTM.SN", "PAZ.SN",
-    "ILC.SN", "CGE.SN", "SMU.SN", "VSPT.SN", "BESALCO.SN", "MELON.SN",
-    "BLUMAR.SN", "NEXO.SN", "NAVIERA.SN", "MADECO.SN", "MULTIFOODS.SN"
-]
-
-@scheduler_fn.on_schedule(
-    schedule="0 0 * * *", # Runs daily at midnight UTC
-    region="us-central1", # Match your deployment region
-    timeout_sec=540,      # Max 9 minutes (540 seconds) for event-driven functions
-    memory=2048           # 2GB of memory, adjust as needed
-)
-def update_market_metrics_scheduled(event: scheduler_fn.ScheduledEvent):
-    import yfinance as yf
-    import numpy as np
-
-    print(f"Scheduled function triggered at {event.schedule_time}")
-    results = []
-    db_client = get_firestore_client()
-
-    for t in TICKERS_CL:
-        try:
-            df = yf.download(t, period="2y", interval="1d", progress=False)
-            if df.empty:
-                print(f"No data found for {t}. Skipping.")
-                continue
-
-            df["Return"] = df["Close"].pct_change()
-            mean_daily = df["Return"].mean()
-            vol_daily = df["Return"].std()
-
-            annual_return = mean_daily * 252
-            annual_vol = vol_daily * np.sqrt(252)
-            sharpe_ratio = annual_return / annual_vol if annual_vol > 0 else np.nan
-
-            info = yf.Ticker(t).info
-            data = {
-                "Ticker": t,
-                "Company": info.get("longName"),
-                "Sector": info.get("sector"),
-                "MarketCap": info.get("marketCap"),
-                "PE": info.get("trailingPE"),
-                "PB": info.get("priceToBook"),
-                "ROE": info.get("returnOnEquity"),
-                "DebtToEquity": info.get("debtToEquity"),
-                "DividendYield": info.get("dividendYield"),
-                "AnnualReturn": annual_return,
-                "AnnualVolatility": annual_vol,
-                "SharpeRatio": sharpe_ratio,
-                "Timestamp": firestore.SERVER_TIMESTAMP
-            }
+# Firebase, Firestore and the heavy libraries (numpy, pandas, yfinance) are
+# imported on first use, so a new instance only pays for what its first
+# request needs. `python cold_start.py` measures this per entry point.
+
+# The nightly pipeline (scheduler, shard tasks, correlations, fundamentals)
+# lives in pipeline.py; importing its functions here is what deploys them.
+from pipeline import get_firestore_client
+from pipeline import update_market_metrics_scheduled, refresh_market_shard, refresh_fundamentals_scheduled
+
+# Lazily initialize the per-instance history cache
+_history_cache = None
+def get_history_cache():
+    global _history_cache
+    if _history_cache is None:
+        from market_fetch import YahooProvider
+        from range_cache import RangeCache
+        from indicators import add_indicators
+        _history_cache = RangeCache(YahooProvider().history, compute=add_indicators)
+    return _history_cache
 
-            db_client.collection("TK").document(t).set(data)
-            results.append(data)
+# Lazily initialize the handler logger (level and sampling from the environment)
+_logger = None
+def get_logger():
+    global _logger
+    if _logger is None:
+        from sampled_log import get_logger as make_logger
+        _logger = make_logger("minerva.http")
+    return _logger
 
-            print(f"Saved: {t}")
+# Lazily load the LSTM-S.tflite interpreter and its input window cache, once per instance
+_predictor = None
+_window_cache = None
+def get_predictor():
+    global _predictor, _window_cache
+    if _predictor is None:
+        from prediction import LSTMPredictor, WindowCache
+        from price_store import PriceStore
+        _window_cache = WindowCache(PriceStore())
+        _predictor = LSTMPredictor.from_file()
+    return _predictor, _window_cache
 
-        except Exception as e:
-            print(f"Error on {t}: {e}")
+# Optional warm-up while the instance starts, e.g. MINERVA_WARMUP=numpy,pandas,yfinance,firestore
+if os.environ.get("MINERVA_WARMUP"):
+    from cold_start import warm_up
+    warm_up(os.environ["MINERVA_WARMUP"].split(","), {"firestore": get_firestore_client})
 
-    print(f"Finished processing. Total tickers updated: {len(results)}")
 
 @https_fn.on_request()
 def get_historical_data_with_indicators(req: https_fn.Request):
-    import yfinance as yf
+    """
+    Historical OHLCV with technical indicators for one ticker.
+
+    Expects {"data": {"ticker", "startDate", "endDate"}}. The default response
+    is one record per row; `"format": "columnar"` returns one array per column
+    instead (see columnar_json), with optional `"dateFormat": "epoch"` and
+    `"precision": <decimals>`, gzip-compressed when the client accepts it.
+
+    With `"tickers": [...]` instead of `"ticker"`, the ones the range cache
+    does not cover come from one bulk download with one vectorized indicator
+    pass (see batch_history), and the answer is {"results": {ticker: ...}, "errors": {ticker: {"error", "code"}}}.
+
+    Stage times go back in a Server-Timing header and, with the counters,
+    into one structured log line per request (see instrumentation.py);
+    `"profile": true` adds a cProfile of the request to that line.
+    """
+    from instrumentation import start_invocation
+
+    request_json = req.get_json(silent=True)
+    data = request_json.get("data") if isinstance(request_json, dict) else None
+    inv = start_invocation("get_historical_data_with_indicators",
+                           profile=isinstance(data, dict) and data.get("profile") is True)
+    response = _historical_data(req, inv)
+    timing = inv.server_timing()
+    if timing:
+        response.headers["Server-Timing"] = timing
+    ticker = data.get("ticker") if isinstance(data, dict) else None
+    inv.finish(status=response.status_code, ticker=ticker)
+    return response
+
+def _historical_data(req, inv):
+    """get_historical_data_with_indicators, timed and counted in `inv`."""
+    import json
     import pandas as pd
-    import math
 
+    log = get_logger()
     try:
         # Parse JSON body
         request_json = req.get_json(silent=True)
-        print(f"DEBUG: Request JSON received: {request_json}") 
-        
+        sampled = log.sampled()
+        log.payload(sampled, "Request JSON received", lambda: request_json)
+
         if not request_json or 'data' not in request_json:
-            print("DEBUG: Invalid request format - 'data' field missing.") 
+            log.debug("Invalid request format - 'data' field missing.")
             return https_fn.Response(
                 {
                     "error": "Invalid request format. Missing 'data' field.",
@@ -107,12 +107,29 @@ def get_historical_data_with_indicators(req: https_fn.Request):
 
         data = request_json['data']
         ticker_symbol = data.get('ticker')
+        ticker_list = data.get('tickers')
         start_date = data.get('startDate')
         end_date = data.get('endDate')
-        print(f"DEBUG: Ticker: {ticker_symbol}, Start: {start_date}, End: {end_date}") 
+        response_format = data.get('format', 'records')
+        log.debug("Ticker: %s, Start: %s, End: %s, Format: %s", ticker_symbol, start_date, end_date, response_format)
+
+        if ticker_list is not None:
+            from batch_history import MAX_BATCH_TICKERS
+            if (not isinstance(ticker_list, list) or not 0 < len(ticker_list) <= MAX_BATCH_TICKERS
+                    or not all(isinstance(t, str) and t for t in ticker_list)):
+                log.debug("Invalid tickers list.")
+                return https_fn.Response(
+                    {
+                        "error": f"tickers must be a list of 1 to {MAX_BATCH_TICKERS} ticker symbols.",
+                        "code": "invalid-argument"
+                    },
+                    status=400,
+                    content_type="application/json"
+                )
+            ticker_symbol = ticker_list[0]
 
         if not all([ticker_symbol, start_date, end_date]):
-            print("DEBUG: Missing ticker, startDate, or endDate parameters.") 
+            log.debug("Missing ticker, startDate, or endDate parameters.")
             return https_fn.Response(
                 {
                     "error": "Missing ticker, startDate, or endDate parameters.",
@@ -122,13 +139,35 @@ def get_historical_data_with_indicators(req: https_fn.Request):
                 content_type="application/json"
             )
 
-        # Fetch data
-        ticker = yf.Ticker(ticker_symbol)
-        df = ticker.history(start=start_date, end=end_date)
-        print(f"DEBUG: DataFrame fetched. Is empty: {df.empty}, Shape: {df.shape}") 
+        date_format = data.get('dateFormat', 'iso')
+        precision = data.get('precision')
+        if (response_format not in ("records", "columnar") or date_format not in ("iso", "epoch")
+                or not (precision is None or (isinstance(precision, int) and 0 <= precision <= 15))):
+            log.debug("Invalid format, dateFormat or precision.")
+            return https_fn.Response(
+                {
+                    "error": "format must be 'records' or 'columnar', dateFormat 'iso' or 'epoch', "
+                             "and precision an integer between 0 and 15.",
+                    "code": "invalid-argument"
+                },
+                status=400,
+                content_type="application/json"
+            )
+
+        if ticker_list is not None:
+            return _batch_response(req, ticker_list, start_date, end_date,
+                                   response_format, date_format, precision, log, sampled, inv)
+
+        # Fetch data, answered from the per-instance range cache when possible
+        cache = get_history_cache()
+        with inv.span("fetch", ticker_symbol):
+            df, cache_status = cache.get(ticker_symbol, start_date, end_date)
+        inv.count(f"cache.{cache_status}")
+        inv.count("rows", len(df))
+        log.debug("DataFrame fetched (%s). Shape: %s, Cache: %s", cache_status, df.shape, cache.stats())
 
         if df.empty:
-            print(f"DEBUG: No data found for {ticker_symbol} in range.") 
+            log.debug("No data found for %s in range.", ticker_symbol)
             return https_fn.Response(
                 {
                     "error": f"No historical data found for {ticker_symbol} within the specified range.",
@@ -140,44 +179,51 @@ def get_historical_data_with_indicators(req: https_fn.Request):
 
         if isinstance(df.columns, pd.MultiIndex):
             df.columns = [col[0] if isinstance(col, tuple) else col for col in df.columns]
-            print("DEBUG: Flattened MultiIndex columns.") 
 
         # === Technical Indicators ===
-        print("DEBUG: Technical indicators calculated.") 
+        # Computed by indicators.add_indicators over the whole cached range.
+        log.payload(sampled, "DataFrame head (first 5 rows)", lambda: df.head().to_string())
+
+        if response_format == "columnar":
+            from columnar_json import encode_columnar, maybe_gzip
+            with inv.span("encode"):
+                json_output_string = encode_columnar(
+                    df, ticker_symbol, date_format=date_format, precision=precision
+                )
+                log.payload(sampled, "Columnar JSON prepared for response", lambda: json_output_string)
+                body, encoding_headers = maybe_gzip(json_output_string, req.headers.get("Accept-Encoding"))
+            inv.count("payloadBytes", len(body))
+            return https_fn.Response(
+                body,
+                status=200,
+                content_type="application/json",
+                headers={"X-Cache": cache_status, **encoding_headers}
+            )
 
         # === Clean and format output ===
-        df_cleaned = df.reset_index().fillna(value=math.nan)
-        df_cleaned['Date'] = df_cleaned['Date'].dt.strftime('%Y-%m-%d')
-        print(f"DEBUG: Cleaned DataFrame head (first 5 rows):\n{df_cleaned.head().to_string()}")
-
-        historical_data_list = df_cleaned.to_dict('records')
-        print(f"DEBUG: Type of historical_data_list: {type(historical_data_list)}") 
-        print(f"DEBUG: Length of historical_data_list: {len(historical_data_list)}") 
-        if historical_data_list:
-            print(f"DEBUG: First record in historical_data_list: {historical_data_list[0]}") 
-        else:
-            print("DEBUG: historical_data_list is empty.") 
+        with inv.span("encode"):
+            historical_data_list = _to_records(df)
+            log.debug("Records prepared: %d", len(historical_data_list))
 
-        final_response_dict = {
-            "ticker": ticker_symbol,
-            "historicalData": historical_data_list
-        }
-        print(f"DEBUG: Final dictionary object attempting to be returned:\n{final_response_dict}")
+            final_response_dict = {
+                "ticker": ticker_symbol,
+                "historicalData": historical_data_list
+            }
 
-        import json 
-        json_output_string = json.dumps(final_response_dict)
-        print(f"DEBUG: JSON string prepared for response (first 500 chars):\n{json_output_string[:500]}...")
+            json_output_string = json.dumps(final_response_dict)
+        inv.count("payloadBytes", len(json_output_string))
+        log.payload(sampled, "JSON string prepared for response", lambda: json_output_string)
 
         return https_fn.Response(
             json_output_string, 
             status=200,
-            content_type="application/json"
+            content_type="application/json",
+            headers={"X-Cache": cache_status}
         )
 
     except Exception as e:
-        print(f"ERROR: An unexpected exception occurred: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("An unexpected exception occurred: %s", e)
+        inv.error(e)
 
         error_response = {
             "error": f"Failed to fetch or process historical data: {str(e)}",
@@ -187,4 +233,144 @@ def get_historical_data_with_indicators(req: https_fn.Request):
             json.dumps(error_response),
             status=500,
             content_type="application/json"
-        )
\ No newline at end of file
+        )
+
+@https_fn.on_request()
+def predict_next_close(req: https_fn.Request):
+    """
+    Next daily close predicted by the LSTM model (LSTM-S.tflite).
+
+    Expects {"data": {"ticker"}} or {"data": {"tickers": [...]}}; all tickers
+    run through the model in one batched invoke (see prediction). Answers
+    {"predictions": {ticker: {"predictedClose", "asOf"}}, "errors": {ticker: {"error", "code"}}}.
+    With `"steps": N` each prediction also has "forecast", the next N closes
+    rolled out for all tickers at once.
+    """
+    import json
+
+    log = get_logger()
+    try:
+        request_json = req.get_json(silent=True)
+        sampled = log.sampled()
+        log.payload(sampled, "Request JSON received", lambda: request_json)
+
+        if not request_json or 'data' not in request_json:
+            log.debug("Invalid request format - 'data' field missing.")
+            return https_fn.Response(
+                {
+                    "error": "Invalid request format. Missing 'data' field.",
+                    "code": "invalid-argument"
+                },
+                status=400,
+                content_type="application/json"
+            )
+
+        from prediction import MAX_BATCH, MAX_STEPS, predict_tickers
+        data = request_json['data']
+        tickers = data.get('tickers')
+        if tickers is None and data.get('ticker'):
+            tickers = [data['ticker']]
+        if (not isinstance(tickers, list) or not 0 < len(tickers) <= MAX_BATCH
+                or not all(isinstance(t, str) and t for t in tickers)):
+            log.debug("Missing or invalid ticker/tickers.")
+            return https_fn.Response(
+                {
+                    "error": f"Expected a ticker, or tickers as a list of 1 to {MAX_BATCH} ticker symbols.",
+                    "code": "invalid-argument"
+                },
+                status=400,
+                content_type="application/json"
+            )
+
+        steps = data.get('steps', 1)
+        if not (isinstance(steps, int) and 0 < steps <= MAX_STEPS):
+            log.debug("Invalid steps.")
+            return https_fn.Response(
+                {
+                    "error": f"steps must be an integer between 1 and {MAX_STEPS}.",
+                    "code": "invalid-argument"
+                },
+                status=400,
+                content_type="application/json"
+            )
+
+        predictor, window_cache = get_predictor()
+        predictions, failed = predict_tickers(tickers, predictor, window_cache, steps=steps)
+        log.debug("Predicted %d tickers, %d errors. Window cache hits=%d misses=%d",
+                  len(predictions), len(failed), window_cache.hits, window_cache.misses)
+        errors = {t: {"error": message, "code": code} for t, (code, message) in failed.items()}
+
+        if predictions:
+            status = 200
+        elif all(e["code"] == "not-found" for e in errors.values()):
+            status = 404
+        else:
+            status = 500
+        json_output_string = json.dumps({"predictions": predictions, "errors": errors})
+        log.payload(sampled, "JSON string prepared for response", lambda: json_output_string)
+        return https_fn.Response(json_output_string, status=status, content_type="application/json")
+
+    except Exception as e:
+        log.exception("An unexpected exception occurred: %s", e)
+        return https_fn.Response(
+            json.dumps({"error": f"Failed to predict: {str(e)}", "code": "internal"}),
+            status=500,
+            content_type="application/json"
+        )
+
+
+def _to_records(df):
+    """One dict per row, with the Date index as a 'YYYY-MM-DD' string."""
+    import math
+    df_cleaned = df.reset_index().fillna(value=math.nan)
+    df_cleaned['Date'] = df_cleaned['Date'].dt.strftime('%Y-%m-%d')
+    return df_cleaned.to_dict('records')
+
+def _batch_response(req, tickers, start_date, end_date, response_format, date_format, precision, log, sampled, inv):
+    """Multi-ticker branch of get_historical_data_with_indicators."""
+    import json
+    from batch_history import fetch_batch
+    from market_fetch import YahooProvider
+
+    # One bulk download for the tickers the range cache does not cover.
+    with inv.span("fetch"):
+        batch = fetch_batch(tickers, start_date, end_date, get_history_cache(), YahooProvider())
+    for status in batch.statuses.values():
+        inv.count(f"cache.{status}")
+    log.debug("Batch of %d tickers fetched: %d ok, %d errors", len(tickers), len(batch.frames), len(batch.errors))
+    errors = {t: {"error": message, "code": code} for t, (code, message) in batch.errors.items()}
+    inv.count("rows", sum(len(df) for df in batch.frames.values()))
+    for code, _ in batch.errors.values():
+        inv.count(f"errors.{code}")
+
+    with inv.span("encode"):
+        if response_format == "columnar":
+            from columnar_json import encode_columnar
+            results = ", ".join(
+                f"{json.dumps(t)}: {encode_columnar(df, t, date_format=date_format, precision=precision)}"
+                for t, df in batch.frames.items()
+            )
+            json_output_string = f'{{"results": {{{results}}}, "errors": {json.dumps(errors)}}}'
+        else:
+            json_output_string = json.dumps({
+                "results": {t: {"historicalData": _to_records(df)} for t, df in batch.frames.items()},
+                "errors": errors,
+            })
+    log.payload(sampled, "Batch JSON prepared for response", lambda: json_output_string)
+
+    # Partial failures still answer 200; only a batch where nothing worked fails.
+    if batch.frames:
+        status = 200
+    elif all(e["code"] == "not-found" for e in errors.values()):
+        status = 404
+    else:
+        status = 500
+
+    headers = {"X-Cache": batch.cache_status()}
+    body = json_output_string
+    if response_format == "columnar":
+        from columnar_json import maybe_gzip
+        body, encoding_headers = maybe_gzip(json_output_string, req.headers.get("Accept-Encoding"))
+        headers.update(encoding_headers)
+    inv.count("payloadBytes", len(body))
+    return https_fn.Response(body, status=status, content_type="application/json", headers=headers)
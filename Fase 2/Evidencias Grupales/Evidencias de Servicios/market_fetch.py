@@ -0,0 +1,235 @@
+# market_fetch.py
+"""
+Concurrent fetch stage for the scheduled market metrics job.
+
+Daily bars for the whole universe come from a single multi-symbol download,
+and the fundamentals (`Ticker.info`) are fetched on a bounded thread pool.
+A failure on one ticker is recorded in `FetchResult.errors` and never stops
+the others.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class YahooProvider:
+    """Thin adapter over yfinance so the fetch stage can run against a stand-in."""
+
+    def download(self, tickers, period="2y", interval="1d", start=None, end=None, actions=False):
+        import yfinance as yf
+        span = {"start": start} if start else {"period": period}
+        if start and end:
+            span["end"] = end  # exclusive, as in history()
+        return yf.download(
+            list(tickers), interval=interval, actions=actions,
+            group_by="ticker", threads=True, progress=False, **span
+        )
+
+    def info(self, ticker):
+        import yfinance as yf
+        return yf.Ticker(ticker).info
+
+    def history(self, ticker, start, end):
+        import yfinance as yf
+        return yf.Ticker(ticker).history(start=start, end=end)
+
+
+@dataclass
+class FetchResult:
+    histories: dict = field(default_factory=dict)  # ticker -> flat OHLCV DataFrame
+    infos: dict = field(default_factory=dict)      # ticker -> Ticker.info dict
+    errors: dict = field(default_factory=dict)     # ticker -> exception
+
+
+def split_bulk_download(df, tickers):
+    """
+    Split a multi-symbol download into one flat OHLCV DataFrame per ticker.
+    Symbols with no rows at all are left out.
+    """
+    import pandas as pd
+
+    frames = {}
+    if df is None or df.empty:
+        return frames
+
+    if not isinstance(df.columns, pd.MultiIndex):
+        # A single symbol may come back with flat columns.
+        if len(tickers) == 1:
+            flat = df.dropna(how="all")
+            if not flat.empty:
+                frames[tickers[0]] = flat
+        return frames
+
+    # group_by="ticker" puts the symbol on level 0; the default layout on level 1.
+    level = 0 if set(tickers) & set(df.columns.get_level_values(0)) else 1
+    available = set(df.columns.get_level_values(level))
+    for t in tickers:
+        if t not in available:
+            continue
+        sub = df.xs(t, axis=1, level=level).dropna(how="all")
+        if not sub.empty:
+            frames[t] = sub
+    return frames
+
+
+def fetch_histories(tickers, provider, period="2y", interval="1d", store=None):
+    """
+    Download every ticker in one request. Returns (histories, errors).
+
+    With a `price_store.PriceStore`, daily bars are fetched incrementally:
+    tickers are grouped by their last stored date, each group downloads only
+    the missing tail (one bulk request per group), the tail is appended to
+    the store and the `period` window is then read back from it. Tickers
+    whose stored history starts after the `period` window (stored by a call
+    with a shorter period) also download the missing head.
+    """
+    if store is None or interval != "1d":
+        try:
+            bulk = provider.download(tickers, period=period, interval=interval)
+        except Exception as e:
+            return {}, {t: e for t in tickers}
+        return split_bulk_download(bulk, list(tickers)), {}
+
+    from price_store import period_start
+
+    window_start = period_start(period)
+    groups = {}
+    for t in tickers:
+        last = store.last_date(t)
+        if last is None:
+            groups.setdefault(("all", None), []).append(t)
+            continue
+        covered = store.covered_from(t)
+        if covered > window_start:
+            # [window_start, covered): never requested, e.g. after a "6mo" call.
+            groups.setdefault(("head", covered), []).append(t)
+        groups.setdefault(("tail", last), []).append(t)
+
+    errors = {}
+    for (kind, date), group in groups.items():
+        group = [t for t in group if t not in errors]
+        if not group:
+            continue
+        try:
+            if kind == "all":
+                bulk = provider.download(group, period=period, interval=interval)
+            elif kind == "head":
+                bulk = provider.download(group, interval=interval, start=window_start.strftime("%Y-%m-%d"),
+                                         end=date.strftime("%Y-%m-%d"))
+            else:
+                # Start at the last stored day so a partial bar gets corrected.
+                bulk = provider.download(group, interval=interval, start=date.strftime("%Y-%m-%d"))
+        except Exception as e:
+            errors.update((t, e) for t in group)
+            continue
+        frames = split_bulk_download(bulk, group)
+        for t in group:
+            try:
+                if t in frames:
+                    store.append(t, frames[t], covered_from=None if kind == "tail" else window_start)
+                elif kind == "head":
+                    # Nothing before the stored bars: listed inside the window.
+                    store.mark_covered(t, window_start)
+            except Exception as e:
+                errors[t] = e
+
+    histories = {}
+    for t in tickers:
+        if t in errors:
+            continue
+        df = store.read(t, start=window_start)
+        if df is not None and not df.empty:
+            histories[t] = df
+    return histories, errors
+
+
+def fetch_infos(tickers, provider, max_workers=DEFAULT_MAX_WORKERS):
+    """Fetch `Ticker.info` on a bounded pool. Returns (infos, errors)."""
+    infos, errors = {}, {}
+    if not tickers:
+        return infos, errors
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {t: pool.submit(provider.info, t) for t in tickers}
+        for t, future in futures.items():
+            try:
+                infos[t] = future.result()
+            except Exception as e:
+                errors[t] = e
+    return infos, errors
+
+
+def fetch_universe(tickers, provider=None, period="2y", interval="1d",
+                   max_workers=DEFAULT_MAX_WORKERS, store=None, fundamentals=None):
+    """
+    Fetch daily bars and fundamentals for `tickers`.
+
+    Fundamentals are only requested for tickers that returned price data,
+    since the job skips the rest anyway. See `fetch_histories` for `store`.
+    With a `fundamentals.FundamentalsCache`, `infos` holds the cached fields
+    and only tickers missing from the cache, or with a field past its TTL,
+    call `Ticker.info`.
+    """
+    provider = provider or YahooProvider()
+    tickers = list(tickers)
+
+    histories, errors = fetch_histories(tickers, provider, period, interval, store)
+    priced = [t for t in tickers if t in histories]
+    if fundamentals is None:
+        infos, info_errors = fetch_infos(priced, provider, max_workers)
+    else:
+        infos, info_errors = fundamentals.infos(priced, provider, max_workers)
+    errors.update(info_errors)
+    return FetchResult(histories=histories, infos=infos, errors=errors)
+
+
+def _fetch_serial(tickers, provider, period="2y", interval="1d"):
+    """The original one-ticker-at-a-time loop, kept for benchmarking."""
+    result = FetchResult()
+    for t in tickers:
+        try:
+            frames = split_bulk_download(
+                provider.download([t], period=period, interval=interval), [t]
+            )
+            if t not in frames:
+                continue
+            result.histories[t] = frames[t]
+            result.infos[t] = provider.info(t)
+        except Exception as e:
+            result.errors[t] = e
+    return result
+
+
+if __name__ == "__main__":
+    # Offline wall-clock comparison against the fake provider:
+    #   python market_fetch.py --tickers 43 1000 --latency 0.02
+    import argparse
+    from fakes import FakeProvider, synthetic_tickers
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, nargs="+", default=[43, 1000])
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="simulated seconds per provider call")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--skip-serial", action="store_true")
+    args = parser.parse_args()
+
+    for n in args.tickers:
+        tickers = synthetic_tickers(n)
+        FakeProvider().download(tickers)  # build the synthetic frames outside the timings
+        provider = FakeProvider(latency=args.latency)
+
+        start = time.perf_counter()
+        res = fetch_universe(tickers, provider, max_workers=args.workers)
+        concurrent_s = time.perf_counter() - start
+        line = (f"{n:>6} tickers  concurrent {concurrent_s:8.2f}s  "
+                f"ok={len(res.infos)} errors={len(res.errors)}")
+
+        if not args.skip_serial:
+            start = time.perf_counter()
+            _fetch_serial(tickers, provider)
+            serial_s = time.perf_counter() - start
+            line += f"  serial {serial_s:8.2f}s  speedup x{serial_s / concurrent_s:.1f}"
+        print(line)
@@ -0,0 +1,291 @@
+# pipeline.py
+"""
+The nightly market pipeline: the scheduled functions that refresh the TK
+documents of the Chilean universe in shards, publish the correlations and
+refresh the fundamentals cache, plus the lazily created Firebase app and
+Firestore client they share with the HTTP handlers.
+
+Every deployment that runs the pipeline imports these functions into its
+`main.py`, where Firebase finds them; the pipeline itself lives only here.
+"""
+import os
+import time
+from firebase_functions import scheduler_fn, tasks_fn
+from firebase_functions.options import RateLimits, RetryConfig
+
+# Lazily initialize the Firebase Admin SDK, once per instance
+_firebase_app = None
+def get_firebase_app():
+    global _firebase_app
+    if _firebase_app is None:
+        import firebase_admin
+        _firebase_app = firebase_admin.initialize_app()
+    return _firebase_app
+
+# Lazily initialize Firestore client
+_firestore_client = None
+def get_firestore_client():
+    global _firestore_client
+    if _firestore_client is None:
+        from firebase_admin import firestore
+        _firestore_client = firestore.client(get_firebase_app())
+    return _firestore_client
+
+TICKERS_CL = [
+    "ENELCHILE.SN", "ENELAM.SN", "CHILE.SN", "BSANTANDER.SN", "COPEC.SN",
+    "CENCOSUD.SN", "FALABELLA.SN", "PARAUCO.SN", "CMPC.SN", "AGUAS-A.SN",
+    "AGUAS-C.SN", "CAP.SN", "CCU.SN", "VAPORES.SN", "BCI.SN", "ANDINA-B.SN",
+    "ANDINA-A.SN", "IAM.SN", "SQM-A.SN", "SQM-B.SN", "ITAUCORP.SN",
+    "ENTEL.SN", "SECURITY.SN", "COLBUN.SN", "ECL.SN", "AESGENER.SN",
+    "FORUS.SN", "SALFACORP.SN", "VINA.SN", "HF.SN", "LTM.SN", "PAZ.SN",
+    "ILC.SN", "CGE.SN", "SMU.SN", "VSPT.SN", "BESALCO.SN", "MELON.SN",
+    "BLUMAR.SN", "NEXO.SN", "NAVIERA.SN", "MADECO.SN", "MULTIFOODS.SN"
+]
+
+# The universe is refreshed in shards: the scheduler queues one task per
+# shard, each task checkpoints after every batch of tickers and, when it runs
+# out of time, queues a continuation that resumes from the checkpoint
+# (see shards.py). Every shard also writes its tickers' closes to Firestore;
+# the first shard to claim the finished run publishes the correlations from them.
+SHARD_SIZE = int(os.environ.get("MINERVA_SHARD_SIZE", "200"))
+MAX_PARALLEL_SHARDS = 4
+PROVIDER_RATE = float(os.environ.get("MINERVA_PROVIDER_RATE", "2"))  # provider calls/s, all shards together
+SHARD_BUDGET_S = 420  # no new batch after this, well inside timeout_sec=540
+SHARD_QUEUE = "locations/us-central1/functions/refresh_market_shard"
+
+@scheduler_fn.on_schedule(
+    schedule="0 0 * * *", # Runs daily at midnight UTC
+    region="us-central1", # Match your deployment region
+    timeout_sec=540,      # Max 9 minutes (540 seconds) for event-driven functions
+    memory=2048           # 2GB of memory, adjust as needed
+)
+def update_market_metrics_scheduled(event: scheduler_fn.ScheduledEvent):
+    from instrumentation import start_invocation
+
+    print(f"Scheduled function triggered at {event.schedule_time}")
+    inv = start_invocation("update_market_metrics_scheduled")
+    # One run per UTC day; triggering it again the same day only redoes unfinished tickers.
+    run_id = time.strftime("%Y-%m-%d", time.gmtime())
+    n_shards = max(1, -(-len(TICKERS_CL) // SHARD_SIZE))
+    with inv.span("enqueue"):
+        for shard in range(n_shards):
+            _enqueue_shard(run_id, shard, n_shards)
+    print(f"Queued {n_shards} shards for run {run_id}")
+    inv.finish(runId=run_id, shards=n_shards)
+
+@tasks_fn.on_task_dispatched(
+    retry_config=RetryConfig(max_attempts=5, min_backoff_seconds=60),
+    rate_limits=RateLimits(max_concurrent_dispatches=MAX_PARALLEL_SHARDS),
+    region="us-central1",
+    timeout_sec=540,
+    memory=2048
+)
+def refresh_market_shard(req: tasks_fn.CallableRequest):
+    data = req.data
+    _run_market_shard(data["runId"], int(data["shard"]), int(data["shards"]))
+
+def _enqueue_shard(run_id, shard, n_shards):
+    from firebase_admin import functions
+    functions.task_queue(SHARD_QUEUE, app=get_firebase_app()).enqueue(
+        {"runId": run_id, "shard": shard, "shards": n_shards}
+    )
+
+def _run_market_shard(run_id, shard, n_shards):
+    from market_fetch import YahooProvider
+    from fundamentals import FirestoreStore, FundamentalsCache
+    from instrumentation import InstrumentedProvider, start_invocation
+    from price_store import PriceStore
+    from shards import FirestoreCheckpoints, ThrottledProvider, TokenBucket, run_shard, split_shards
+
+    # Stage times, per-ticker provider times and counters, logged as one
+    # structured line when the invocation ends (see instrumentation.py).
+    inv = start_invocation("refresh_market_shard")
+    try:
+        deadline = time.monotonic() + SHARD_BUDGET_S
+        db_client = get_firestore_client()
+        checkpoints = FirestoreCheckpoints(db_client)
+        # Each shard gets its share of the provider's rate limit.
+        bucket = TokenBucket(PROVIDER_RATE / min(n_shards, MAX_PARALLEL_SHARDS))
+        # Timed outside the throttle, so the provider spans include waiting for tokens and retries.
+        provider = InstrumentedProvider(ThrottledProvider(YahooProvider(), bucket), inv)
+        store = PriceStore()
+        # Fundamentals come from the Firestore cache that refresh_fundamentals_scheduled
+        # keeps up to date; only tickers missing from it or past a TTL call Ticker.info here.
+        fundamentals = FundamentalsCache(FirestoreStore(db_client))
+
+        result = run_shard(
+            split_shards(TICKERS_CL, n_shards)[shard], run_id, shard, checkpoints,
+            lambda batch: _refresh_tickers(batch, db_client, provider, store, fundamentals, inv),
+            deadline=deadline,
+        )
+        print(f"Shard {shard + 1}/{n_shards} of run {run_id}: {len(result.done)} tickers done, "
+              f"{result.skipped} done earlier, {len(result.errors)} failed, {len(result.remaining)} left")
+        inv.count("tickers.done", len(result.done))
+        inv.count("tickers.doneEarlier", result.skipped)
+        inv.count("tickers.remaining", len(result.remaining))
+        for e in result.errors.values():
+            inv.error(e)
+        if result.remaining:
+            _enqueue_shard(run_id, shard, n_shards)
+        elif len(checkpoints.completed(run_id, n_shards)) == n_shards and checkpoints.claim(run_id, "publish"):
+            done = set().union(*(checkpoints.done(run_id, s) for s in range(n_shards)))
+            with inv.span("correlations"):
+                _publish_correlations(db_client, store, [t for t in TICKERS_CL if t in done])
+    except Exception as e:
+        inv.error(e)
+        raise
+    finally:
+        inv.finish(runId=run_id, shard=shard, shards=n_shards)
+
+def _refresh_tickers(tickers, db_client, provider, store, fundamentals, inv):
+    """
+    Fetch, compute and write the TK documents of `tickers`, timing each stage
+    in `inv`. Returns (written, errors).
+    """
+    import json
+    import pandas as pd
+    from firebase_admin import firestore
+    from market_fetch import fetch_universe
+    from firestore_batch import commit_documents
+    from correlation import CLOSES_COLLECTION, closes_document
+    from indicators import indicators_by_index
+    from metrics import metrics_table, table_documents
+
+    documents = {}
+
+    # One bulk download for the missing tail of every stored price history.
+    with inv.span("fetch"):
+        fetched = fetch_universe(tickers, provider, store=store, fundamentals=fundamentals)
+    errors = dict(fetched.errors)
+    for t, e in fetched.errors.items():
+        print(f"Error on {t}: {e}")
+
+    # Indicators on each ticker's own bars, one vectorized pass per shared index.
+    with inv.span("indicators"):
+        indicators = indicators_by_index({t: df["Close"] for t, df in fetched.histories.items()})
+        closes = pd.DataFrame({t: df["Close"] for t, df in fetched.histories.items()})
+
+    # Return, volatility, Sharpe and drawdowns for every ticker and lookback
+    # in one pass over the same matrix.
+    with inv.span("metrics"):
+        metrics = table_documents(metrics_table(closes)) if not closes.empty else {}
+
+    for t in tickers:
+        if t in fetched.errors:
+            continue
+        try:
+            df = fetched.histories.get(t)
+            if df is None or df.empty:
+                print(f"No data found for {t}. Skipping.")
+                inv.count("tickers.noData")
+                continue
+
+            # The top-level fields keep their meaning: the whole stored history.
+            longest = metrics[t]["2y"]
+
+            info = fetched.infos[t]
+            data = {
+                "Ticker": t,
+                "Company": info.get("longName"),
+                "Sector": info.get("sector"),
+                "MarketCap": info.get("marketCap"),
+                "PE": info.get("trailingPE"),
+                "PB": info.get("priceToBook"),
+                "ROE": info.get("returnOnEquity"),
+                "DebtToEquity": info.get("debtToEquity"),
+                "DividendYield": info.get("dividendYield"),
+                "AnnualReturn": longest["AnnualReturn"],
+                "AnnualVolatility": longest["AnnualVolatility"],
+                "SharpeRatio": longest["Sharpe"],
+                "Metrics": metrics[t],
+                "Timestamp": firestore.SERVER_TIMESTAMP
+            }
+            # Latest indicator values, as of the ticker's last bar.
+            for name in ("SMA_20", "SMA_50", "RSI", "MACD", "Signal"):
+                data[name] = float(indicators[t][name].iloc[-1])
+
+            documents[t] = data
+
+        except Exception as e:
+            print(f"Error on {t}: {e}")
+            errors[t] = e
+
+    if inv.enabled:
+        inv.count("payloadBytes", sum(len(json.dumps(d, default=str)) for d in documents.values()))
+
+    # Commit the batch in batched writes instead of one set() per ticker,
+    # with the closes the correlations are published from.
+    with inv.span("write"):
+        written, write_errors = commit_documents(db_client, "TK", documents)
+        _, closes_errors = commit_documents(db_client, CLOSES_COLLECTION, {
+            t: closes_document(t, fetched.histories[t]["Close"]) for t in written
+        })
+    for t in written:
+        print(f"Saved: {t}")
+    write_errors.update(closes_errors)
+    for t, e in write_errors.items():
+        print(f"Error on {t}: {e}")
+    errors.update(write_errors)
+    return written, errors
+
+def _publish_correlations(db_client, store, tickers):
+    """Fold the run's closes into the rolling correlations and publish them."""
+    from firebase_admin import firestore
+    from firestore_batch import commit_documents
+    from correlation import CLOSES_COLLECTION, MAX_PUBLISHED_BYTES, STATE_FILE, closes_from_documents, sync
+
+    # The shards ran on other instances with their own price store, so the
+    # closes come from the documents each of them wrote. The rolling state is
+    # kept next to this instance's store: when it is missing or stale, sync
+    # recomputes the window, otherwise only the new days are folded in.
+    collection = db_client.collection(CLOSES_COLLECTION)
+    snapshots = db_client.get_all([collection.document(t) for t in tickers])
+    closes = closes_from_documents([s.to_dict() for s in snapshots if s.exists], tickers)
+    if closes.empty:
+        return
+    try:
+        correlations = sync(closes, os.path.join(store.root, STATE_FILE))
+    except Exception as e:
+        print(f"Error computing correlations: {e}")
+        return
+
+    # Merged into the TK documents the shards wrote.
+    _, errors = commit_documents(db_client, "TK", {
+        t: {"TopCorrelated": [{"Ticker": other, "Correlation": c} for other, c in correlations.top_k(t)]}
+        for t in closes.columns
+    }, merge=True)
+    for t, e in errors.items():
+        print(f"Error on {t}: {e}")
+
+    # The whole correlation matrix as a float32 upper triangle, when it fits one document.
+    packed = correlations.packed()
+    if packed.nbytes <= MAX_PUBLISHED_BYTES:
+        _, corr_errors = commit_documents(db_client, "CORR", {"latest": {
+            "Tickers": correlations.tickers,
+            "Window": correlations.window,
+            "AsOf": str(correlations.last_date.date()),
+            "UpperTriangle": packed.tobytes(),
+            "Timestamp": firestore.SERVER_TIMESTAMP
+        }})
+        for e in corr_errors.values():
+            print(f"Error saving correlations: {e}")
+    print(f"Published correlations for {len(closes.columns)} tickers")
+
+@scheduler_fn.on_schedule(
+    schedule="0 2 * * 6", # Runs weekly, Saturdays at 02:00 UTC
+    region="us-central1", # Match your deployment region
+    timeout_sec=540,
+    memory=512
+)
+def refresh_fundamentals_scheduled(event: scheduler_fn.ScheduledEvent):
+    from market_fetch import YahooProvider
+    from fundamentals import FirestoreStore, FundamentalsCache
+
+    # Ticker.info only for tickers with a field past its TTL (see
+    # fundamentals.FIELD_TTL); the next daily run publishes the new values.
+    print(f"Scheduled function triggered at {event.schedule_time}")
+    cache = FundamentalsCache(FirestoreStore(get_firestore_client()))
+    refreshed, errors = cache.refresh(TICKERS_CL, YahooProvider())
+    for t, e in errors.items():
+        print(f"Error on {t}: {e}")
+    print(f"Finished refreshing fundamentals. Tickers refreshed: {len(refreshed)}")
@@ -0,0 +1,335 @@
+# prediction.py
+"""
+Next-close predictions from the LSTM model exported as LSTM-S.tflite.
+
+The model (LSTM.ipynb) reads the last 100 closes of a ticker, min-max scaled
+to [0, 1], and predicts the next scaled close. Serving it cheaply comes down
+to three things:
+
+- `LSTMPredictor` loads the interpreter once per instance and keeps it, with
+  its input buffer, across requests;
+- every request runs all its tickers through one `invoke` (batches are padded
+  to a power of two so the tensors are only resized a handful of times);
+- `WindowCache` keeps each ticker's scaled input window, rebuilt only when
+  the price store has a new bar.
+
+Multi-step forecasts (`rollout`) feed each prediction back into the window,
+as the 30-day loop in LSTM.ipynb does, but for all tickers at once: one model
+call per step on a fixed ring buffer, instead of `model.predict` on a
+growing Python list per ticker and step.
+
+The model was converted with SELECT_TF_OPS (Flex TensorList kernels), so it
+needs the full TensorFlow build; `tflite_runtime` is only tried as a fallback.
+"""
+import os
+import threading
+
+import numpy as np
+
+WINDOW = 100       # time steps the model was trained on
+MAX_BATCH = 256    # rows per invoke
+MAX_STEPS = 60     # longest forecast the handler accepts
+DEFAULT_LOOKBACK = "2y"  # history the min-max scaling is fitted on
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODEL_FILE = "LSTM-S.tflite"
+
+
+def default_model_path():
+    """`$MINERVA_TFLITE_MODEL`, else the model deployed next to main.py, else the one in Evidencias de Modelos."""
+    if os.environ.get("MINERVA_TFLITE_MODEL"):
+        return os.environ["MINERVA_TFLITE_MODEL"]
+    deployed = os.path.join(HERE, MODEL_FILE)
+    if os.path.exists(deployed):
+        return deployed
+    return os.path.normpath(os.path.join(HERE, os.pardir, "Evidencias de Modelos", MODEL_FILE))
+
+
+def load_interpreter(model_path=None, num_threads=None):
+    model_path = model_path or default_model_path()
+    try:
+        import tensorflow as tf
+        return tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+    except ImportError:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter(model_path=model_path, num_threads=num_threads)
+
+
+def _bucket(n):
+    return min(MAX_BATCH, 1 << max(0, n - 1).bit_length())
+
+
+class LSTMPredictor:
+    """Thread-safe wrapper around one interpreter; `predict_scaled` batches any number of windows."""
+
+    def __init__(self, interpreter):
+        self._interpreter = interpreter
+        details = interpreter.get_input_details()[0]
+        self._input_index = details["index"]
+        self.window = int(details["shape"][1])
+        self._output_index = interpreter.get_output_details()[0]["index"]
+        self._buffer = None
+        self._lock = threading.Lock()
+        self.invokes = 0
+
+    @classmethod
+    def from_file(cls, model_path=None, num_threads=None):
+        return cls(load_interpreter(model_path, num_threads))
+
+    def _ensure_batch(self, batch):
+        if self._buffer is None or len(self._buffer) != batch:
+            self._interpreter.resize_tensor_input(self._input_index, [batch, self.window, 1])
+            self._interpreter.allocate_tensors()
+            self._buffer = np.zeros((batch, self.window, 1), dtype=np.float32)
+
+    def predict_scaled(self, windows):
+        """Scaled next values for windows of shape (n, window); returns shape (n,)."""
+        windows = np.asarray(windows, dtype=np.float32)
+        out = np.empty(len(windows), dtype=np.float32)
+        with self._lock:
+            for lo in range(0, len(windows), MAX_BATCH):
+                chunk = windows[lo:lo + MAX_BATCH]
+                self._ensure_batch(_bucket(len(chunk)))
+                self._buffer[:len(chunk), :, 0] = chunk
+                self._buffer[len(chunk):] = 0.0
+                self._interpreter.set_tensor(self._input_index, self._buffer)
+                self._interpreter.invoke()
+                self.invokes += 1
+                out[lo:lo + len(chunk)] = self._interpreter.get_tensor(self._output_index)[:len(chunk), 0]
+        return out
+
+
+def rollout(step, windows, steps):
+    """
+    Autoregressive forecast of `steps` values for every row of `windows`
+    (n, window): `step` maps a batch of windows to the next value of each,
+    e.g. `LSTMPredictor.predict_scaled` or `keras_step(model)`.
+    Returns shape (n, steps).
+    """
+    windows = np.asarray(windows, dtype=np.float32)
+    n, window = windows.shape
+    # Each value is written twice, `window` apart, so the current window is
+    # always the contiguous slice ring[:, head:head + window].
+    ring = np.empty((n, 2 * window), dtype=np.float32)
+    ring[:, :window] = windows
+    ring[:, window:] = windows
+    out = np.empty((n, steps), dtype=np.float32)
+    head = 0
+    for k in range(steps):
+        y = step(ring[:, head:head + window])
+        out[:, k] = y
+        ring[:, head] = y
+        ring[:, head + window] = y
+        head = (head + 1) % window
+    return out
+
+
+def keras_step(model):
+    """
+    `rollout` step for a Keras model: calls the model directly through one
+    traced `tf.function`, skipping `model.predict`'s per-call setup.
+    """
+    import tensorflow as tf
+
+    window = model.input_shape[1]
+
+    @tf.function(input_signature=[tf.TensorSpec([None, window, 1], tf.float32)])
+    def call(x):
+        return model(x, training=False)
+
+    return lambda windows: call(np.ascontiguousarray(windows)[..., None]).numpy()[:, 0]
+
+
+class WindowCache:
+    """
+    Scaled input window per ticker, read from a `price_store.PriceStore`.
+    Closes are min-max scaled over the `lookback` period, as the notebook
+    fitted its scaler on the whole series; an entry is rebuilt when the
+    store gets a new bar or the lookback window moves.
+    """
+
+    def __init__(self, store, window=WINDOW, lookback=DEFAULT_LOOKBACK):
+        self.store = store
+        self.window = window
+        self.lookback = lookback
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ticker, last=None, start=None):
+        """
+        (scaled window, min, max, as-of date), or None if the ticker has fewer
+        than `window` closes. `last` (the store's last date) and `start` (the
+        lookback start) can be passed in when the caller already has them.
+        """
+        from price_store import period_start
+
+        last = self.store.last_date(ticker) if last is None else last
+        if last is None:
+            return None
+        start = period_start(self.lookback) if start is None else start
+        key = (last, start)
+        with self._lock:
+            entry = self._entries.get(ticker)
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry[1]
+
+        df = self.store.read(ticker, start=start)
+        close = df["Close"].to_numpy(dtype=np.float64) if df is not None else np.empty(0)
+        close = close[~np.isnan(close)]
+        if len(close) < self.window:
+            value = None
+        else:
+            lo, hi = float(close.min()), float(close.max())
+            span = hi - lo if hi > lo else 1.0
+            scaled = ((close[-self.window:] - lo) / span).astype(np.float32)
+            value = (scaled, lo, hi, str(df.index[-1].date()))
+        with self._lock:
+            self._entries[ticker] = (key, value)
+            self.misses += 1
+        return value
+
+
+def _stale(last, today=None):
+    """True when the store has no bars, or none from the last business day before `today`."""
+    import pandas as pd
+
+    if last is None:
+        return True
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today)
+    return last < today - pd.offsets.BDay(1)
+
+
+def predict_tickers(tickers, predictor, cache, provider=None, steps=1):
+    """
+    Next-close prediction for every ticker in one batched invoke per step.
+    Tickers not in the store yet, or whose last stored bar is older than the
+    last business day, are fetched first: one bulk download per group, of
+    only the missing tail for the stored ones.
+    Returns (predictions, errors): ticker -> {"predictedClose", "asOf"}, plus
+    "forecast" (the next `steps` closes) when steps > 1, and
+    ticker -> (code, message).
+    """
+    from price_store import period_start
+
+    tickers = list(dict.fromkeys(tickers))
+    errors = {}
+
+    last_dates = {t: cache.store.last_date(t) for t in tickers}
+    stale = [t for t, last in last_dates.items() if _stale(last)]
+    if stale:
+        from market_fetch import YahooProvider, fetch_histories
+        _, fetch_errors = fetch_histories(stale, provider or YahooProvider(), period=cache.lookback,
+                                          store=cache.store)
+        errors.update((t, ("internal", f"Failed to fetch price history: {e}")) for t, e in fetch_errors.items())
+        last_dates.update((t, cache.store.last_date(t)) for t in stale)
+
+    start = period_start(cache.lookback)
+    ready, windows = [], []
+    for t in tickers:
+        if t in errors:
+            continue
+        if last_dates[t] is None:
+            errors[t] = ("not-found", f"No price history found for {t}.")
+            continue
+        entry = cache.get(t, last_dates[t], start)
+        if entry is None:
+            errors[t] = ("not-found", f"Fewer than {cache.window} daily closes stored for {t}.")
+            continue
+        ready.append((t, entry))
+        windows.append(entry[0])
+
+    predictions = {}
+    if ready:
+        scaled = rollout(predictor.predict_scaled, np.stack(windows), steps)
+        for (t, (_, lo, hi, as_of)), y in zip(ready, scaled):
+            span = hi - lo if hi > lo else 1.0
+            closes = (lo + y.astype(np.float64) * span).tolist()
+            predictions[t] = {"predictedClose": closes[0], "asOf": as_of}
+            if steps > 1:
+                predictions[t]["forecast"] = closes
+    return predictions, errors
+
+
+if __name__ == "__main__":
+    # Per-ticker invokes vs one batched invoke, on synthetic price windows,
+    # then a --steps forecast as the LSTM.ipynb loop does it vs `rollout`:
+    #   python prediction.py --tickers 43 1000 --steps 30
+    # The real LSTM-S.tflite is used when TensorFlow is installed; --fake uses
+    # fakes.FakeInterpreter instead.
+    import argparse
+    import statistics
+    import tempfile
+    import time
+
+    from fakes import FakeInterpreter, synthetic_ohlcv, synthetic_tickers
+    from price_store import PriceStore
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, nargs="+", default=[43, 1000])
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--fake", action="store_true")
+    args = parser.parse_args()
+
+    def make_predictor():
+        if args.fake:
+            return LSTMPredictor(FakeInterpreter())
+        try:
+            return LSTMPredictor.from_file()
+        except ImportError:
+            print("TensorFlow not installed, using fakes.FakeInterpreter")
+            args.fake = True
+            return LSTMPredictor(FakeInterpreter())
+
+    def percentile(values, q):
+        return sorted(values)[min(len(values) - 1, int(q * len(values)))]
+
+    for n in args.tickers:
+        tickers = synthetic_tickers(n)
+        with tempfile.TemporaryDirectory() as root:
+            store = PriceStore(root)
+            for t in tickers:
+                store.append(t, synthetic_ohlcv(t))
+            cache = WindowCache(store)
+
+            for label in ("per-ticker", "batched"):
+                predictor = make_predictor()
+                latencies = []
+                for _ in range(args.requests):
+                    start = time.perf_counter()
+                    if label == "batched":
+                        predictions, _ = predict_tickers(tickers, predictor, cache)
+                    else:
+                        for t in tickers:
+                            predict_tickers([t], predictor, cache)
+                    latencies.append(time.perf_counter() - start)
+                p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+                rate = n * len(latencies) / sum(latencies)
+                print(f"{n:>6} tickers  {label:<10}  p50 {p50 * 1000:8.1f} ms  p99 {p99 * 1000:8.1f} ms  "
+                      f"{rate:10,.0f} predictions/s  invokes/request {predictor.invokes / args.requests:.0f}")
+            print(f"{'':>14}window cache hits={cache.hits} misses={cache.misses}  "
+                  f"mean prediction {statistics.mean(p['predictedClose'] for p in predictions.values()):.2f}")
+
+            # --steps forecast: the notebook's list-based loop, one ticker at a
+            # time, vs one batched rollout for every ticker.
+            windows = np.stack([cache.get(t)[0] for t in tickers])
+            predictor = make_predictor()
+            start = time.perf_counter()
+            looped = []
+            for row in windows:
+                temp_input = row.tolist()
+                for _ in range(args.steps):
+                    x_input = np.array(temp_input[-WINDOW:], dtype=np.float32).reshape((1, WINDOW))
+                    temp_input.extend(predictor.predict_scaled(x_input).tolist())
+                looped.append(temp_input[WINDOW:])
+            loop_s = time.perf_counter() - start
+            start = time.perf_counter()
+            rolled = rollout(predictor.predict_scaled, windows, args.steps)
+            roll_s = time.perf_counter() - start
+            diff = float(np.abs(rolled - np.array(looped)).max())
+            print(f"{n:>6} tickers  {args.steps}-step forecast  loop {loop_s * 1000:9.1f} ms  "
+                  f"rollout {roll_s * 1000:8.1f} ms  ({roll_s * 1000 / args.steps:.2f} ms/step)  "
+                  f"per ticker (loop) {loop_s * 1000 / n:.1f} ms  max diff {diff:.1e}")
@@ -0,0 +1,221 @@
+# price_store.py
+"""
+Persistent columnar store for daily OHLCV bars.
+
+Each ticker gets its own directory holding one `.npy` file per column
+(int64 dates, float32 prices, int64 volume) plus a small `meta.json` with the
+row count and the last stored date. Columns are memory-mapped on read, and
+new bars are appended to the tail, so a nightly run only has to download the
+days it has not seen yet.
+
+The root defaults to `$MINERVA_PRICE_STORE`, or `/tmp/minerva_prices`. On
+Cloud Functions `/tmp` only lives as long as the instance, so point the
+variable at a mounted bucket to keep the store between cold starts.
+"""
+import json
+import os
+
+DEFAULT_ROOT = os.environ.get("MINERVA_PRICE_STORE", "/tmp/minerva_prices")
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close"]
+COLUMN_DTYPES = {
+    "Date": "int64",      # nanoseconds since epoch, tz-naive
+    "Open": "float32",
+    "High": "float32",
+    "Low": "float32",
+    "Close": "float32",
+    "Volume": "int64",
+}
+
+
+def period_start(period, today=None):
+    """First date covered by a yfinance-style `period` such as "2y", "6mo" or "30d"."""
+    import pandas as pd
+
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today)
+    units = {"y": "years", "mo": "months", "wk": "weeks", "d": "days"}
+    for suffix, unit in units.items():
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            return today - pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+    raise ValueError(f"Unsupported period: {period!r}")
+
+
+class PriceStore:
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+
+    def _dir(self, ticker):
+        return os.path.join(self.root, ticker)
+
+    def _meta(self, ticker):
+        try:
+            with open(os.path.join(self._dir(ticker), "meta.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, NotADirectoryError):
+            # NotADirectoryError: other state files kept in the root (correlations, fundamentals).
+            return None
+
+    def tickers(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(t for t in os.listdir(self.root) if self._meta(t))
+
+    def last_date(self, ticker):
+        """Date of the newest stored bar, or None if the ticker has no data."""
+        import pandas as pd
+
+        meta = self._meta(ticker)
+        return pd.Timestamp(meta["last_date"]) if meta else None
+
+    def covered_from(self, ticker):
+        """
+        Earliest date the stored history was requested from (at least the
+        first stored bar), or None. Bars before it were never asked for, so a
+        longer `period` has to backfill them; a later listing date does not.
+        """
+        import pandas as pd
+
+        meta = self._meta(ticker)
+        if meta is None:
+            return None
+        return pd.Timestamp(meta.get("covered_from") or meta.get("first_date") or self._first(ticker))
+
+    def _first(self, ticker):
+        import pandas as pd
+
+        cols = self.columns(ticker)
+        return str(pd.Timestamp(int(cols["Date"][0])).date()) if cols is not None and len(cols["Date"]) else None
+
+    def columns(self, ticker, mmap=True):
+        """Raw column arrays (memory-mapped by default), trimmed to the committed rows."""
+        import numpy as np
+
+        meta = self._meta(ticker)
+        if meta is None:
+            return None
+        mode = "r" if mmap else None
+        return {
+            col: np.load(os.path.join(self._dir(ticker), f"{col}.npy"), mmap_mode=mode)[:meta["rows"]]
+            for col in COLUMN_DTYPES
+        }
+
+    def read(self, ticker, start=None, end=None):
+        """Stored bars in [start, end] as a DataFrame indexed by Date, or None."""
+        import numpy as np
+        import pandas as pd
+
+        cols = self.columns(ticker)
+        if cols is None:
+            return None
+        dates = cols["Date"]
+        lo = 0 if start is None else int(np.searchsorted(dates, pd.Timestamp(start).value, "left"))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, pd.Timestamp(end).value, "right"))
+        index = pd.DatetimeIndex(np.asarray(dates[lo:hi]).view("datetime64[ns]"), name="Date")
+        return pd.DataFrame(
+            {col: np.asarray(cols[col][lo:hi]) for col in COLUMN_DTYPES if col != "Date"},
+            index=index,
+        )
+
+    def mark_covered(self, ticker, covered_from):
+        """Record that the history was requested from `covered_from` even though it starts later."""
+        import pandas as pd
+
+        meta = self._meta(ticker)
+        if meta is not None and pd.Timestamp(covered_from) < self.covered_from(ticker):
+            self._write_meta(ticker, {**meta, "covered_from": str(pd.Timestamp(covered_from).date())})
+
+    def _write_meta(self, ticker, meta):
+        tmp = os.path.join(self._dir(ticker), "meta.tmp.json")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self._dir(ticker), "meta.json"))
+
+    def append(self, ticker, df, covered_from=None):
+        """
+        Merge new bars into the stored history.
+
+        Stored rows between the first and last new dates are replaced, so
+        re-fetching the last stored day also corrects a bar that was still
+        being formed, and an older range (a backfill) keeps the stored tail.
+        `covered_from` is the start of the requested range, recorded so a
+        ticker listed after it is not backfilled again.
+        Returns the number of rows written.
+        """
+        import numpy as np
+        import pandas as pd
+
+        if df is None or df.empty:
+            return 0
+        df = df[[c for c in COLUMN_DTYPES if c != "Date"]].dropna(subset=PRICE_COLUMNS, how="all")
+        if df.empty:
+            return 0
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        new = {"Date": index.normalize().values.astype("datetime64[ns]").view("int64")}
+        for col in PRICE_COLUMNS:
+            new[col] = df[col].to_numpy(dtype=COLUMN_DTYPES[col])
+        new["Volume"] = df["Volume"].fillna(0).to_numpy(dtype=COLUMN_DTYPES["Volume"])
+
+        order = np.argsort(new["Date"], kind="stable")
+        new = {col: arr[order] for col, arr in new.items()}
+
+        old = self.columns(ticker, mmap=False)
+        covered = [] if covered_from is None else [pd.Timestamp(covered_from).normalize()]
+        if old is not None:
+            covered.append(self.covered_from(ticker))
+            head = int(np.searchsorted(old["Date"], new["Date"][0], "left"))
+            tail = int(np.searchsorted(old["Date"], new["Date"][-1], "right"))
+            new = {col: np.concatenate([old[col][:head], new[col], old[col][tail:]]) for col in COLUMN_DTYPES}
+        first = pd.Timestamp(new["Date"][0])
+        covered = min([first] + [c for c in covered if c is not None])
+
+        path = self._dir(ticker)
+        os.makedirs(path, exist_ok=True)
+        for col, arr in new.items():
+            tmp = os.path.join(path, f"{col}.tmp.npy")
+            np.save(tmp, arr)
+            os.replace(tmp, os.path.join(path, f"{col}.npy"))
+
+        # meta.json goes last: readers trust its row count.
+        self._write_meta(ticker, {
+            "rows": len(new["Date"]),
+            "first_date": str(first.date()),
+            "last_date": str(pd.Timestamp(new["Date"][-1]).date()),
+            "covered_from": str(covered.date()),
+        })
+        return len(df)
+
+
+if __name__ == "__main__":
+    # Offline comparison of a full download against an incremental night:
+    #   python price_store.py --tickers 43 1000
+    import argparse
+    import tempfile
+    import time
+
+    import pandas as pd
+    from fakes import FakeProvider, synthetic_tickers
+    from market_fetch import fetch_histories
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, nargs="+", default=[43, 1000])
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    today = pd.Timestamp.today().normalize()
+    yesterday = today - pd.offsets.BDay(1)
+    for n in args.tickers:
+        tickers = synthetic_tickers(n)
+        with tempfile.TemporaryDirectory() as root:
+            store = PriceStore(root)
+            for label, end in (("full", yesterday), ("incremental", today)):
+                provider = FakeProvider(latency=args.latency, n_days=600, end=end)
+                provider.download(tickers)  # build the synthetic frames outside the timings
+                provider.calls["rows"] = 0
+                start = time.perf_counter()
+                histories, errors = fetch_histories(tickers, provider, store=store)
+                elapsed = time.perf_counter() - start
+                print(f"{n:>6} tickers  {label:<11} {elapsed:7.2f}s  "
+                      f"rows downloaded={provider.calls['rows']:>8}  "
+                      f"window rows={sum(len(df) for df in histories.values()):>8}")
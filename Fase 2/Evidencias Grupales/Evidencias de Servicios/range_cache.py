@@ -0,0 +1,221 @@
+# range_cache.py
+"""
+In-process, range-aware cache for per-ticker price history.
+
+Each ticker keeps the widest date range fetched so far, together with the
+columns computed from it (the technical indicators). A request whose range is
+already covered is answered by slicing; otherwise only the missing edges are
+fetched and merged in. Entries are evicted least-recently-used beyond
+`max_entries` and expire `ttl` seconds after their first fetch, so the most
+recent bars are picked up again.
+
+Every fetch starts `warmup_days` before the requested start, and indicators
+are computed over the whole cached range, so even on a miss the first rows
+of a window use a full look-back. The rolling windows are then the same
+whatever was cached before, and the EWMs (MACD, EWM RSI) have decayed their
+starting point below float precision: a request returns the same values on
+a miss, a partial hit or a hit.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_TTL = 15 * 60  # seconds
+# Calendar days fetched before each start: ~250 bars, so SMA_50 is full and
+# the slowest EWM (span 26) keeps (25/27)**250 ~ 4e-9 of its seed.
+DEFAULT_WARMUP_DAYS = 365
+
+
+@dataclass
+class _Entry:
+    start: object   # pd.Timestamp, inclusive (first fetched day, warm-up included)
+    end: object     # pd.Timestamp, exclusive (as in yfinance history)
+    raw: object     # fetched OHLCV
+    data: object    # raw + computed columns
+    expires: float
+
+
+def _normalize(df):
+    """Flat columns and a tz-naive index, so ranges compare with plain dates."""
+    import pandas as pd
+
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = [col[0] if isinstance(col, tuple) else col for col in df.columns]
+    if isinstance(df.index, pd.DatetimeIndex) and df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    return df
+
+
+def _slice(df, start, end):
+    return df[(df.index >= start) & (df.index < end)].copy()
+
+
+class RangeCache:
+    def __init__(self, fetch, compute=None, max_entries=DEFAULT_MAX_ENTRIES,
+                 ttl=DEFAULT_TTL, clock=time.monotonic, warmup_days=DEFAULT_WARMUP_DAYS):
+        """
+        `fetch(ticker, start, end)` returns an OHLCV DataFrame for [start, end);
+        `compute(df)` returns it with the derived columns added.
+        """
+        self._fetch = fetch
+        self._compute = compute
+        self.warmup_days = warmup_days
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "partial_hits": self.partial_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, ticker, now):
+        with self._lock:
+            entry = self._entries.get(ticker)
+            if entry is None:
+                return None
+            if entry.expires <= now:
+                del self._entries[ticker]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(ticker)
+            return entry
+
+    def _store(self, ticker, entry):
+        with self._lock:
+            self._entries[ticker] = entry
+            self._entries.move_to_end(ticker)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def covers(self, ticker, start, end):
+        """True when `get(ticker, start, end)` would be a hit."""
+        import pandas as pd
+
+        entry = self._lookup(ticker, self._clock())
+        fetch_start = pd.Timestamp(start) - pd.Timedelta(days=self.warmup_days)
+        return entry is not None and entry.start <= fetch_start and pd.Timestamp(end) <= entry.end
+
+    def put(self, ticker, start, end, raw, data):
+        """
+        Store history fetched elsewhere (a bulk download) for [start, end),
+        warm-up included: `raw` as fetched and `data` with the columns
+        `compute` would add. Counted as a miss.
+        """
+        import pandas as pd
+
+        with self._lock:
+            self.misses += 1
+        self._store(ticker, _Entry(pd.Timestamp(start), pd.Timestamp(end), raw, data, self._clock() + self.ttl))
+
+    def get(self, ticker, start, end):
+        """
+        History for `ticker` in [start, end) with the computed columns.
+        Returns (df, status), where status is "hit", "partial" or "miss".
+        """
+        import pandas as pd
+
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        fetch_start = start - pd.Timedelta(days=self.warmup_days)
+        now = self._clock()
+        entry = self._lookup(ticker, now)
+
+        if entry is not None and entry.start <= fetch_start and end <= entry.end:
+            with self._lock:
+                self.hits += 1
+            return _slice(entry.data, start, end), "hit"
+
+        if entry is None:
+            status = "miss"
+            raw = _normalize(self._fetch(ticker, fetch_start, end))
+            new_start, new_end, expires = fetch_start, end, now + self.ttl
+        else:
+            status = "partial"
+            parts = []
+            if fetch_start < entry.start:
+                parts.append(_normalize(self._fetch(ticker, fetch_start, entry.start)))
+            parts.append(entry.raw)
+            if end > entry.end:
+                parts.append(_normalize(self._fetch(ticker, entry.end, end)))
+            raw = pd.concat([p for p in parts if not p.empty])
+            raw = raw[~raw.index.duplicated(keep="last")].sort_index()
+            new_start, new_end = min(fetch_start, entry.start), max(end, entry.end)
+            expires = entry.expires
+
+        with self._lock:
+            if status == "miss":
+                self.misses += 1
+            else:
+                self.partial_hits += 1
+
+        if raw.empty:
+            return raw, status
+
+        data = self._compute(raw.copy()) if self._compute else raw
+        self._store(ticker, _Entry(new_start, new_end, raw, data, expires))
+        return _slice(data, start, end), status
+
+
+if __name__ == "__main__":
+    # Offline cold vs warm latency against the fake provider:
+    #   python range_cache.py --requests 200 --latency 0.3
+    import argparse
+    import random
+    import statistics
+
+    import pandas as pd
+    from fakes import FakeProvider
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3,
+                        help="simulated seconds per history() call")
+    parser.add_argument("--tickers", type=int, default=5)
+    args = parser.parse_args()
+
+    provider = FakeProvider(latency=args.latency, n_days=5040)  # ~20 years
+    tickers = [f"SYN{i:05d}.SN" for i in range(args.tickers)]
+    today = pd.Timestamp.today().normalize()
+    rng = random.Random(0)
+
+    def window():
+        # Overlapping dashboard windows: 3 months to 2 years, ending in the last month.
+        end = today - pd.Timedelta(days=rng.randint(0, 30))
+        return end - pd.Timedelta(days=rng.randint(90, 730)), end
+
+    requests = [(rng.choice(tickers), *window()) for _ in range(args.requests)]
+    cache = RangeCache(provider.history)
+    timings = {"hit": [], "partial": [], "miss": []}
+    cold = []
+    for ticker, start, end in requests:
+        t0 = time.perf_counter()
+        provider.history(ticker, start, end)
+        cold.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        _, status = cache.get(ticker, start, end)
+        timings[status].append(time.perf_counter() - t0)
+
+    print(f"uncached  n={len(cold):>4}  mean {statistics.mean(cold) * 1000:8.2f} ms")
+    for status, values in timings.items():
+        if values:
+            print(f"{status:<9} n={len(values):>4}  mean {statistics.mean(values) * 1000:8.2f} ms")
+    print(cache.stats())
@@ -0,0 +1,62 @@
+# sampled_log.py
+"""
+Level-gated, sampled logging for the HTTP handlers.
+
+Regular debug lines go through the standard `logging` level check, so they
+cost nothing when the level is above DEBUG. Payload dumps (request bodies,
+DataFrame heads, response previews) are additionally sampled: only a fraction
+`MINERVA_LOG_SAMPLE` of requests pays for building them, and the message is
+built by a callable only once it is known to be emitted.
+
+Level and sample rate come from `MINERVA_LOG_LEVEL` (default INFO) and
+`MINERVA_LOG_SAMPLE` (default 0.01).
+"""
+import logging
+import os
+import random
+
+DEFAULT_LEVEL = os.environ.get("MINERVA_LOG_LEVEL", "INFO").upper()
+DEFAULT_SAMPLE_RATE = float(os.environ.get("MINERVA_LOG_SAMPLE", "0.01"))
+
+PAYLOAD_PREVIEW_CHARS = 500
+
+
+class SampledLogger:
+    def __init__(self, name, level=DEFAULT_LEVEL, sample_rate=DEFAULT_SAMPLE_RATE):
+        self.logger = logging.getLogger(name)
+        if not self.logger.handlers and not logging.getLogger().handlers:
+            # Cloud Functions forwards stdout/stderr; keep the old one-line shape.
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+            self.logger.addHandler(handler)
+        self.logger.setLevel(level)
+        self.sample_rate = sample_rate
+
+    def debug(self, msg, *args):
+        self.logger.debug(msg, *args)
+
+    def info(self, msg, *args):
+        self.logger.info(msg, *args)
+
+    def warning(self, msg, *args):
+        self.logger.warning(msg, *args)
+
+    def exception(self, msg, *args):
+        self.logger.exception(msg, *args)
+
+    def sampled(self):
+        """Decide once per request whether its payload dumps are logged."""
+        return self.logger.isEnabledFor(logging.DEBUG) and random.random() < self.sample_rate
+
+    def payload(self, sampled, label, build):
+        """Log `build()` (truncated) under `label`, only for a sampled request."""
+        if not sampled:
+            return
+        text = str(build())
+        if len(text) > PAYLOAD_PREVIEW_CHARS:
+            text = text[:PAYLOAD_PREVIEW_CHARS] + "..."
+        self.logger.debug("%s:\n%s", label, text)
+
+
+def get_logger(name):
+    return SampledLogger(name)
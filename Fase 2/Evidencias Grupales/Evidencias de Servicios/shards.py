@@ -0,0 +1,292 @@
+# shards.py
+"""
+Sharded, checkpointed processing of the ticker universe.
+
+The universe is split into shards (a ticker always lands in the same shard,
+so adding tickers does not reshuffle the others), and each shard is worked
+through in small batches by `run_shard`. After every batch the finished
+tickers are recorded in a checkpoint store, so an invocation killed by the
+function timeout loses at most one batch, and the next one for the same run
+resumes with the unfinished tickers only. `run_shard` also stops starting
+batches at a deadline, leaving the caller time to hand the rest over.
+
+Provider calls from parallel shards go through a `TokenBucket` and are
+retried with exponential backoff and jitter when the provider throttles
+(`ThrottledProvider`), so the shards stay under the provider's rate limit
+instead of failing together.
+"""
+import random
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_RETRIES = 4
+RUNS_COLLECTION = "RUNS"
+# Substrings of an exception's type or message that mean "slow down".
+THROTTLE_MARKERS = ("RateLimit", "429", "Too Many Requests", "timed out", "Timeout")
+
+
+def shard_of(ticker, n_shards):
+    return zlib.crc32(ticker.encode()) % n_shards
+
+
+def split_shards(tickers, n_shards):
+    """`n_shards` lists of tickers, each in the order of `tickers`."""
+    shards = [[] for _ in range(n_shards)]
+    for t in tickers:
+        shards[shard_of(t, n_shards)].append(t)
+    return shards
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second, up to `capacity` banked (default: one second's
+    worth). `acquire` blocks until a token is available; thread-safe.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+def is_throttled(e):
+    text = f"{type(e).__name__} {e}"
+    return any(marker in text for marker in THROTTLE_MARKERS)
+
+
+def call_with_backoff(fn, *args, retries=DEFAULT_RETRIES, base=0.5, cap=30.0,
+                      retry_if=is_throttled, sleep=time.sleep, **kwargs):
+    """
+    `fn(*args, **kwargs)`, retried up to `retries` times while `retry_if(e)`
+    holds, sleeping a random time in [0, min(cap, base * 2**attempt)] between
+    attempts ("full jitter", so parallel shards do not retry in lockstep).
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or not retry_if(e):
+                raise
+            sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
+            attempt += 1
+
+
+class ThrottledProvider:
+    """
+    Wraps a `market_fetch.YahooProvider` (or a stand-in): every call, and
+    every retry, takes a token from `bucket` first.
+    """
+
+    def __init__(self, provider, bucket, retries=DEFAULT_RETRIES, base=0.5, cap=30.0):
+        self.provider = provider
+        self.bucket = bucket
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+
+    def _call(self, name, *args, **kwargs):
+        def attempt():
+            self.bucket.acquire()
+            return getattr(self.provider, name)(*args, **kwargs)
+        return call_with_backoff(attempt, retries=self.retries, base=self.base, cap=self.cap)
+
+    def download(self, *args, **kwargs):
+        return self._call("download", *args, **kwargs)
+
+    def info(self, *args, **kwargs):
+        return self._call("info", *args, **kwargs)
+
+    def history(self, *args, **kwargs):
+        return self._call("history", *args, **kwargs)
+
+
+class FirestoreCheckpoints:
+    """
+    One document per shard and run in `collection` ("<run_id>_<shard>"),
+    holding the tickers finished so far and whether the shard is complete.
+    Each shard only writes its own document, inside a transaction, so two
+    overlapping retries of a shard add to it instead of overwriting each other.
+    """
+
+    def __init__(self, db_client, collection=RUNS_COLLECTION):
+        self.db_client = db_client
+        self.collection = collection
+
+    def _doc(self, run_id, shard):
+        return self.db_client.collection(self.collection).document(f"{run_id}_{shard:03d}")
+
+    def _read(self, run_id, shard):
+        snapshot = self._doc(run_id, shard).get()
+        return snapshot.to_dict() if snapshot.exists else {}
+
+    def done(self, run_id, shard):
+        return set(self._read(run_id, shard).get("Done", []))
+
+    def mark(self, run_id, shard, tickers, complete=False):
+        from firebase_admin import firestore
+
+        ref = self._doc(run_id, shard)
+
+        @firestore.transactional
+        def update(transaction):
+            snapshot = ref.get(transaction=transaction)
+            data = snapshot.to_dict() if snapshot.exists else {}
+            transaction.set(ref, {
+                "RunId": run_id,
+                "Shard": shard,
+                "Done": sorted(set(data.get("Done", [])) | set(tickers)),
+                "Complete": complete or data.get("Complete", False),
+                "Timestamp": firestore.SERVER_TIMESTAMP,
+            })
+
+        update(self.db_client.transaction())
+
+    def completed(self, run_id, n_shards):
+        """The shards of `run_id` (out of `n_shards`) that finished every ticker."""
+        return {s for s in range(n_shards) if self._read(run_id, s).get("Complete")}
+
+    def claim(self, run_id, step):
+        """
+        True for the first caller to claim `step` of `run_id` (e.g. "publish"),
+        False for every later one: a transaction creates "<run_id>_<step>" only
+        if it does not exist yet, so two shards finishing together cannot both win.
+        """
+        from firebase_admin import firestore
+
+        ref = self.db_client.collection(self.collection).document(f"{run_id}_{step}")
+
+        @firestore.transactional
+        def create(transaction):
+            if ref.get(transaction=transaction).exists:
+                return False
+            transaction.set(ref, {"RunId": run_id, "Step": step, "Timestamp": firestore.SERVER_TIMESTAMP})
+            return True
+
+        return create(self.db_client.transaction())
+
+
+@dataclass
+class ShardResult:
+    done: list = field(default_factory=list)       # finished in this invocation
+    errors: dict = field(default_factory=dict)     # ticker -> exception, retried by a rerun
+    remaining: list = field(default_factory=list)  # not attempted before the deadline
+    skipped: int = 0                               # already finished by an earlier invocation
+
+
+def run_shard(tickers, run_id, shard, checkpoints, process, batch_size=DEFAULT_BATCH_SIZE,
+              deadline=None, clock=time.monotonic):
+    """
+    Work through the unfinished `tickers` of one shard in batches.
+
+    `process(batch)` returns (written, errors); every ticker of the batch
+    without an error (written, or skipped for lack of data) is checkpointed
+    as finished. After the first batch, no batch is started once `clock()`
+    passes `deadline`; the tickers left are returned in `remaining`. When nothing is left the
+    shard is marked complete, even if some tickers failed: they stay
+    unfinished, so a rerun of the same run retries just those.
+    """
+    finished = checkpoints.done(run_id, shard)
+    todo = [t for t in tickers if t not in finished]
+    result = ShardResult(skipped=len(tickers) - len(todo))
+
+    for i in range(0, len(todo), batch_size):
+        if deadline is not None and i > 0 and clock() >= deadline:
+            result.remaining = todo[i:]
+            break
+        batch = todo[i:i + batch_size]
+        try:
+            _, errors = process(batch)
+        except Exception as e:
+            errors = {t: e for t in batch}
+        ok = [t for t in batch if t not in errors]
+        if ok:
+            checkpoints.mark(run_id, shard, ok)
+        result.done.extend(ok)
+        result.errors.update(errors)
+
+    if not result.remaining:
+        checkpoints.mark(run_id, shard, [], complete=True)
+    return result
+
+
+if __name__ == "__main__":
+    # A universe too big for one invocation, offline: shards run in parallel
+    # threads against a throttling fake provider, the first pass is cut short
+    # by a deadline (the 540 s timeout, scaled down) and a second pass resumes.
+    #   python shards.py --tickers 400 --shards 4 --max-rate 40
+    import argparse
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    from fakes import FakeProvider, InMemoryCheckpoints, synthetic_tickers
+    from market_fetch import fetch_universe
+    from price_store import PriceStore
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=400)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--max-rate", type=float, default=40, help="provider calls per second before it throttles")
+    parser.add_argument("--budget", type=float, default=1.5, help="seconds per invocation in the first pass")
+    args = parser.parse_args()
+
+    tickers = synthetic_tickers(args.tickers)
+    shards = split_shards(tickers, args.shards)
+    print(f"{args.tickers} tickers in {args.shards} shards of {min(map(len, shards))}-{max(map(len, shards))}")
+
+    for label, rate in (("no token bucket", None), ("token bucket", args.max_rate * 0.9)):
+        provider = FakeProvider(latency=args.latency, max_rate=args.max_rate)
+        provider.download(tickers)  # build the synthetic frames outside the timings
+        checkpoints = InMemoryCheckpoints()
+        with tempfile.TemporaryDirectory() as root:
+            store = PriceStore(root)
+            processed = []
+
+            def invoke(shard, budget):
+                # One invocation; parallel shards share the provider's limit.
+                shard_provider = provider if rate is None else ThrottledProvider(
+                    provider, TokenBucket(rate / args.shards, capacity=1), base=0.05, cap=1.0)
+
+                def process(batch):
+                    fetched = fetch_universe(batch, shard_provider, store=store)
+                    processed.extend(fetched.histories)
+                    return list(fetched.histories), fetched.errors
+
+                deadline = None if budget is None else time.monotonic() + budget
+                return run_shard(shards[shard], "run", shard, checkpoints, process, args.batch_size, deadline)
+
+            start = time.perf_counter()
+            line = f"  {label:<16}"
+            for attempt, budget in (("first pass", args.budget), ("resumed", None)):
+                with ThreadPoolExecutor(max_workers=args.shards) as pool:
+                    results = list(pool.map(lambda s: invoke(s, budget), range(args.shards)))
+                done = sum(len(r.done) for r in results)
+                left = sum(len(r.remaining) for r in results)
+                errors = sum(len(r.errors) for r in results)
+                line += f"  {attempt}: {done:>5} done {errors:>4} errors {left:>5} left |"
+            elapsed = time.perf_counter() - start
+            complete = len(checkpoints.completed("run", args.shards))
+            print(f"{line} {elapsed:6.2f}s  shards complete {complete}/{args.shards}  "
+                  f"throttled calls {provider.calls['throttled']}  "
+                  f"tickers fetched twice {len(processed) - len(set(processed))}")
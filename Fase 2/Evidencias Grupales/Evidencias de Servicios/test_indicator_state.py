@@ -0,0 +1,69 @@
+# test_indicator_state.py
+"""Parity of the streaming `IndicatorState` with the batch engine in `indicators.py`."""
+import json
+import math
+
+import numpy as np
+import pytest
+
+from indicator_state import IndicatorState, STATE_VERSION
+from indicators import INDICATOR_COLUMNS, RSI_EWM, RSI_SMA, compute_indicators
+
+N_DAYS = 600
+TOLERANCE = 1e-9
+
+
+def _series(gaps):
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, N_DAYS)))
+    if gaps:
+        close[rng.random(N_DAYS) < 0.03] = np.nan
+        close[:7] = np.nan        # late first bar
+        close[300:320] = np.nan   # a suspension longer than the 20-bar window
+    return close
+
+
+def _assert_row(row, batch, i):
+    for name in INDICATOR_COLUMNS:
+        got, expected = row[name], batch[name][i]
+        if math.isnan(expected):
+            assert math.isnan(got), (name, i, got)
+        else:
+            assert abs(got - expected) <= TOLERANCE * max(1.0, abs(expected)), (name, i, got, expected)
+
+
+@pytest.mark.parametrize("gaps", [False, True], ids=["no-gaps", "gaps"])
+@pytest.mark.parametrize("partial", [True, False], ids=["partial", "full-windows"])
+@pytest.mark.parametrize("rsi", [RSI_SMA, RSI_EWM])
+def test_stream_matches_batch(rsi, partial, gaps):
+    close = _series(gaps)
+    batch = compute_indicators(close, rsi, partial)
+    state = IndicatorState(rsi, partial)
+    for i, c in enumerate(close):
+        _assert_row(state.update(c), batch, i)
+
+
+@pytest.mark.parametrize("rsi", [RSI_SMA, RSI_EWM])
+def test_round_trip_through_json_keeps_streaming(rsi):
+    close = _series(gaps=True)
+    batch = compute_indicators(close, rsi)
+    state = IndicatorState.from_history(close[:N_DAYS // 2], rsi)
+
+    data = json.loads(json.dumps(state.to_dict(), allow_nan=False))
+    restored = IndicatorState.from_dict(data)
+    assert restored.to_dict() == state.to_dict()
+    _assert_row(restored.values(), batch, N_DAYS // 2 - 1)
+    for i in range(N_DAYS // 2, N_DAYS):
+        _assert_row(restored.update(close[i]), batch, i)
+
+
+def test_from_dict_rejects_other_versions():
+    data = IndicatorState().to_dict()
+    data["version"] = STATE_VERSION + 1
+    with pytest.raises(ValueError):
+        IndicatorState.from_dict(data)
+
+
+def test_unknown_rsi_variant():
+    with pytest.raises(ValueError):
+        IndicatorState("wilder")
@@ -0,0 +1,28 @@
+# test_metrics.py
+"""Edge cases of `metrics.metrics_table`: histories too short for a return and tickers without closes."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics import LOOKBACKS, METRICS, metrics_table
+
+DATES = pd.bdate_range("2024-01-01", periods=300)
+
+
+@pytest.mark.parametrize("rows", [0, 1], ids=["no-rows", "one-row"])
+def test_short_history_gives_nan_rows(rows):
+    closes = pd.DataFrame({"A": [10.0] * rows, "B": [20.0] * rows}, index=DATES[:rows])
+    table = metrics_table(closes)
+    assert list(table.index) == ["A", "B"]
+    assert table.shape[1] == len(LOOKBACKS) * len(METRICS)
+    assert table.isna().all().all()
+
+
+def test_all_nan_column_leaves_the_others_alone():
+    rng = np.random.default_rng(0)
+    a = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(DATES))))
+    table = metrics_table(pd.DataFrame({"A": a, "B": np.nan}, index=DATES))
+    alone = metrics_table(pd.DataFrame({"A": a}, index=DATES))
+    assert table.loc["B"].isna().all()
+    np.testing.assert_array_equal(table.loc["A"].to_numpy(), alone.loc["A"].to_numpy())
+    assert table.loc["A"].notna().all()